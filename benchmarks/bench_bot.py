@@ -0,0 +1,288 @@
+"""Нагрузочный тест бота целиком: настоящие Dispatcher, роутеры и middleware.
+
+Telegram Bot API, GigaChat и Google Sheets заменены локальными
+заглушками (benchmarks.fake_telegram, benchmarks.fake_gigachat,
+benchmarks.fake_gspread) с настраиваемой задержкой и долей ошибок;
+БД - временный файл SQLite. Апдейты подаются через dp.feed_raw_update,
+как их передает webhook-сервер, не больше --concurrency одновременно.
+
+Сценарии (по порядку):
+    chat   - сообщения --chats чатов по --users участников, --messages раундов
+    test   - --sessions одновременных прохождений /test до анализа и записи
+    report - одновременный /report во всех чатах (после chat, 80% участников с типом)
+
+Результат - JSON: пропускная способность, перцентили задержки обработки
+апдейтов по сценариям и видам апдейтов, ошибки, счетчики заглушек.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_bot --chats 20 --users 25 --messages 10 --sessions 30 --output bench_bot.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.bench_scoring_modes import ANSWERS
+from benchmarks.fake_gigachat import FakeGigaChatServer
+from benchmarks.fake_gspread import FakeWorksheet
+from benchmarks.fake_telegram import FakeTelegramServer
+
+CHAT_PHRASES = [
+    "Давайте обсудим план релиза на следующей неделе",
+    "Я подготовлю отчет по метрикам к пятнице",
+    "Кто возьмет задачу по интеграции с платежами?",
+    "Мне кажется, нам стоит пересмотреть приоритеты",
+    "Отличная работа, спасибо всем за помощь!",
+    "Предлагаю созвониться завтра утром и все решить",
+]
+ANSWER_TYPES = ["INTJ", "ENFP", "ISTP", "ESFJ", "ENTP", "ISFJ", "INFJ", "ESTP"]
+
+
+def summarize(latencies, elapsed: float = None) -> dict:
+    """Перцентили задержки в мс и пропускная способность"""
+    values = sorted(latencies)
+    if not values:
+        return {'count': 0}
+
+    def pct(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 2)
+
+    result = {'count': len(values), 'p50_ms': pct(0.5), 'p95_ms': pct(0.95), 'p99_ms': pct(0.99),
+              'max_ms': round(values[-1], 2), 'mean_ms': round(statistics.fmean(values), 2)}
+    if elapsed:
+        result['elapsed_sec'] = round(elapsed, 3)
+        result['per_sec'] = round(len(values) / elapsed, 1)
+    return result
+
+
+class UpdateFactory:
+    """Апдейты Telegram в виде JSON, как их присылает Bot API"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def message(self, chat_id: int, user_id: int, text: str, title: str = None) -> dict:
+        update_id = next(self._ids)
+        chat = {'id': chat_id, 'type': 'private', 'first_name': f'User{user_id}', 'username': f'user{user_id}'}
+        if chat_id < 0:
+            chat = {'id': chat_id, 'type': 'supergroup', 'title': title or f'Team {-chat_id}'}
+        return {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': chat,
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}',
+                         'username': f'user{user_id}', 'language_code': 'ru'},
+                'text': text,
+            },
+        }
+
+
+class Driver:
+    """Подача апдейтов в диспетчер с учетом задержек и ошибок"""
+
+    def __init__(self, dp, bot, concurrency: int):
+        self.dp = dp
+        self.bot = bot
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def feed(self, kind: str, update: dict):
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                await self.dp.feed_raw_update(self.bot, update)
+            except Exception as e:
+                self.errors[kind] += 1
+                logging.debug(f"Ошибка обработки апдейта {kind}: {e}")
+            self.latencies[kind].append((time.perf_counter() - started) * 1000)
+
+    def report(self, kinds, elapsed: float) -> dict:
+        total = [value for kind in kinds for value in self.latencies[kind]]
+        return {
+            'updates': summarize(total, elapsed),
+            'by_kind': {kind: summarize(self.latencies[kind]) for kind in kinds},
+            'errors': {kind: self.errors[kind] for kind in kinds},
+        }
+
+
+def group_chats(args):
+    return {-1000 - chat: [100_000 + chat * args.users + user for user in range(args.users)]
+            for chat in range(args.chats)}
+
+
+async def scenario_chat(args, driver: Driver, factory: UpdateFactory, chats) -> dict:
+    """Поток сообщений групповых чатов и время их записи в БД"""
+    from utils.db import database
+    from utils.ingest import ingestor
+
+    rnd = random.Random(args.seed)
+    updates = [factory.message(chat_id, user_id, rnd.choice(CHAT_PHRASES))
+               for _ in range(args.messages) for chat_id, users in chats.items() for user_id in users]
+    rnd.shuffle(updates)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(driver.feed('group_message', update) for update in updates))
+    elapsed = time.perf_counter() - started
+
+    # Остановка сбрасывает очередь пакетной записи
+    flush_started = time.perf_counter()
+    await ingestor.stop()
+    flush_ms = (time.perf_counter() - flush_started) * 1000
+    await ingestor.start()
+
+    async with database.connection() as db:
+        cursor = await db.execute('SELECT COUNT(*) FROM chat_messages')
+        stored = (await cursor.fetchone())[0]
+
+    result = driver.report(['group_message'], elapsed)
+    result.update(final_flush_ms=round(flush_ms, 1), stored_messages=stored, expected_messages=len(updates),
+                  ingest=ingestor.get_stats())
+    return result
+
+
+async def scenario_test(args, driver: Driver, factory: UpdateFactory) -> dict:
+    """Одновременные прохождения /test: команда, ответы, последний ответ с анализом"""
+    session_latencies = []
+
+    async def session(user_id: int):
+        started = time.perf_counter()
+        await driver.feed('test_start', factory.message(user_id, user_id, '/test'))
+        for i, answer in enumerate(ANSWERS):
+            kind = 'test_final_answer' if i == len(ANSWERS) - 1 else 'test_answer'
+            await driver.feed(kind, factory.message(user_id, user_id, answer))
+        session_latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(500_000 + i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    result = driver.report(['test_start', 'test_answer', 'test_final_answer'], elapsed)
+    result['sessions'] = summarize(session_latencies, elapsed)
+    return result
+
+
+async def scenario_report(args, driver: Driver, factory: UpdateFactory, chats) -> dict:
+    """Одновременный /report во всех чатах"""
+    from utils.helpers import save_user_type
+
+    rnd = random.Random(args.seed)
+    for users in chats.values():
+        for user_id in users[:max(1, int(len(users) * 0.8))]:
+            await save_user_type(user_id, f'user{user_id}', rnd.choice(ANSWER_TYPES))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(driver.feed('report', factory.message(chat_id, users[0], '/report'))
+                           for chat_id, users in chats.items()))
+    return driver.report(['report'], time.perf_counter() - started)
+
+
+async def main(args):
+    telegram = FakeTelegramServer(latency_ms=args.telegram_latency_ms, error_rate=args.telegram_error_rate,
+                                  seed=args.seed)
+    gigachat = FakeGigaChatServer(latency_ms=args.llm_latency_ms, per_token_ms=args.llm_per_token_ms,
+                                  error_rate=args.llm_error_rate, seed=args.seed)
+    await telegram.start()
+    await gigachat.start()
+
+    os.environ.update({
+        'BOT_TOKEN': '123456:BENCHMARKbenchmarkBENCHMARKbenchmark',
+        'GIGACHAT_TOKEN': 'benchmark',
+        'GIGACHAT_BASE_URL': gigachat.base_url,
+        'GIGACHAT_AUTH_URL': gigachat.auth_url,
+        'DB_PATH': os.path.join(tempfile.mkdtemp(prefix="sociomind-bench-"), "bench.db"),
+        'UPDATE_CONCURRENCY': str(args.update_concurrency),
+    })
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+
+    from config import TOKEN
+    from main import create_dispatcher, stop_components
+    from services.gigachat import gigachat_service
+    from services.google_sheets_service import sheets_service
+    from services.questionnaire import questionnaire_engine
+    from utils.db import database
+    from utils.fsm_storage import SQLiteStorage
+    from utils.helpers import init_db
+    from utils.ingest import ingestor
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(telegram.base_url))
+    bot = Bot(token=TOKEN, parse_mode=ParseMode.HTML, session=session)
+    storage = SQLiteStorage()
+    dp, limiter = create_dispatcher(storage)
+    sheet = FakeWorksheet(latency_ms=args.sheets_latency_ms, error_rate=args.sheets_error_rate, seed=args.seed)
+    result = {'config': vars(args), 'scenarios': {}}
+    try:
+        await database.open()
+        await init_db()
+        sheets_service.sheet = sheet
+        sheets_service.enabled = True
+        await sheets_service.start()
+        await ingestor.start()
+        await gigachat_service.load_knowledge_base()
+        questionnaire_engine.load()
+
+        driver = Driver(dp, bot, args.concurrency)
+        factory = UpdateFactory()
+        chats = group_chats(args)
+        result['scenarios']['chat'] = await scenario_chat(args, driver, factory, chats)
+        result['scenarios']['test'] = await scenario_test(args, driver, factory)
+        result['scenarios']['report'] = await scenario_report(args, driver, factory, chats)
+    finally:
+        await limiter.drain(30)
+        await stop_components([
+            ("ingest", ingestor.stop),
+            ("sheets", sheets_service.stop),
+            ("fsm storage", storage.close),
+            ("gigachat", gigachat_service.close),
+            ("bot session", bot.session.close),
+            ("database", database.close),
+            ("fake telegram", telegram.stop),
+            ("fake gigachat", gigachat.stop),
+        ])
+
+    result.update(
+        dispatcher=limiter.get_stats(),
+        telegram_api=telegram.get_stats(),
+        gigachat=dict(gigachat.stats),
+        sheets=dict(sheet.stats, rows=len(sheet.rows)),
+    )
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--users", type=int, default=25)
+    parser.add_argument("--messages", type=int, default=10, help="сообщений каждого участника")
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=100, help="апдейтов в обработке одновременно")
+    parser.add_argument("--update-concurrency", type=int, default=64, help="UPDATE_CONCURRENCY бота")
+    parser.add_argument("--telegram-latency-ms", type=float, default=30)
+    parser.add_argument("--telegram-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-per-token-ms", type=float, default=2)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--sheets-latency-ms", type=float, default=100)
+    parser.add_argument("--sheets-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="файл для JSON-результата")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+    asyncio.run(main(args))
@@ -0,0 +1,119 @@
+"""Точность и скорость лексического классификатора типа без сети.
+
+По умолчанию предложения описаний каждого типа из socio.txt делятся
+на обучающую и отложенную части: классификатор строится по обучающей,
+а синтетические "ответы теста" собираются из отложенной с примесью
+предложений других типов (--noise). Если передать --labelled файл JSONL
+со строками {"type": "INTJ", "answers": [...]}, оцениваются реальные
+ответы, а классификатор строится по всему socio.txt.
+
+Выводит точность типа и каждой дихотомии, долю ответов и точность выше
+порогов уверенности (для выбора CLASSIFIER_FAST_PATH_CONFIDENCE) и
+задержку одного вызова predict.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_classifier --respondents 2000 --noise 0.3
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+
+from services.classifier import DEFAULT_SCALE, DICHOTOMIES, TypeClassifier, profile_texts, split_sentences, type_functions
+
+THRESHOLDS = (0.0, 0.3, 0.5, 0.7, 0.8, 0.9, 0.95)
+
+
+def holdout_split(texts, share: float, rng: random.Random):
+    """Деление предложений каждого типа на обучающие и отложенные"""
+    train, test = {}, {}
+    for code, text in texts.items():
+        sentences = split_sentences(text)
+        rng.shuffle(sentences)
+        cut = max(1, int(len(sentences) * share))
+        test[code], train[code] = sentences[:cut], sentences[cut:]
+    return {code: " ".join(s) for code, s in train.items()}, test
+
+
+def synthetic_respondents(test, count: int, answers: int, noise: float, rng: random.Random):
+    """Ответы из отложенных предложений типа; доля noise - из предложений других типов"""
+    codes = sorted(test)
+    respondents = []
+    for _ in range(count):
+        code = rng.choice(codes)
+        items = []
+        for _ in range(answers):
+            source = rng.choice([c for c in codes if c != code]) if rng.random() < noise else code
+            items.append(rng.choice(test[source]))
+        respondents.append((code, items))
+    return respondents
+
+
+def load_labelled(path: str):
+    with open(path, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row['type'].upper(), row['answers']) for row in rows]
+
+
+def evaluate(classifier: TypeClassifier, respondents):
+    predictions, latencies = [], []
+    for _, answers in respondents:
+        started = time.perf_counter()
+        predictions.append(classifier.predict(answers))
+        latencies.append((time.perf_counter() - started) * 1e6)
+
+    truth = [code for code, _ in respondents]
+    correct = np.array([p is not None and p.type == code for p, code in zip(predictions, truth)])
+    confidence = np.array([p.confidence if p else 0.0 for p in predictions])
+
+    print(f"ответов: {len(respondents)}, без слов словаря: {sum(p is None for p in predictions)}")
+    print(f"точность типа: {correct.mean():.3f} (случайный выбор: {1 / 16:.3f}), "
+          f"средняя уверенность: {confidence.mean():.3f}")
+    for axis, (first, second) in enumerate(DICHOTOMIES):
+        hits = [p is not None and p.type[axis] == code[axis] for p, code in zip(predictions, truth)]
+        print(f"  {first}/{second}: {np.mean(hits):.3f}")
+
+    print("порог уверенности: доля ответов, точность типа")
+    for threshold in THRESHOLDS:
+        selected = confidence >= threshold
+        accuracy = correct[selected].mean() if selected.any() else float('nan')
+        print(f"  >= {threshold:.2f}: {selected.mean():.3f}, {accuracy:.3f}")
+
+    latencies.sort()
+    print(f"predict: медиана {statistics.median(latencies):.0f} мкс, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.0f} мкс")
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    with open(args.knowledge, encoding='utf-8') as f:
+        knowledge = f.read()
+    texts = profile_texts(knowledge)
+    functions = type_functions(knowledge)
+
+    started = time.perf_counter()
+    if args.labelled:
+        classifier = TypeClassifier.from_profiles(texts, functions, scale=args.scale)
+        respondents = load_labelled(args.labelled)
+    else:
+        train, test = holdout_split(texts, args.holdout, rng)
+        classifier = TypeClassifier.from_profiles(train, functions, scale=args.scale)
+        respondents = synthetic_respondents(test, args.respondents, args.answers, args.noise, rng)
+    print(f"словарь: {len(classifier)} слов, построен за {(time.perf_counter() - started) * 1000:.1f} мс")
+    evaluate(classifier, respondents)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--knowledge", default="socio.txt")
+    parser.add_argument("--labelled", help="JSONL с размеченными ответами")
+    parser.add_argument("--respondents", type=int, default=2000)
+    parser.add_argument("--answers", type=int, default=8)
+    parser.add_argument("--holdout", type=float, default=0.3)
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--scale", type=float, default=DEFAULT_SCALE)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+"""Микро-бенчмарк: пул соединений против connect-per-call.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_db_pool --ops 2000 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import aiosqlite
+
+
+async def legacy_save_chat_message(path: str, chat_id: int, user_id: int, message_text: str):
+    """Старый путь: новое соединение и рабочий поток на каждый вызов"""
+    async with aiosqlite.connect(path) as db:
+        await db.execute('''INSERT INTO chat_messages
+                          (chat_id, user_id, message_text)
+                          VALUES (?, ?, ?)''',
+                         (chat_id, user_id, message_text))
+        await db.commit()
+
+
+async def legacy_get_user_type(path: str, user_id: int):
+    async with aiosqlite.connect(path) as db:
+        cursor = await db.execute('SELECT personality_type FROM users WHERE user_id = ?', (user_id,))
+        result = await cursor.fetchone()
+        return result[0] if result else None
+
+
+async def run_ops(ops: int, concurrency: int, save, get_type) -> float:
+    """Выполнение смешанной нагрузки (запись + чтение), возвращает ops/sec"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            if i % 2:
+                await save(-100, i % 50, f"benchmark message {i}")
+            else:
+                await get_type(i % 50)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(ops)))
+    return ops / (time.perf_counter() - started)
+
+
+async def main(ops: int, concurrency: int):
+    from utils.db import database
+    from utils.helpers import init_db, save_chat_message, get_user_type
+
+    path = database.path
+    await init_db()
+
+    legacy = await run_ops(
+        ops, concurrency,
+        lambda c, u, t: legacy_save_chat_message(path, c, u, t),
+        lambda u: legacy_get_user_type(path, u),
+    )
+    pooled = await run_ops(
+        ops, concurrency,
+        lambda c, u, t: save_chat_message(chat_id=c, user_id=u, message_text=t),
+        get_user_type,
+    )
+    await database.close()
+
+    print(f"connect-per-call: {legacy:10.1f} ops/sec")
+    print(f"pool ({database.pool_size} conn):   {pooled:10.1f} ops/sec")
+    print(f"ускорение:         {pooled / legacy:10.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    # Бенчмарк работает с временной БД, а не с рабочей sociomind.db
+    tmpdir = tempfile.mkdtemp(prefix="sociomind-bench-")
+    os.environ["DB_PATH"] = os.path.join(tmpdir, "bench.db")
+    asyncio.run(main(args.ops, args.concurrency))
@@ -0,0 +1,124 @@
+"""Бенчмарк запросов к chat_messages до и после миграций с индексами.
+
+Заполняет временную БД миллионами сообщений по схеме версии 1, замеряет
+выборку истории чата за 7 дней и очистку старых сообщений, затем
+применяет остальные миграции и повторяет замеры.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_migrations --rows 2000000 --chats 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+HISTORY_SQL = '''SELECT user_id, message_text, timestamp
+                 FROM chat_messages
+                 WHERE chat_id = ?
+                 AND timestamp >= datetime('now', '-7 days')
+                 ORDER BY timestamp'''
+CLEANUP_SQL = "DELETE FROM chat_messages WHERE timestamp < datetime('now', '-7 days')"
+# С версии 9 история читается и удаляется по дням-партициям (chat_id, day)
+PARTITIONED_HISTORY_SQL = '''SELECT user_id, message_text, timestamp
+                             FROM chat_messages
+                             WHERE chat_id = ?
+                             AND day >= date('now', '-7 days')
+                             AND timestamp >= datetime('now', '-7 days')
+                             ORDER BY day, id'''
+PARTITIONED_CLEANUP_SQL = "DELETE FROM chat_messages WHERE chat_id = ? AND day < date('now', '-7 days')"
+
+
+def seed(path: str, rows: int, chats: int, days: int, seed_value: int):
+    """Заполнение таблицы сообщениями, равномерно распределенными по days дням"""
+    rnd = random.Random(seed_value)
+    now = time.time()
+
+    def generate():
+        for i in range(rows):
+            ts = now - rnd.random() * days * 86400
+            yield (rnd.randrange(chats), rnd.randrange(1000),
+                   f"message {i}", time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts)))
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executemany('INSERT INTO chat_messages (chat_id, user_id, message_text, timestamp) VALUES (?, ?, ?, ?)',
+                     generate())
+    conn.commit()
+    conn.close()
+
+
+def measure(path: str, chats: int, samples: int, partitioned: bool = False) -> dict:
+    conn = sqlite3.connect(path)
+    history_sql = PARTITIONED_HISTORY_SQL if partitioned else HISTORY_SQL
+
+    started = time.perf_counter()
+    for chat_id in range(0, chats, max(1, chats // samples)):
+        conn.execute(history_sql, (chat_id,)).fetchall()
+    history_ms = (time.perf_counter() - started) * 1000 / samples
+
+    # Очистку замеряем внутри транзакции и откатываем, чтобы данные не менялись
+    started = time.perf_counter()
+    conn.execute('BEGIN')
+    if partitioned:
+        deleted = sum(conn.execute(PARTITIONED_CLEANUP_SQL, (chat_id,)).rowcount for chat_id in range(chats))
+    else:
+        deleted = conn.execute(CLEANUP_SQL).rowcount
+    conn.rollback()
+    cleanup_ms = (time.perf_counter() - started) * 1000
+
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + history_sql, (0,)).fetchall()
+    conn.close()
+    return {'history_ms': history_ms, 'cleanup_ms': cleanup_ms, 'deleted': deleted,
+            'plan': '; '.join(row[-1] for row in plan)}
+
+
+async def migrate(target=None) -> int:
+    from utils.db import database
+    from utils.migrations import run_migrations
+
+    async with database.connection() as db:
+        version = await run_migrations(db, target=target)
+    await database.close()
+    return version
+
+
+def report(title: str, result: dict):
+    print(f"{title}:")
+    print(f"  история чата за 7 дней: {result['history_ms']:10.2f} мс/запрос")
+    print(f"  очистка старых:         {result['cleanup_ms']:10.2f} мс ({result['deleted']} строк)")
+    print(f"  план запроса истории:   {result['plan']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--days", type=int, default=8)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="sociomind-bench-")
+    path = os.path.join(tmpdir, "bench.db")
+    os.environ["DB_PATH"] = path
+
+    asyncio.run(migrate(target=1))
+    started = time.perf_counter()
+    seed(path, args.rows, args.chats, args.days, args.seed)
+    print(f"Заполнено {args.rows} строк за {time.perf_counter() - started:.1f} с")
+
+    report("До миграций (версия 1)", measure(path, args.chats, args.samples))
+
+    started = time.perf_counter()
+    version = asyncio.run(migrate())
+    print(f"Миграции до версии {version} применены за {time.perf_counter() - started:.1f} с")
+
+    report(f"После миграций (версия {version})", measure(path, args.chats, args.samples, partitioned=version >= 9))
+
+
+if __name__ == "__main__":
+    main()
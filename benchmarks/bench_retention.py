@@ -0,0 +1,150 @@
+"""Очистка старых сообщений: один DELETE по timestamp против удаления дней-партиций.
+
+Заполняет БД схемы версии 8 сообщениями за --days дней и копирует ее.
+На первой копии выполняется прежняя очистка (три DELETE одной
+транзакцией), на второй - миграции до текущей версии и удаление
+истекших дней чатов короткими транзакциями с incremental_vacuum.
+
+Замеряет общее время, самую долгую транзакцию (столько ждет запись
+новых сообщений) и размер файла БД до и после очистки.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_retention --rows 1000000 --chats 200 --days 14
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+LEGACY_CLEANUP = (
+    "DELETE FROM chat_messages WHERE timestamp < datetime('now', '-7 days')",
+    "DELETE FROM chat_activity_daily WHERE day < date('now', '-7 days')",
+    "DELETE FROM chat_digests WHERE day < date('now', '-7 days')",
+)
+
+
+def file_size_mb(path: str) -> float:
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p)) / 2 ** 20
+
+
+async def migrate(path: str, target=None) -> int:
+    """Схема без настроек пула: БД как у прежних версий бота (auto_vacuum=NONE)"""
+    import aiosqlite
+    from utils.migrations import run_migrations
+
+    async with aiosqlite.connect(path) as db:
+        await db.execute('PRAGMA journal_mode=WAL')
+        return await run_migrations(db, target=target)
+
+
+def seed(path: str, rows: int, chats: int, days: int, seed_value: int):
+    """Сообщения, равномерно распределенные по days дням, и их дневная сводка"""
+    rnd = random.Random(seed_value)
+    now = time.time()
+
+    def generate():
+        # Сообщения приходят по времени: id растет вместе с timestamp
+        for i, ts in enumerate(sorted(now - rnd.random() * days * 86400 for _ in range(rows))):
+            yield (rnd.randrange(chats), rnd.randrange(1000),
+                   f"message {i} " + "x" * rnd.randrange(20, 200), time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts)))
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executemany('INSERT INTO chat_messages (chat_id, user_id, message_text, timestamp) VALUES (?, ?, ?, ?)',
+                     generate())
+    # Дневная сводка активности (последние id сообщений для очистки не нужны)
+    conn.execute('''INSERT INTO chat_activity_daily
+                    (chat_id, day, user_id, message_count, char_count, first_ts, last_ts)
+                    SELECT chat_id, date(timestamp), user_id, COUNT(*), SUM(LENGTH(message_text)),
+                           MIN(timestamp), MAX(timestamp)
+                    FROM chat_messages GROUP BY chat_id, date(timestamp), user_id''')
+    conn.commit()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+
+
+def bench_legacy(path: str) -> dict:
+    size_before = file_size_mb(path)
+    conn = sqlite3.connect(path)
+    started = time.perf_counter()
+    conn.execute('BEGIN')
+    deleted = conn.execute(LEGACY_CLEANUP[0]).rowcount
+    for statement in LEGACY_CLEANUP[1:]:
+        conn.execute(statement)
+    conn.commit()
+    elapsed = (time.perf_counter() - started) * 1000
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    return {'mode': 'legacy', 'deleted': deleted, 'total_ms': elapsed, 'max_tx_ms': elapsed,
+            'size_before_mb': size_before, 'size_after_mb': file_size_mb(path)}
+
+
+async def bench_partitioned(path: str) -> dict:
+    os.environ["DB_PATH"] = path
+    from utils import helpers
+    from utils.db import database
+
+    database.path = path
+    started = time.perf_counter()
+    await helpers.init_db()
+    migrate_ms = (time.perf_counter() - started) * 1000
+    async with database.connection() as db:
+        await db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    size_before = file_size_mb(path)
+
+    started = time.perf_counter()
+    expired = await helpers.get_expired_chat_days()
+    deleted, max_tx = 0, 0.0
+    for chat_id, day in expired:
+        tx_started = time.perf_counter()
+        deleted += await helpers.drop_chat_day(chat_id, day)
+        max_tx = max(max_tx, (time.perf_counter() - tx_started) * 1000)
+    vacuum_started = time.perf_counter()
+    freed = await helpers.incremental_vacuum()
+    vacuum_ms = (time.perf_counter() - vacuum_started) * 1000
+    elapsed = (time.perf_counter() - started) * 1000
+
+    async with database.connection() as db:
+        await db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    await database.close()
+    return {'mode': 'partitioned', 'deleted': deleted, 'buckets': len(expired), 'total_ms': elapsed,
+            'max_tx_ms': max_tx, 'vacuum_ms': vacuum_ms, 'freed_pages': freed, 'migrate_ms': migrate_ms,
+            'size_before_mb': size_before, 'size_after_mb': file_size_mb(path)}
+
+
+def print_result(result: dict):
+    print(" ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                   for key, value in result.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="sociomind-bench-")
+    legacy_path = os.path.join(tmpdir, "legacy.db")
+    partitioned_path = os.path.join(tmpdir, "partitioned.db")
+
+    asyncio.run(migrate(legacy_path, target=8))
+    started = time.perf_counter()
+    seed(legacy_path, args.rows, args.chats, args.days, args.seed)
+    print(f"Заполнено {args.rows} строк за {time.perf_counter() - started:.1f} с")
+    shutil.copy(legacy_path, partitioned_path)
+
+    try:
+        print_result(bench_legacy(legacy_path))
+        print_result(asyncio.run(bench_partitioned(partitioned_path)))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
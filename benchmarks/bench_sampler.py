@@ -0,0 +1,78 @@
+"""Скорость и воспроизводимость выборки сообщений для промпта отчета.
+
+Генерирует синтетическую неделю переписки (участники с разной
+активностью, служебные ответы, повторы) и замеряет sample_messages.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sampler --messages 100000 --budget 1500
+"""
+import argparse
+import random
+import statistics
+import time
+from collections import Counter
+
+from services.sampler import estimate_tokens, sample_messages
+
+WORDS = (
+    "релиз дедлайн задача баг тест ревью встреча созвон дизайн макет клиент бюджет "
+    "отчет метрика сервер деплой база миграция ветка конфликт спринт план ретро "
+    "идея гипотеза запуск пользователь отзыв поддержка документация договор счет"
+).split()
+SHORT = ["ок", "+", "спасибо", "да", "понял", "👍"]
+REPEATED = [
+    "Коллеги, напоминаю про созвон в пятницу по релизу",
+    "Кто возьмет ревью ветки с миграцией базы?",
+]
+
+
+def generate(count: int, members: int, seed: int):
+    rng = random.Random(seed)
+    # Активность участников по закону Ципфа
+    weights = [1 / (rank + 1) for rank in range(members)]
+    user_ids = rng.choices(range(1, members + 1), weights=weights, k=count)
+    messages = []
+    for message_id, user_id in enumerate(user_ids, start=1):
+        roll = rng.random()
+        if roll < 0.2:
+            text = rng.choice(SHORT)
+        elif roll < 0.3:
+            text = rng.choice(REPEATED)
+        else:
+            text = " ".join(rng.choices(WORDS, k=rng.randint(4, 20)))
+        messages.append({'id': message_id, 'user_id': user_id, 'message_text': text})
+    return messages
+
+
+def main(args):
+    messages = generate(args.messages, args.members, args.seed)
+    timings = []
+    result = None
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        sample = sample_messages(messages, args.budget, seed=args.seed)
+        timings.append((time.perf_counter() - started) * 1000)
+        ids = [m['id'] for m in sample]
+        if result is not None and ids != result:
+            raise SystemExit("❌ Выборка отличается при одинаковом seed")
+        result = ids
+
+    tokens = sum(estimate_tokens(m['message_text'][:300]) for m in sample)
+    per_member = Counter(m['user_id'] for m in sample)
+    activity = Counter(m['user_id'] for m in messages)
+    print(f"сообщений: {len(messages)}, участников: {args.members}")
+    print(f"время: медиана {statistics.median(timings):.1f} мс, максимум {max(timings):.1f} мс")
+    print(f"выбрано: {len(sample)} сообщений, ~{tokens} токенов из {args.budget}")
+    print(f"уникальных текстов в выборке: {len({m['message_text'] for m in sample})}")
+    top = ", ".join(f"{user}: {per_member[user]}/{activity[user]}" for user, _ in activity.most_common(5))
+    print(f"самые активные (выбрано/всего): {top}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--budget", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,92 @@
+"""Сравнение двух режимов оценки теста против локальной заглушки GigaChat.
+
+two-call   - determine_personality_type + generate_personality_analysis
+structured - один запрос с JSON-ответом {"type", "analysis_html"}
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_scoring_modes --sessions 50 --latency-ms 300
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_gigachat import FakeGigaChatServer
+
+ANSWERS = [
+    "Стараюсь быстро перестроить план и найти новые возможности.",
+    "Ищу нестандартные связи между идеями, люблю экспериментировать.",
+    "Сначала наблюдаю, потом аккуратно включаюсь в разговор.",
+    "Грубость и давление, когда на меня повышают голос.",
+    "Когда помогают навести порядок в делах и сроках.",
+    "Насколько искренне и тепло люди относятся друг к другу.",
+    "Спокойно объясняю, как можно сделать эффективнее.",
+    "Раскладываю вещи по местам и планирую покупки заранее.",
+]
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def run_mode(service, server, structured: bool, sessions: int, concurrency: int) -> dict:
+    server.stats.update(requests=0, prompt_tokens=0, completion_tokens=0)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(user_id: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await service.analyze_answers(ANSWERS, user_id=user_id, structured=structured)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(one(i) for i in range(sessions)))
+    return {
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': percentile(latencies, 0.95),
+        'requests_per_session': server.stats['requests'] / sessions,
+        'tokens_per_session': (server.stats['prompt_tokens'] + server.stats['completion_tokens']) / sessions,
+    }
+
+
+async def main(args):
+    server = FakeGigaChatServer(latency_ms=args.latency_ms, per_token_ms=args.per_token_ms)
+    await server.start()
+
+    os.environ.update({
+        'GIGACHAT_TOKEN': 'benchmark',
+        'GIGACHAT_BASE_URL': server.base_url,
+        'GIGACHAT_AUTH_URL': server.auth_url,
+        'DB_PATH': os.path.join(tempfile.mkdtemp(prefix="sociomind-bench-"), "bench.db"),
+        # Кэш анализов отключен, чтобы сравнивать сами запросы к LLM
+        'LLM_CACHE_VARIANTS': '0',
+    })
+    from services.gigachat import GigaChatService
+    from utils.db import database
+    from utils.helpers import init_db
+
+    await init_db()
+    service = GigaChatService()
+    await service.load_knowledge_base()
+
+    try:
+        for name, structured in (("two-call", False), ("structured", True)):
+            result = await run_mode(service, server, structured, args.sessions, args.concurrency)
+            print(f"{name:>10}: p50 {result['p50_ms']:8.1f} мс, p95 {result['p95_ms']:8.1f} мс, "
+                  f"запросов {result['requests_per_session']:.2f}, токенов {result['tokens_per_session']:.0f} на сессию")
+    finally:
+        await service.close()
+        await database.close()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--per-token-ms", type=float, default=5)
+    asyncio.run(main(parser.parse_args()))
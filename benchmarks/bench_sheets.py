@@ -0,0 +1,168 @@
+"""Нагрузочный тест записи результатов тестов в Google Sheets без сети.
+
+Сравнивает прежнюю запись (find + update/append_row прямо в обработчике)
+с очередью GoogleSheetsService поверх SheetsIO на заглушке листа с
+квотой и ошибками сервера. Минута квоты сжимается до --window-sec
+секунд, ограничитель SheetsIO масштабируется так же.
+
+Замеряет задержку, которую видит обработчик, время до записи всех
+строк, число ответов 429 и потерянные строки.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_sheets --tests 400 --users 250 --spread-sec 5 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+# Временная БД для очереди sheets_spool (до импорта config)
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench_sheets.db")
+
+from benchmarks.fake_gspread import FakeWorksheet  # noqa: E402
+
+
+def make_tests(count: int, users: int):
+    """Результаты тестов; часть пользователей проходит тест повторно"""
+    return [
+        {'user_id': 1000 + i % users, 'username': f'user{i % users}',
+         'personality_type': ('INTJ', 'ENFP', 'ISTP', 'ESFJ')[i % 4], 'timestamp': f'run-{i}'}
+        for i in range(count)
+    ]
+
+
+def expected_rows(tests):
+    latest = {}
+    for data in tests:
+        latest[str(data['user_id'])] = data
+    return latest
+
+
+def lost_rows(sheet: FakeWorksheet, tests) -> int:
+    """Пользователи, чей последний результат не попал в таблицу"""
+    stored = {row[0]: row for row in sheet.rows[1:] if row}
+    return sum(
+        1 for key, data in expected_rows(tests).items()
+        if stored.get(key, [None] * 4)[3] != data['timestamp']
+    )
+
+
+def legacy_save(sheet: FakeWorksheet, user_data: dict):
+    """Прежний путь: поиск по листу и запись прямо в event loop, ошибка - потеря строки"""
+    row = [user_data['user_id'], user_data['username'], user_data['personality_type'], user_data['timestamp']]
+    try:
+        cell = sheet.find(str(user_data['user_id']))
+        if cell:
+            sheet.update(f'A{cell.row}:D{cell.row}', [row])
+        else:
+            sheet.append_row(row)
+    except Exception:
+        pass
+
+
+async def run_handlers(tests, concurrency: int, spread_sec: float, save) -> list:
+    """Параллельные обработчики завершения теста, возвращает задержки в мс.
+
+    Тесты завершаются равномерно в течение spread_sec секунд.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i, data):
+        await asyncio.sleep(spread_sec * i / len(tests))
+        async with semaphore:
+            started = time.perf_counter()
+            await save(data)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*(one(i, data) for i, data in enumerate(tests)))
+    return latencies
+
+
+def make_sheet(args) -> FakeWorksheet:
+    sheet = FakeWorksheet(latency_ms=args.latency_ms, quota=args.quota, window_sec=args.window_sec,
+                          error_rate=args.error_rate, seed=args.seed)
+    sheet.rows.append(['User ID', 'Telegram username', 'Тип личности', 'Дата тестирования'])
+    return sheet
+
+
+async def bench_legacy(args, tests) -> dict:
+    sheet = make_sheet(args)
+
+    async def save(data):
+        legacy_save(sheet, data)
+
+    started = time.perf_counter()
+    latencies = await run_handlers(tests, args.concurrency, args.spread_sec, save)
+    return report("legacy", sheet, tests, latencies, time.perf_counter() - started)
+
+
+async def bench_write_behind(args, tests) -> dict:
+    from services.google_sheets_service import GoogleSheetsService
+    from services.sheets_io import SheetsIO
+
+    sheet = make_sheet(args)
+    scale = 60 / args.window_sec
+    service = GoogleSheetsService(flush_interval=args.flush_interval,
+                                  io=SheetsIO(rate_per_minute=args.quota * scale, burst=5))
+    service.sheet = sheet
+    service.enabled = True
+    await service.start()
+
+    started = time.perf_counter()
+    latencies = await run_handlers(tests, args.concurrency, args.spread_sec, service.save_to_sheets)
+    await service.stop()
+    result = report("write-behind", sheet, tests, latencies, time.perf_counter() - started)
+    result['io'] = service.io.get_stats()
+    return result
+
+
+def report(name: str, sheet: FakeWorksheet, tests, latencies, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        'mode': name,
+        'handler_p50_ms': round(statistics.median(latencies), 1),
+        'handler_p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        'handler_max_ms': round(latencies[-1], 1),
+        'total_sec': round(elapsed, 2),
+        'requests': sheet.stats['requests'],
+        'throttled_429': sheet.stats['throttled'],
+        'server_errors': sheet.stats['errors'],
+        'lost_users': lost_rows(sheet, tests),
+    }
+
+
+async def main(args):
+    from utils.db import database
+    from utils.helpers import init_db
+
+    await init_db()
+    tests = make_tests(args.tests, args.users)
+    try:
+        for bench in (bench_legacy, bench_write_behind):
+            result = await bench(args, tests)
+            io_stats = result.pop('io', None)
+            print(" ".join(f"{key}={value}" for key, value in result.items()))
+            if io_stats:
+                print(f"  SheetsIO: {io_stats}")
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tests", type=int, default=400)
+    parser.add_argument("--users", type=int, default=250)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--quota", type=int, default=60)
+    parser.add_argument("--window-sec", type=float, default=6)
+    parser.add_argument("--spread-sec", type=float, default=5)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(parser.parse_args()))
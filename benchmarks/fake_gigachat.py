@@ -0,0 +1,175 @@
+"""Локальная заглушка GigaChat API для бенчмарков и нагрузочных тестов.
+
+Отвечает на OAuth-запрос токена и на /chat/completions (в том числе
+потоково, stream=true) с настраиваемой задержкой (base + на каждый
+сгенерированный токен) и долей ошибок. Токен живет token_ttl_sec
+секунд, запрос с истекшим или чужим токеном получает 401.
+Считает запросы и токены, чтобы бенчмарк мог сравнить режимы.
+
+Запуск отдельно:
+    python -m benchmarks.fake_gigachat --port 8900 --latency-ms 300
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from aiohttp import web
+
+TYPES = [
+    "ENTP", "ISFP", "ESFJ", "INTJ", "ENFJ", "ISTJ", "INFP", "ESTP",
+    "ESFP", "INTP", "ENTJ", "ISFJ", "ESTJ", "INFJ", "ISTP", "ENFP",
+]
+
+
+def count_tokens(text: str) -> int:
+    """Грубая оценка числа токенов: ~4 символа на токен"""
+    return max(1, len(text) // 4)
+
+
+class FakeGigaChatServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 200,
+                 per_token_ms: float = 5, error_rate: float = 0.0, seed: int = 0,
+                 token_ttl_sec: float = 30 * 60):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.per_token_ms = per_token_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.token_ttl_sec = token_ttl_sec
+        # Выданные токены: токен -> время истечения
+        self._tokens = {}
+        self.stats = {'auth': 0, 'requests': 0, 'errors': 0, 'unauthorized': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0}
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/v1"
+
+    @property
+    def auth_url(self) -> str:
+        return f"http://{self.host}:{self.port}/api/v2/oauth"
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/v2/oauth", self.handle_auth)
+        app.router.add_post("/api/v1/chat/completions", self.handle_chat)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 порт выбирает ОС
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_auth(self, request: web.Request) -> web.Response:
+        self.stats['auth'] += 1
+        token = f"fake-token-{self.stats['auth']}"
+        self._tokens[token] = time.time() + self.token_ttl_sec
+        return web.json_response({'access_token': token, 'expires_at': int(self._tokens[token] * 1000)})
+
+    def _answer(self, chat: dict) -> str:
+        """Правдоподобный ответ в зависимости от запроса"""
+        prompt = chat['messages'][-1]['content']
+        personality_type = self.random.choice(TYPES)
+        if 'analysis_html' in prompt:
+            return json.dumps({
+                'type': personality_type,
+                'analysis_html': f"<b>Тип личности: {personality_type}</b>\n✨ <b>Сильные стороны:</b>\n"
+                                 + "• " + "сильная сторона " * 20,
+            }, ensure_ascii=False)
+        if chat.get('max_tokens', 512) <= 10:
+            return personality_type
+        words = max(1, chat.get('max_tokens', 512) - 20)
+        return "<b>Анализ</b>\n" + " ".join(f"• пункт{i}" for i in range(words // 2))
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if self._tokens.get(token, 0) < time.time():
+            self.stats['unauthorized'] += 1
+            return web.json_response({'status': 401, 'message': 'Token has expired'}, status=401)
+
+        chat = await request.json()
+        self.stats['requests'] += 1
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return web.json_response({'status': 500, 'message': 'injected error'}, status=500)
+
+        content = self._answer(chat)
+        prompt_tokens = sum(count_tokens(m['content']) for m in chat['messages'])
+        completion_tokens = count_tokens(content)
+        self.stats['prompt_tokens'] += prompt_tokens
+        self.stats['completion_tokens'] += completion_tokens
+
+        if chat.get('stream'):
+            return await self._stream(request, chat, content)
+
+        await asyncio.sleep((self.latency_ms + self.per_token_ms * completion_tokens) / 1000)
+        return web.json_response({
+            'choices': [{'message': {'role': 'assistant', 'content': content}, 'index': 0, 'finish_reason': 'stop'}],
+            'created': int(time.time()),
+            'model': chat.get('model', 'GigaChat'),
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+            'object': 'chat.completion',
+        })
+
+    async def _stream(self, request: web.Request, chat: dict, content: str) -> web.StreamResponse:
+        """Ответ в формате server-sent events, как у настоящего API"""
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        await asyncio.sleep(self.latency_ms / 1000)
+
+        # Фрагменты примерно по 4 токена
+        step = 16
+        for start in range(0, len(content), step):
+            piece = content[start:start + step]
+            await asyncio.sleep(self.per_token_ms * count_tokens(piece) / 1000)
+            chunk = {
+                'choices': [{'delta': {'content': piece}, 'index': 0}],
+                'created': int(time.time()),
+                'model': chat.get('model', 'GigaChat'),
+                'object': 'chat.completion',
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+async def _serve(args):
+    server = FakeGigaChatServer(port=args.port, latency_ms=args.latency_ms,
+                                per_token_ms=args.per_token_ms, error_rate=args.error_rate)
+    await server.start()
+    print(f"GIGACHAT_BASE_URL={server.base_url}")
+    print(f"GIGACHAT_AUTH_URL={server.auth_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--per-token-ms", type=float, default=5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,127 @@
+"""Локальная заглушка листа gspread для нагрузочных тестов записи в Google Sheets.
+
+FakeWorksheet повторяет методы Worksheet, которыми пользуется бот
+(get_all_values, find, row_values, update, batch_update, append_row,
+append_rows), хранит строки в памяти и имитирует сеть: задержку на
+каждый запрос, квоту запросов за скользящее окно (ответ 429) и долю
+ошибок сервера (ответ 503). Ошибки выбрасываются как настоящий
+gspread.exceptions.APIError, поэтому код повторов проверяется без сети.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from typing import List, Optional
+
+from gspread.exceptions import APIError
+
+_CELL = re.compile(r'([A-Z]+)(\d+)')
+
+
+class FakeResponse:
+    """Минимальный ответ requests, достаточный для APIError"""
+
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        self.text = message
+        self._payload = {'error': {'code': status_code, 'message': message}}
+
+    def json(self):
+        return self._payload
+
+
+class FakeCell:
+    def __init__(self, row: int, col: int, value: str):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class FakeWorksheet:
+    def __init__(self, latency_ms: float = 100, quota: int = 60, window_sec: float = 60,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.quota = quota
+        self.window_sec = window_sec
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.rows: List[List] = []
+        self.calls = Counter()
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0}
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def _request(self, method: str):
+        """Учет запроса: квота, случайная ошибка сервера, сетевая задержка"""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and self._recent[0] <= now - self.window_sec:
+                self._recent.popleft()
+            self.stats['requests'] += 1
+            self.calls[method] += 1
+            if len(self._recent) >= self.quota:
+                self.stats['throttled'] += 1
+                raise APIError(FakeResponse(429, "Quota exceeded for quota metric 'Write requests'"))
+            self._recent.append(now)
+            failed = self.random.random() < self.error_rate
+        time.sleep(self.latency_ms / 1000)
+        if failed:
+            self.stats['errors'] += 1
+            raise APIError(FakeResponse(503, "The service is currently unavailable."))
+
+    @staticmethod
+    def _cells(values: List) -> List[str]:
+        return [str(value) for value in values]
+
+    def _set_row(self, number: int, values: List):
+        while len(self.rows) < number:
+            self.rows.append([])
+        self.rows[number - 1] = self._cells(values)
+
+    def get_all_values(self) -> List[List[str]]:
+        self._request('get_all_values')
+        with self._lock:
+            return [list(row) for row in self.rows]
+
+    def row_values(self, number: int) -> List[str]:
+        self._request('row_values')
+        with self._lock:
+            return list(self.rows[number - 1]) if number <= len(self.rows) else []
+
+    def find(self, query: str, in_column: Optional[int] = None) -> Optional[FakeCell]:
+        """Как в gspread 5.x: None, если ячейка не найдена"""
+        self._request('find')
+        with self._lock:
+            for number, row in enumerate(self.rows, start=1):
+                for col, value in enumerate(row, start=1):
+                    if value == query and (in_column is None or col == in_column):
+                        return FakeCell(number, col, value)
+        return None
+
+    def update(self, range_name: str, values: List[List]):
+        self._request('update')
+        number = int(_CELL.match(range_name).group(2))
+        with self._lock:
+            for offset, row in enumerate(values):
+                self._set_row(number + offset, row)
+
+    def batch_update(self, data: List[dict], **kwargs):
+        self._request('batch_update')
+        with self._lock:
+            for item in data:
+                number = int(_CELL.match(item['range']).group(2))
+                for offset, row in enumerate(item['values']):
+                    self._set_row(number + offset, row)
+        return {'totalUpdatedRows': sum(len(item['values']) for item in data)}
+
+    def append_row(self, values: List, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values: List[List], **kwargs):
+        self._request('append_rows')
+        with self._lock:
+            first = len(self.rows) + 1
+            self.rows.extend(self._cells(row) for row in values)
+            last = len(self.rows)
+        return {'updates': {'updatedRange': f"'Лист1'!A{first}:D{last}", 'updatedRows': len(values)}}
@@ -0,0 +1,120 @@
+"""Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Принимает запросы aiogram вида POST /bot<token>/<method> и отвечает
+правдоподобными объектами: sendMessage и editMessageText - Message,
+getMe - пользователь-бот, getChatMember - создатель чата (бот и
+участники проходят проверку прав /report), остальное - True.
+Задержка и доля ошибок настраиваются; ошибка - ответ 429 с
+retry_after или 500, как у настоящего API. Считает вызовы по методам.
+
+Запуск отдельно:
+    python -m benchmarks.fake_telegram --port 8901 --latency-ms 50
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+BOT_USER = {'id': 42, 'is_bot': True, 'first_name': 'SocioMind', 'username': 'SocioMindBot'}
+
+
+class FakeTelegramServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 30,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.stats = {'requests': 0, 'errors': 0}
+        self._message_ids = itertools.count(1)
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle_method)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # При port=0 порт выбирает ОС
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _message(self, params) -> dict:
+        chat_id = int(params.get('chat_id', 0))
+        return {
+            'message_id': int(params.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+
+    def _result(self, method: str, params):
+        if method in ('sendmessage', 'editmessagetext'):
+            return self._message(params)
+        if method == 'getme':
+            return BOT_USER
+        if method == 'getchatmember':
+            user = {'id': int(params.get('user_id', 0)), 'is_bot': False, 'first_name': 'User'}
+            return {'status': 'creator', 'user': user, 'is_anonymous': False}
+        return True
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        params = await request.post()
+        self.stats['requests'] += 1
+        self.calls[method] += 1
+        await asyncio.sleep(self.latency_ms / 1000)
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            if self.random.random() < 0.5:
+                return web.json_response({'ok': False, 'error_code': 429,
+                                          'description': 'Too Many Requests: retry after 1',
+                                          'parameters': {'retry_after': 1}}, status=429)
+            return web.json_response({'ok': False, 'error_code': 500, 'description': 'Internal Server Error'},
+                                     status=500)
+
+        return web.json_response({'ok': True, 'result': self._result(method, params)})
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, calls=dict(self.calls))
+
+
+async def _serve(args):
+    server = FakeTelegramServer(port=args.port, latency_ms=args.latency_ms, error_rate=args.error_rate)
+    await server.start()
+    print(f"Telegram Bot API: {server.base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,72 @@
+"""Отправка записанных апдейтов Telegram на локальный webhook-сервер бота.
+
+Каждый файл JSON (один Update) отправляется --repeat раз с новым
+update_id и --concurrency запросами одновременно; выводятся коды
+ответов и задержка ответа сервера. Бот запускается отдельно:
+    BOT_MODE=webhook python main.py
+
+Запуск из корня проекта:
+    python -m benchmarks.post_updates benchmarks/updates/*.json --repeat 100 --concurrency 20
+"""
+import argparse
+import asyncio
+import collections
+import json
+import statistics
+import time
+
+import aiohttp
+
+
+async def post_all(args, updates):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    statuses = collections.Counter()
+    latencies = []
+    headers = {'X-Telegram-Bot-Api-Secret-Token': args.secret} if args.secret else {}
+
+    async def post(session, update):
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.post(args.url, json=update, headers=headers) as response:
+                await response.read()
+                statuses[response.status] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async with aiohttp.ClientSession() as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(post(session, update) for update in updates))
+        elapsed = time.perf_counter() - started
+
+        async with session.get(args.health) as response:
+            health = await response.text()
+
+    latencies.sort()
+    print(f"апдейтов: {len(updates)} за {elapsed:.2f} с, коды ответов: {dict(statuses)}")
+    print(f"задержка ответа: медиана {statistics.median(latencies):.1f} мс, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} мс, макс {latencies[-1]:.1f} мс")
+    print(f"healthz: {health}")
+
+
+def load_updates(paths, repeat: int):
+    """Копии апдейтов с уникальными update_id"""
+    updates = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            updates.append(json.load(f))
+    result = []
+    for i in range(repeat):
+        for update in updates:
+            result.append(dict(update, update_id=update['update_id'] + i * len(updates)))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+", help="JSON-файлы с апдейтами")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--health", default="http://127.0.0.1:8080/healthz")
+    parser.add_argument("--secret", help="WEBHOOK_SECRET бота")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(post_all(args, load_updates(args.files, args.repeat)))
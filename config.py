@@ -6,7 +6,101 @@ load_dotenv()
 TOKEN = os.getenv("BOT_TOKEN")
 AU_TOKEN = os.getenv("GIGACHAT_TOKEN")
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
+GIGACHAT_BASE_URL = os.getenv("GIGACHAT_BASE_URL")
+GIGACHAT_AUTH_URL = os.getenv("GIGACHAT_AUTH_URL")
+GIGACHAT_TIMEOUT = float(os.getenv("GIGACHAT_TIMEOUT", "60"))
+GIGACHAT_MODEL = os.getenv("GIGACHAT_MODEL", "GigaChat")
+# Один структурированный запрос (тип + анализ в JSON) вместо двух в конце /test
+GIGACHAT_STRUCTURED_SCORING = os.getenv("GIGACHAT_STRUCTURED_SCORING", "false").lower() in ("1", "true", "yes")
+# Локальный классификатор типа: при такой уверенности тип определяется без LLM;
+# значение больше 1 отключает. По умолчанию выключено: точность классификатора
+# ~22% (benchmarks.bench_classifier), пороги нужно калибровать на реальных ответах
+CLASSIFIER_FAST_PATH_CONFIDENCE = float(os.getenv("CLASSIFIER_FAST_PATH_CONFIDENCE", "1.1"))
+# Досрочное завершение теста, когда классификатор уверен в типе; больше 1 - отключено (по умолчанию)
+CLASSIFIER_EARLY_STOP_CONFIDENCE = float(os.getenv("CLASSIFIER_EARLY_STOP_CONFIDENCE", "1.1"))
+# С какой уверенности расхождение типа от LLM с классификатором попадает в лог
+CLASSIFIER_DISAGREEMENT_LOG_CONFIDENCE = float(os.getenv("CLASSIFIER_DISAGREEMENT_LOG_CONFIDENCE", "0.7"))
+# Планировщик запросов к LLM: число одновременных запросов и размер очереди
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+# Потоковая выдача /report: текст отчета появляется по мере генерации
+REPORT_STREAMING = os.getenv("REPORT_STREAMING", "true").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL_SEC = float(os.getenv("STREAM_EDIT_INTERVAL_SEC", "1.5"))
 GOOGLE_SHEETS_CREDS = os.getenv("GOOGLE_SHEETS_CREDS", "google_creds.json") 
+# Интервал пакетной записи результатов тестов в Google Sheets
+SHEETS_FLUSH_INTERVAL_SEC = float(os.getenv("SHEETS_FLUSH_INTERVAL_SEC", "5"))
+# Квота Sheets API на запросы в минуту, допустимая пачка подряд и число повторов при 429/5xx
+SHEETS_RATE_PER_MINUTE = int(os.getenv("SHEETS_RATE_PER_MINUTE", "60"))
+SHEETS_BURST = int(os.getenv("SHEETS_BURST", "5"))
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+
+# Режим получения апдейтов: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Webhook: публичный адрес (пустой - setWebhook не вызывается, для локальной отладки),
+# путь, секрет заголовка X-Telegram-Bot-Api-Secret-Token и адрес локального сервера
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Сколько апдейтов обрабатывается одновременно (остальные ждут своей очереди)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+# Сколько секунд при остановке ждать завершения обработчиков, прежде чем сбросить очереди записи
+SHUTDOWN_DRAIN_TIMEOUT_SEC = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT_SEC", "30"))
+# Метрики в формате Prometheus: в режиме webhook - METRICS_PATH на том же сервере,
+# в режиме polling - отдельный сервер на METRICS_PORT (0 - не запускать)
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# База данных
+DB_PATH = os.getenv("DB_PATH", "sociomind.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+# Срок хранения сообщений групповых чатов в днях (в чате меняется командой /retention)
+MESSAGE_RETENTION_DAYS = int(os.getenv("MESSAGE_RETENTION_DAYS", "7"))
+# Состояния FSM (тест в процессе) в БД: сессия без изменений дольше TTL удаляется;
+# размер кэша горячих сессий в памяти. TTL должен быть больше времени на ответ
+# (timeout_sec наборов вопросов), чтобы опоздавший ответ получил сообщение
+# об истекшем времени: при запуске он поднимается до max(timeout_sec) + FSM_SESSION_GRACE_SEC
+FSM_SESSION_TTL_SEC = int(os.getenv("FSM_SESSION_TTL_SEC", "3600"))
+FSM_SESSION_GRACE_SEC = int(os.getenv("FSM_SESSION_GRACE_SEC", "600"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+# Наборы вопросов теста (JSON)
+QUESTIONNAIRES_PATH = os.getenv("QUESTIONNAIRES_PATH", "data/questionnaires.json")
+
+# Пакетная запись сообщений групповых чатов
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "200"))
+INGEST_FLUSH_INTERVAL_MS = int(os.getenv("INGEST_FLUSH_INTERVAL_MS", "500"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+# Повторы записи пакета при временной ошибке SQLite (database is locked и т.п.)
+# с паузой INGEST_RETRY_BASE_MS, 2x, 4x ...; после них пакет отбрасывается
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "3"))
+INGEST_RETRY_BASE_MS = int(os.getenv("INGEST_RETRY_BASE_MS", "200"))
+
+# Кэш недавно записанных участников: повторная запись chat_members
+# только при смене профиля или если last_seen старше указанного интервала
+MEMBER_CACHE_SIZE = int(os.getenv("MEMBER_CACHE_SIZE", "50000"))
+MEMBER_SEEN_GRANULARITY_SEC = int(os.getenv("MEMBER_SEEN_GRANULARITY_SEC", "300"))
+
+# Кэш ответов LLM для анализа личности: время жизни, число вариантов
+# текста на один ключ (чтобы пользователи не видели одинаковый ответ)
+# и размер LRU в памяти
+LLM_CACHE_TTL_SEC = int(os.getenv("LLM_CACHE_TTL_SEC", str(7 * 24 * 60 * 60)))
+LLM_CACHE_VARIANTS = int(os.getenv("LLM_CACHE_VARIANTS", "3"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+
+# Фоновые задачи: час запуска (UTC) и случайный сдвиг, чтобы несколько
+# экземпляров бота не стартовали одновременно
+SCHEDULER_JITTER_SEC = int(os.getenv("SCHEDULER_JITTER_SEC", "600"))
+CLEANUP_HOUR = int(os.getenv("CLEANUP_HOUR", "1"))
+# Заранее подготовленные отчеты /report для чатов, прошедших порог 70%
+REPORT_PRECOMPUTE_HOUR = int(os.getenv("REPORT_PRECOMPUTE_HOUR", "2"))
+# Дневные сводки переписки: сколько самых активных участников получают
+# отдельную сводку и сколько символов сводок попадает в запрос отчета
+DIGEST_TOP_USERS = int(os.getenv("DIGEST_TOP_USERS", "10"))
+REPORT_DIGEST_BUDGET = int(os.getenv("REPORT_DIGEST_BUDGET", "3000"))
+# Бюджет (в токенах) выборки сообщений еще не обработанных дней для отчета
+REPORT_SAMPLE_TOKENS = int(os.getenv("REPORT_SAMPLE_TOKENS", "1200"))
 
 text_help = """
 📖 <b>Инструкция по использованию бота:</b>
@@ -15,6 +109,7 @@ text_help = """
 /start - Начать работу с ботом
 /test - Пройти тестирование личности
 /report - Получить анализ команды (в группе)
+/retention - Срок хранения сообщений чата (в группе)
 
 📝 <b>Процесс тестирования:</b>
 • 8 вопросов по функциям личности
@@ -43,15 +138,3 @@ text_start = """
 /test - пройти тестирование личности
 /report - получить анализ группы (только после теста)
 """
-
-
-questions = [
-    "Опишите, как вы обычно реагируете на неожиданные изменения планов или нарушение привычного хода событий?",
-    "Как вы проявляете креативность и находите нестандартные решения в рутинных или рабочих задачах?",
-    "Как вы ведете себя в новой или незнакомой обстановке, чтобы произвести хорошее впечатление или адаптироваться?",
-    "Что вас чаще всего выбивает из колеи или вызывает наибольшее напряжение в работе или общении?",
-    "Какая поддержка или помощь со стороны других людей вызывает у вас чувство доверия и благодарности?",
-    "На что вы обращаете внимание, когда оцениваете, насколько комфортно вам находиться в компании или с конкретным человеком?",
-    "Как вы обычно реагируете, когда кто-то поступает, по вашему мнению, нерационально или неэффективно?",
-    "Что вы делаете автоматически, не задумываясь, чтобы поддерживать порядок и комфорт вокруг себя или близких?"
-]
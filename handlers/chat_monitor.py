@@ -1,7 +1,7 @@
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.enums import ChatType
-from utils.helpers import save_chat_message, update_chat_member
+from utils.ingest import ingestor
 
 router = Router()
 
@@ -10,17 +10,11 @@ async def monitor_group_messages(message: Message):
     """Мониторинг сообщений в групповых чатах"""
     if message.text and not message.text.startswith('/'):
         try:
-            # Сохраняем сообщение
-            await save_chat_message(
-                chat_id=message.chat.id,
-                user_id=message.from_user.id,
-                message_text=message.text
-            )
-            
-            # Обновляем информацию об участнике
-            await update_chat_member(
+            # Ставим сообщение и данные участника в очередь пакетной записи
+            await ingestor.submit(
                 chat_id=message.chat.id,
                 user_id=message.from_user.id,
+                message_text=message.text,
                 username=message.from_user.username,
                 first_name=message.from_user.first_name,
                 last_name=message.from_user.last_name
@@ -2,21 +2,49 @@ from aiogram import Router, F
 from aiogram.types import Message, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
 from aiogram.enums import ChatType
-from aiogram.filters import Command
-from config import questions
+from aiogram.filters import Command, CommandObject
 from utils.states import TestStates
-from services.gigachat import GigaChatService
-from services.google_sheets_service import GoogleSheetsService
+from services.questionnaire import questionnaire_engine, Questionnaire, DONE, EXPIRED, TOO_LONG
+from services.gigachat import gigachat_service
+from services.google_sheets_service import sheets_service
 from utils.helpers import save_user_type, get_user_type
 from datetime import datetime
 import asyncio
 
 router = Router()
-gigachat_service = GigaChatService()
-sheets_service = GoogleSheetsService()
 
-# Хранилище для ответов пользователей
-user_answers = {}
+# Время на ответ проверяет questionnaire_engine по сроку (deadline) в данных FSM:
+# просроченный ответ отменяет тест, брошенные сессии удаляет SQLiteStorage.purge_expired
+
+def format_timeout(seconds: float) -> str:
+    """Время на ответ: целые минуты в минутах, остальное с секундами"""
+    minutes, seconds = divmod(round(seconds), 60)
+    if not seconds:
+        return f"{minutes} мин."
+    return f"{minutes} мин. {seconds} сек." if minutes else f"{seconds} сек."
+
+def expired_text(questionnaire: Questionnaire) -> str:
+    return (f"⏰ Время на ответ ({format_timeout(questionnaire.timeout_sec)}) истекло. Тест отменен.\n"
+            "Чтобы пройти тест заново, введите /test")
+
+def rules_text(questionnaire: Questionnaire) -> str:
+    functions = "\n".join(
+        f"{i}. {question.function}" for i, question in enumerate(questionnaire.questions, start=1) if question.function
+    )
+    return f"""
+📝 <b>Правила прохождения теста</b>
+
+• {len(questionnaire)} вопросов по функциям соционической модели
+• {format_timeout(questionnaire.timeout_sec)} на ответ для каждого вопроса
+• Отвечайте развернуто (но не более {questionnaire.max_answer_length} символов)
+
+• Вопросы основаны на {len(questionnaire)} функциях:
+{functions}
+<i>Для отмены теста введите /cancel</i>
+        """
+
+async def ask_question(message: Message, questionnaire: Questionnaire, index: int):
+    await message.answer(f"{index + 1}/{len(questionnaire)}: {questionnaire.questions[index].text}")
 
 @router.message(Command("test"), F.chat.type.in_({ChatType.GROUP, ChatType.SUPERGROUP}))
 async def test_in_group(message: Message):
@@ -32,7 +60,7 @@ async def test_in_group(message: Message):
 
 # Команда /test работает ТОЛЬКО в личных сообщениях
 @router.message(Command("test"), F.chat.type == ChatType.PRIVATE)
-async def start_test(message: Message, state: FSMContext):
+async def start_test(message: Message, state: FSMContext, command: CommandObject):
     # Проверяем, есть ли уже тип у пользователя
     existing_type = await get_user_type(message.from_user.id)
     if existing_type:
@@ -42,142 +70,55 @@ async def start_test(message: Message, state: FSMContext):
             parse_mode="HTML"
         )
     
-    # Инициализируем или сбрасываем ответы пользователя
-    user_answers[message.from_user.id] = []
+    # Набор вопросов можно выбрать аргументом: /test <набор>
+    questionnaire = await questionnaire_engine.start(state, command.args.strip() if command.args else None)
     
     await message.answer(
-        """
-📝 <b>Правила прохождения теста</b>\n\n"
-• 8 вопросов по функциям соционической модели
-• 5 минут на ответ для каждого вопроса
-• Отвечайте развернуто (но не более 500 символов)
-
-• Вопросы основаны на 8 функциях:
-1. Базовая
-2. Творческая
-3. Ролевая
-4. Болевая
-5. Суггестивная
-6. Референтная
-7. Ограничительная
-8. Реализующая
-<i>Для отмены теста введите /cancel</i>
-        """,
+        rules_text(questionnaire),
         parse_mode="HTML",
         reply_markup=ReplyKeyboardRemove()
     )
     await asyncio.sleep(1)
-    await message.answer(f"1/8: {questions[0]}")
-    await state.set_state(TestStates.waiting_for_answer_1)
+    await ask_question(message, questionnaire, 0)
 
 @router.message(F.text == "/cancel")
 async def cancel_test(message: Message, state: FSMContext):
     current_state = await state.get_state()
     if current_state and current_state.startswith("TestStates:"):
-        if message.from_user.id in user_answers:
-            del user_answers[message.from_user.id]
         await state.clear()
         await message.answer(
             "❌ Тест отменен. Ваши ответы не сохранены.",
             reply_markup=ReplyKeyboardRemove()
         )
 
-# Обработчики для каждого вопроса (остаются без изменений)
-@router.message(TestStates.waiting_for_answer_1, F.text)
-async def process_answer_1(message: Message, state: FSMContext):
-    if len(message.text) > 500:
-        await message.answer("❌ Ответ слишком длинный. Сократите до 500 символов и отправьте снова.")
-        return
-        
-    user_answers[message.from_user.id].append(message.text)
-    await message.answer(f"2/8: {questions[1]}")
-    await state.set_state(TestStates.waiting_for_answer_2)
-
-@router.message(TestStates.waiting_for_answer_2, F.text)
-async def process_answer_2(message: Message, state: FSMContext):
-    if len(message.text) > 500:
-        await message.answer("❌ Ответ слишком длинный. Сократите до 500 символов и отправьте снова.")
-        return
-        
-    user_answers[message.from_user.id].append(message.text)
-    await message.answer(f"3/8: {questions[2]}")
-    await state.set_state(TestStates.waiting_for_answer_3)
-
-@router.message(TestStates.waiting_for_answer_3, F.text)
-async def process_answer_3(message: Message, state: FSMContext):
-    if len(message.text) > 500:
-        await message.answer("❌ Ответ слишком длинный. Сократите до 500 символов и отправьте снова.")
-        return
-        
-    user_answers[message.from_user.id].append(message.text)
-    await message.answer(f"4/8: {questions[3]}")
-    await state.set_state(TestStates.waiting_for_answer_4)
-
-@router.message(TestStates.waiting_for_answer_4, F.text)
-async def process_answer_4(message: Message, state: FSMContext):
-    if len(message.text) > 500:
-        await message.answer("❌ Ответ слишком длинный. Сократите до 500 символов и отправьте снова.")
-        return
-        
-    user_answers[message.from_user.id].append(message.text)
-    await message.answer(f"5/8: {questions[4]}")
-    await state.set_state(TestStates.waiting_for_answer_5)
-
-@router.message(TestStates.waiting_for_answer_5, F.text)
-async def process_answer_5(message: Message, state: FSMContext):
-    if len(message.text) > 500:
-        await message.answer("❌ Ответ слишком длинный. Сократите до 500 символов и отправьте снова.")
-        return
-        
-    user_answers[message.from_user.id].append(message.text)
-    await message.answer(f"6/8: {questions[5]}")
-    await state.set_state(TestStates.waiting_for_answer_6)
-
-@router.message(TestStates.waiting_for_answer_6, F.text)
-async def process_answer_6(message: Message, state: FSMContext):
-    if len(message.text) > 500:
-        await message.answer("❌ Ответ слишком длинный. Сократите до 500 символов и отправьте снова.")
+# Один обработчик для ответа на любой вопрос: номер вопроса хранится в данных FSM
+@router.message(TestStates.answering, F.text)
+async def process_answer(message: Message, state: FSMContext):
+    step = await questionnaire_engine.answer(state, message.text)
+    if step.status == TOO_LONG:
+        await message.answer(
+            f"❌ Ответ слишком длинный. Сократите до {step.questionnaire.max_answer_length} символов и отправьте снова."
+        )
         return
-        
-    user_answers[message.from_user.id].append(message.text)
-    await message.answer(f"7/8: {questions[6]}")
-    await state.set_state(TestStates.waiting_for_answer_7)
-
-@router.message(TestStates.waiting_for_answer_7, F.text)
-async def process_answer_7(message: Message, state: FSMContext):
-    if len(message.text) > 500:
-        await message.answer("❌ Ответ слишком длинный. Сократите до 500 символов и отправьте снова.")
+
+    if step.status == EXPIRED:
+        await message.answer(expired_text(step.questionnaire), reply_markup=ReplyKeyboardRemove())
         return
-        
-    user_answers[message.from_user.id].append(message.text)
-    await message.answer(f"8/8: {questions[7]}")
-    await state.set_state(TestStates.waiting_for_answer_8)
-
-@router.message(TestStates.waiting_for_answer_8, F.text)
-async def process_answer_8(message: Message, state: FSMContext):
-    if len(message.text) > 500:
-        await message.answer("❌ Ответ слишком длинный. Сократите до 500 символов и отправьте снова.")
+    if step.status != DONE:
+        await ask_question(message, step.questionnaire, step.index)
         return
 
-    # Сохраняем последний ответ
-    user_answers[message.from_user.id].append(message.text)
-    
     await message.answer("🔮 <b>Анализирую ваши ответы...</b>", parse_mode="HTML")
 
+    async def notify_queued(position: int):
+        await message.answer(f"⏳ Сейчас много запросов. Ваша позиция в очереди: {position}")
+
     try:
-        # Определение типа личности
-        personality_type = await gigachat_service.determine_personality_type(
-            user_answers[message.from_user.id]
-        )
-        
-        # Проверяем, что тип определен корректно (содержит 4 буквы)
-        if len(personality_type.strip()) != 4:
-            personality_type = "INTJ"
-            
-        # Генерация развернутого анализа
-        analysis = await gigachat_service.generate_personality_analysis(
-            personality_type, 
-            user_answers[message.from_user.id]
+        # Определение типа личности и генерация развернутого анализа
+        personality_type, analysis = await gigachat_service.analyze_answers(
+            step.answers,
+            user_id=message.from_user.id,
+            on_queued=notify_queued
         )
 
         # Сохранение в БД
@@ -211,24 +152,12 @@ async def process_answer_8(message: Message, state: FSMContext):
         )
         print(f"Error in personality analysis: {e}")
 
-    finally:
-        # Очищаем состояние и удаляем ответы пользователя
-        await state.clear()
-        if message.from_user.id in user_answers:
-            del user_answers[message.from_user.id]
-
 # Обработчик для любого другого сообщения во время теста
-@router.message(TestStates.waiting_for_answer_1)
-@router.message(TestStates.waiting_for_answer_2)
-@router.message(TestStates.waiting_for_answer_3)
-@router.message(TestStates.waiting_for_answer_4)
-@router.message(TestStates.waiting_for_answer_5)
-@router.message(TestStates.waiting_for_answer_6)
-@router.message(TestStates.waiting_for_answer_7)
-@router.message(TestStates.waiting_for_answer_8)
-async def process_wrong_input(message: Message):
+@router.message(TestStates.answering)
+async def process_wrong_input(message: Message, state: FSMContext):
+    questionnaire = questionnaire_engine.get((await state.get_data()).get('questionnaire'))
     await message.answer(
         "❌ Пожалуйста, ответьте текстом на текущий вопрос.\n"
-        "Ответ должен быть не более 500 символов.\n"
+        f"Ответ должен быть не более {questionnaire.max_answer_length} символов.\n"
         "Для отмены теста введите /cancel"
     )
\ No newline at end of file
@@ -1,9 +1,12 @@
 import asyncio
 import logging
+import time
+from typing import Tuple
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
-from config import TOKEN
+from config import TOKEN, BOT_MODE, SHUTDOWN_DRAIN_TIMEOUT_SEC
+from utils.fsm_storage import SQLiteStorage
+from utils.middlewares import ConcurrencyLimitMiddleware, HandlerMetricsMiddleware, UPDATES_IN_FLIGHT
 
 # Импорт handlers
 from handlers.start import router as start_router
@@ -13,30 +16,21 @@ from handlers.report import router as report_router
 logging.basicConfig(level=logging.INFO)
 
 async def scheduled_cleanup():
-    """Периодическая очистка старых сообщений"""
-    while True:
-        await asyncio.sleep(24 * 60 * 60)  # 24 часа
-        from utils.helpers import cleanup_old_messages
-        await cleanup_old_messages()
+    """Очистка старых сообщений и устаревшего кэша ответов LLM"""
+    from utils.helpers import cleanup_old_messages, cleanup_llm_cache
+    from config import LLM_CACHE_TTL_SEC
+    await cleanup_old_messages()
+    await cleanup_llm_cache(time.time() - LLM_CACHE_TTL_SEC)
 
-async def main():
-    bot = Bot(token=TOKEN, parse_mode=ParseMode.HTML)
-    storage = MemoryStorage()
+def create_dispatcher(storage) -> Tuple[Dispatcher, ConcurrencyLimitMiddleware]:
+    """Диспетчер со всеми роутерами и middleware (используется и нагрузочным тестом)"""
     dp = Dispatcher(storage=storage)
-
-    asyncio.create_task(scheduled_cleanup())
-
-    from services.google_sheets_service import GoogleSheetsService
-    sheets_service = GoogleSheetsService()
-    
-    if hasattr(sheets_service, 'test_connection'):
-        sheets_service.test_connection()
-    else:
-        logging.warning("GoogleSheetsService не имеет метода test_connection")
-
-    # Инициализация базы данных
-    from utils.helpers import init_db
-    await init_db()
+    # Ограничение числа одновременно обрабатываемых апдейтов (в обоих режимах)
+    limiter = ConcurrencyLimitMiddleware()
+    dp.update.outer_middleware(limiter)
+    UPDATES_IN_FLIGHT.set_function(lambda: limiter.in_flight)
+    # Время и ошибки обработчиков всех роутеров
+    dp.message.middleware(HandlerMetricsMiddleware())
 
     # Регистрация роутеров
     dp.include_router(start_router)
@@ -49,9 +43,91 @@ async def main():
         logging.info("✅ Chat monitor router загружен")
     except ImportError as e:
         logging.warning(f"⚠️ Chat monitor не загружен: {e}")
+    return dp, limiter
+
+async def stop_components(steps):
+    """Остановка компонентов по порядку; ошибка одного (в т.ч. не успевшего запуститься) не мешает остальным"""
+    for name, stop in steps:
+        try:
+            await stop()
+        except Exception as e:
+            logging.error(f"❌ Ошибка остановки {name}: {e}")
+
+async def main():
+    bot = Bot(token=TOKEN, parse_mode=ParseMode.HTML)
+    # Состояния FSM в БД: незаконченные тесты переживают перезапуск
+    storage = SQLiteStorage()
+    dp, limiter = create_dispatcher(storage)
+
+    from config import (CLASSIFIER_EARLY_STOP_CONFIDENCE, CLEANUP_HOUR, REPORT_PRECOMPUTE_HOUR, FSM_SESSION_GRACE_SEC,
+                        METRICS_HOST, METRICS_PATH, METRICS_PORT)
+    from utils.db import database
+    from utils.helpers import init_db
+    from utils.ingest import ingestor
+    from utils.metrics import MetricsServer
+    from utils.scheduler import job_scheduler
+    from services.gigachat import gigachat_service
+    from services.google_sheets_service import sheets_service
+    from services.questionnaire import questionnaire_engine
+    from services.reports import precompute_group_reports
+    metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT, METRICS_PATH)
+
+    # Все запуски внутри try: при ошибке на любом шаге уже открытое закрывается,
+    # иначе потоки aiosqlite не дают процессу завершиться
+    try:
+        # Инициализация базы данных: пул соединений открывается один раз
+        await database.open()
+        await init_db()
+
+        # Google Sheets: индекс строк загружается один раз, запись идет в фоне пачками
+        # (после миграций: очередь sheets_spool хранится в БД)
+        await sheets_service.start()
+
+        # Фоновая пакетная запись сообщений групповых чатов
+        await ingestor.start()
+
+        # База знаний и поисковый индекс по ней строятся один раз при запуске
+        await gigachat_service.load_knowledge_base()
+
+        # Наборы вопросов теста; если включено, тест завершается досрочно, когда классификатор уверен в типе
+        questionnaire_engine.load()
+        # Сессия живет дольше срока ответа: опоздавший ответ получает сообщение об истекшем времени
+        storage.ensure_ttl(questionnaire_engine.max_timeout_sec + FSM_SESSION_GRACE_SEC)
+        if CLASSIFIER_EARLY_STOP_CONFIDENCE <= 1:
+            questionnaire_engine.add_early_stop(
+                lambda questionnaire, answers: gigachat_service.is_confident(answers, CLASSIFIER_EARLY_STOP_CONFIDENCE)
+            )
+
+        # Фоновые задачи: ежедневная очистка и заранее подготовленные отчеты
+        job_scheduler.add_job("cleanup", scheduled_cleanup, at=(CLEANUP_HOUR, 0))
+        job_scheduler.add_job("precompute_reports", lambda: precompute_group_reports(bot), at=(REPORT_PRECOMPUTE_HOUR, 0))
+        job_scheduler.add_job("fsm_cleanup", storage.purge_expired, interval=storage.ttl, jitter=60)
+        await job_scheduler.start()
+
+        # Метрики Prometheus: в режиме webhook их отдает webhook-сервер, в режиме polling - отдельный
+        if BOT_MODE != "webhook" and METRICS_PORT:
+            await metrics_server.start()
 
-    logging.info("🤖 Бот запускается...")
-    await dp.start_polling(bot)
+        logging.info(f"🤖 Бот запускается ({BOT_MODE})...")
+        if BOT_MODE == "webhook":
+            from utils.webhook import WebhookServer
+            await WebhookServer(dp, bot, limiter).run()
+        else:
+            # Сессия бота закрывается ниже, после завершения обработчиков
+            await dp.start_polling(bot, close_bot_session=False)
+    finally:
+        # Сначала дожидаемся обработчиков, затем сбрасываем очереди записи в БД и Sheets
+        await limiter.drain(SHUTDOWN_DRAIN_TIMEOUT_SEC)
+        await stop_components([
+            ("metrics", metrics_server.stop),
+            ("scheduler", job_scheduler.stop),
+            ("ingest", ingestor.stop),
+            ("sheets", sheets_service.stop),
+            ("fsm storage", storage.close),
+            ("gigachat", gigachat_service.close),
+            ("bot session", bot.session.close),
+            ("database", database.close),
+        ])
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,161 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.knowledge import parse_type_profiles, tokenize
+
+# Дихотомии в порядке букв кода типа: первая буква - положительный полюс
+DICHOTOMIES = (("E", "I"), ("S", "N"), ("T", "F"), ("J", "P"))
+# Аспекты соционики: Ч/Б (черный/белый) + Л, Э, И, С
+ASPECTS = ("БИ", "БЛ", "БС", "БЭ", "ЧИ", "ЧЛ", "ЧС", "ЧЭ")
+# Вес дихотомий относительно функций базового блока в оценке типа
+DICHOTOMY_WEIGHT = 0.5
+# Сглаживание частот слов в описаниях типов
+SMOOTHING = 0.5
+# Размер словаря признаков на каждую функцию и дихотомию
+LEXICON_SIZE = 100
+# Слово должно встречаться в описаниях хотя бы стольких типов (имена и аббревиатуры не берем)
+MIN_TYPE_FREQUENCY = 2
+# Крутизна перевода оценок типов в вероятности
+DEFAULT_SCALE = 2.0
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+# Базовый блок в разделах квадр: "СЭИ-«Дюма», БС+ЧЭ"
+_BASE_BLOCK = re.compile(r'([БЧ][ЛЭИС])\+([БЧ][ЛЭИС])')
+
+
+def profile_texts(text: str) -> Dict[str, str]:
+    """Тексты о каждом типе из socio.txt: краткое описание, недостатки и описание базового блока"""
+    return {
+        code: " ".join(p for p in (profile['description'], profile['weaknesses'], profile['base_block']) if p)
+        for code, profile in parse_type_profiles(text).items()
+    }
+
+
+def type_functions(text: str) -> Dict[str, Tuple[str, str]]:
+    """Базовая и творческая функции каждого типа из описаний базовых блоков"""
+    functions = {}
+    for code, profile in parse_type_profiles(text).items():
+        match = _BASE_BLOCK.search(profile['base_block'][:120])
+        if match:
+            functions[code] = match.groups()
+    return functions
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+class Prediction:
+    """Результат классификации: тип, уверенность и вероятности первых полюсов дихотомий"""
+
+    def __init__(self, personality_type: str, confidence: float, probabilities: np.ndarray, matched: int):
+        self.type = personality_type
+        self.confidence = confidence
+        self.probabilities = probabilities
+        self.matched = matched
+
+    @property
+    def axes(self) -> Dict[str, float]:
+        """Уверенность по каждой дихотомии: буква -> вероятность"""
+        return {
+            (first if p >= 0.5 else second): float(max(p, 1 - p))
+            for (first, second), p in zip(DICHOTOMIES, self.probabilities)
+        }
+
+    def __repr__(self) -> str:
+        return f"Prediction({self.type}, confidence={self.confidence:.2f}, matched={self.matched})"
+
+
+class TypeClassifier:
+    """Лексический классификатор типа по ответам теста.
+
+    Признаки - 8 аспектов (функций) и 4 дихотомии. Для каждого признака
+    из описаний типов строится словарь: вес слова - разница средних
+    логарифмов его частоты у типов, обладающих признаком (функция в
+    базовом блоке или первый полюс дихотомии), и у остальных типов
+    (как в наивном Байесе, но с усреднением по типам, чтобы длинные
+    описания не перевешивали). Ответы оцениваются суммой весов их слов,
+    нормированной на корень из числа найденных слов, оценка типа -
+    сумма оценок его базовой и творческой функций и полюсов дихотомий.
+    Уверенность - вероятность лучшего типа (softmax по 16 типам),
+    вероятность полюса дихотомии - сумма вероятностей его типов.
+    """
+
+    def __init__(self, codes: List[str], vocabulary: Dict[str, int], weights: np.ndarray,
+                 type_matrix: np.ndarray, bias: np.ndarray, scale: float = DEFAULT_SCALE):
+        self.codes = codes
+        self.vocabulary = vocabulary
+        self.weights = weights
+        self.type_matrix = type_matrix
+        self.bias = bias
+        self.scale = scale
+        # Типы с первым полюсом каждой дихотомии
+        self._poles = np.array([[code[axis] == first for code in codes] for axis, (first, _) in enumerate(DICHOTOMIES)])
+
+    @classmethod
+    def from_profiles(cls, texts: Dict[str, str], functions: Dict[str, Tuple[str, str]],
+                      lexicon_size: int = LEXICON_SIZE, scale: float = DEFAULT_SCALE) -> "TypeClassifier":
+        codes = sorted(texts)
+        documents = [tokenize(texts[code]) for code in codes]
+        terms = sorted({token for tokens in documents for token in tokens})
+        index = {term: i for i, term in enumerate(terms)}
+
+        counts = np.zeros((len(codes), len(terms)), dtype=np.float64)
+        for row, tokens in enumerate(documents):
+            np.add.at(counts[row], [index[t] for t in tokens], 1)
+        log_freq = np.log((counts + SMOOTHING) / (counts.sum(axis=1, keepdims=True) + SMOOTHING * len(terms)))
+        common = (counts > 0).sum(axis=0) >= MIN_TYPE_FREQUENCY
+
+        # Тип -> признаки: функции базового блока (1) и полюса дихотомий (+-DICHOTOMY_WEIGHT)
+        type_matrix = np.zeros((len(codes), len(ASPECTS) + len(DICHOTOMIES)))
+        for row, code in enumerate(codes):
+            for aspect in functions.get(code, ()):
+                type_matrix[row, ASPECTS.index(aspect)] = 1.0
+            for axis, (first, _) in enumerate(DICHOTOMIES):
+                type_matrix[row, len(ASPECTS) + axis] = DICHOTOMY_WEIGHT if code[axis] == first else -DICHOTOMY_WEIGHT
+
+        weights = np.zeros((len(terms), type_matrix.shape[1]))
+        for feature in range(type_matrix.shape[1]):
+            positive = type_matrix[:, feature] > 0
+            if not positive.any() or positive.all():
+                continue
+            diff = log_freq[positive].mean(axis=0) - log_freq[~positive].mean(axis=0)
+            diff[~common] = 0
+            # В словарь признака попадают самые различающие слова
+            keep = np.argsort(-np.abs(diff))[:lexicon_size]
+            weights[keep, feature] = diff[keep]
+
+        used = np.flatnonzero(np.abs(weights).sum(axis=1) > 0)
+        vocabulary = {terms[i]: row for row, i in enumerate(used)}
+        classifier = cls(codes, vocabulary, weights[used].astype(np.float32), type_matrix.astype(np.float32),
+                         np.zeros(len(codes)), scale)
+        # Сдвиг: описания типов в среднем не смещены ни к одному типу
+        classifier.bias = -np.mean([classifier._type_scores(tokens)[0] for tokens in documents], axis=0)
+        return classifier
+
+    @classmethod
+    def from_text(cls, text: str, **kwargs) -> "TypeClassifier":
+        return cls.from_profiles(profile_texts(text), type_functions(text), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.vocabulary)
+
+    def _type_scores(self, tokens: List[str]):
+        ids = [self.vocabulary[t] for t in tokens if t in self.vocabulary]
+        if not ids:
+            return np.zeros(len(self.codes)), 0
+        features = self.weights[ids].sum(axis=0) / np.sqrt(len(ids))
+        return self.type_matrix @ features, len(ids)
+
+    def predict(self, answers: List[str]) -> Optional[Prediction]:
+        """Тип по ответам; None, если в ответах нет ни одного слова словаря"""
+        scores, matched = self._type_scores(tokenize(" ".join(answers)))
+        if not matched:
+            return None
+        logits = self.scale * (scores + self.bias)
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+        best = int(np.argmax(probabilities))
+        return Prediction(self.codes[best], float(probabilities[best]), self._poles @ probabilities, matched)
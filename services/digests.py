@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+from config import DIGEST_TOP_USERS, REPORT_DIGEST_BUDGET
+from services.gigachat import gigachat_service
+from services.knowledge import truncate_sentences
+from services.sampler import MAX_MESSAGE_CHARS, sample_messages
+from utils.helpers import get_chat_days, get_chat_digests, get_day_messages, save_chat_digests
+
+# Период анализа истории сообщений, дней
+HISTORY_DAYS = 7
+# user_id сводки по чату в целом
+CHAT_DIGEST = 0
+# Участник получает отдельную сводку за день, начиная с этого числа сообщений
+DIGEST_MIN_MESSAGES = 3
+# Сколько токенов переписки за день уходит в один запрос сводки
+DIGEST_INPUT_TOKENS = 1500
+
+
+async def summarize_chat_day(chat_id: int, day: str, day_users: List[tuple]) -> int:
+    """Map-шаг: сводка дня по чату и по самым активным участникам.
+
+    Возвращает число сохраненных сводок; при ошибке LLM день остается
+    без сводки и будет обработан при следующем запуске.
+    """
+    messages = await get_day_messages(chat_id, day)
+    if not messages:
+        return 0
+
+    sample = await asyncio.to_thread(sample_messages, messages, DIGEST_INPUT_TOKENS)
+    chat_lines = [f"User_{m['user_id']}: {m['message_text'][:MAX_MESSAGE_CHARS]}" for m in sample]
+    digest = await gigachat_service.summarize_messages(chat_lines, "переписку группового чата", chat_id=chat_id)
+    if digest is None:
+        return 0
+
+    now = time.time()
+    rows = [(chat_id, day, CHAT_DIGEST, len(messages), digest, now)]
+    for user_id, message_count in day_users[:DIGEST_TOP_USERS]:
+        if message_count < DIGEST_MIN_MESSAGES:
+            break
+        user_messages = [m for m in messages if m['user_id'] == user_id]
+        sample = await asyncio.to_thread(sample_messages, user_messages, DIGEST_INPUT_TOKENS // 2)
+        user_digest = await gigachat_service.summarize_messages(
+            [m['message_text'][:MAX_MESSAGE_CHARS] for m in sample], "сообщения одного участника чата", chat_id=chat_id
+        )
+        if user_digest is not None:
+            rows.append((chat_id, day, user_id, message_count, user_digest, now))
+
+    await save_chat_digests(rows)
+    return len(rows)
+
+
+async def summarize_chat(chat_id: int, days: int = HISTORY_DAYS) -> int:
+    """Сводки для завершенных дней периода, у которых их еще нет"""
+    done_days = {d['day'] for d in await get_chat_digests(chat_id, days) if d['user_id'] == CHAT_DIGEST}
+    created = 0
+    for day, day_users in (await get_chat_days(chat_id, days)).items():
+        if day in done_days:
+            continue
+        try:
+            created += await summarize_chat_day(chat_id, day, day_users)
+        except Exception as e:
+            logging.error(f"❌ Ошибка сводки чата {chat_id} за {day}: {e}")
+    return created
+
+
+def build_digest_context(digests: List[Dict], names: Dict[int, str], budget: int = REPORT_DIGEST_BUDGET) -> str:
+    """Reduce-шаг: сводки за период в пределах бюджета символов.
+
+    Сводки по чату (по дням) и по участникам (объединенные за период)
+    делят бюджет пополам, поэтому размер запроса не зависит от числа
+    сообщений и участников.
+    """
+    if not digests:
+        return ""
+
+    chat_digests = [d for d in digests if d['user_id'] == CHAT_DIGEST]
+    user_digests = {}
+    for d in digests:
+        if d['user_id'] != CHAT_DIGEST:
+            user_digests.setdefault(d['user_id'], []).append(d)
+
+    lines = []
+    if chat_digests:
+        per_day = max(80, budget // 2 // len(chat_digests))
+        lines.append("Сводки по дням:")
+        lines.extend(f"{d['day']}: {truncate_sentences(d['digest'], per_day)}" for d in chat_digests)
+
+    if user_digests:
+        # Самые активные за период участники первыми
+        ranked = sorted(user_digests.items(), key=lambda item: -sum(d['message_count'] for d in item[1]))
+        ranked = ranked[:DIGEST_TOP_USERS]
+        per_user = max(120, budget // 2 // len(ranked))
+        lines.append("\nСводки по участникам:")
+        for user_id, items in ranked:
+            # Свежие дни первыми: при обрезке теряются самые старые
+            text = " ".join(d['digest'] for d in reversed(items))
+            name = names.get(user_id, f"User_{user_id}")
+            lines.append(f"{name}: {truncate_sentences(text, per_user)}")
+
+    return "\n".join(lines)
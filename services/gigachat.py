@@ -1,14 +1,299 @@
 import aiofiles
+import hashlib
+import html
+import json
+import logging
 import random
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from gigachat import GigaChat
-from gigachat.models import Chat, Messages, MessagesRole
-from config import AU_TOKEN
+from gigachat.models import Chat, ChatCompletion, Messages, MessagesRole
+from config import AU_TOKEN, GIGACHAT_BASE_URL, GIGACHAT_AUTH_URL, GIGACHAT_TIMEOUT, GIGACHAT_MODEL, GIGACHAT_STRUCTURED_SCORING, CLASSIFIER_FAST_PATH_CONFIDENCE, CLASSIFIER_DISAGREEMENT_LOG_CONFIDENCE, LLM_CACHE_TTL_SEC, LLM_CACHE_VARIANTS, LLM_CACHE_SIZE
+from services.classifier import Prediction, TypeClassifier
+from services.knowledge import KnowledgeIndex, build_profile_context, parse_type_profiles, truncate_sentences
+from services.sampler import estimate_tokens
+from services.llm_scheduler import LLMScheduler, PRIORITY_NAMES, PRIORITY_ANALYSIS, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_REPORT
+from utils.helpers import get_llm_cache_entries, save_llm_cache_entry
+from utils.metrics import registry
+
+PERSONALITY_TYPES = [
+    "ENTP", "ISFP", "ESFJ", "INTJ", "ENFJ", "ISTJ", "INFP", "ESTP",
+    "ESFP", "INTP", "ENTJ", "ISFJ", "ESTJ", "INFJ", "ISTP", "ENFP",
+]
+
+_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+LLM_REQUEST_SECONDS = registry.histogram(
+    'sociomind_llm_request_duration_seconds', 'Время запроса к GigaChat без ожидания в очереди', ['priority', 'mode'])
+LLM_ERRORS = registry.counter('sociomind_llm_errors_total', 'Ошибки запросов к GigaChat', ['priority'])
+# source: reported - usage из ответа API, estimated - оценка по длине текста (потоковые ответы)
+LLM_TOKENS = registry.counter('sociomind_llm_tokens_total', 'Израсходованные токены GigaChat', ['kind', 'source'])
+LLM_CACHE = registry.counter('sociomind_llm_cache_total', 'Обращения к кэшу ответов LLM', ['result'])
+LLM_QUEUE_DEPTH = registry.gauge('sociomind_llm_queue_depth', 'Запросы к LLM в очереди планировщика')
+LLM_ACTIVE = registry.gauge('sociomind_llm_active_requests', 'Выполняющиеся запросы к LLM')
+
+
+def parse_structured_scoring(text: str) -> Optional[Tuple[str, str]]:
+    """Разбор ответа структурированного режима: {"type": ..., "analysis_html": ...}
+
+    Возвращает None, если JSON невалиден или тип не входит в 16 допустимых.
+    """
+    match = _JSON_OBJECT.search(text or "")
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    personality_type = data.get('type')
+    analysis = data.get('analysis_html')
+    if not isinstance(personality_type, str) or not isinstance(analysis, str):
+        return None
+    personality_type = personality_type.strip().upper()
+    if personality_type not in PERSONALITY_TYPES or not analysis.strip():
+        return None
+    return personality_type, analysis.strip()
+
+
+class ResponseCache:
+    """Кэш ответов LLM: LRU в памяти поверх таблицы llm_cache в sociomind.db.
+
+    На один ключ хранится до variants вариантов ответа. Пока вариантов
+    меньше, get() возвращает промах, и новый ответ LLM пополняет набор;
+    затем каждый запрос получает случайный из сохраненных вариантов.
+    Чтобы отключить кэш, достаточно передать variants=0 или ttl=0.
+    """
+
+    def __init__(self, ttl: float = LLM_CACHE_TTL_SEC, variants: int = LLM_CACHE_VARIANTS,
+                 max_items: int = LLM_CACHE_SIZE):
+        self.ttl = ttl
+        self.variants = variants
+        self.max_items = max(1, max_items)
+        self._memory: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.variants > 0
+
+    @staticmethod
+    def make_key(payload: Chat) -> str:
+        """Хэш промпта (шаблон с подставленным типом) и параметров модели"""
+        data = {
+            'messages': [(m.role, m.content) for m in payload.messages],
+            'model': payload.model or GIGACHAT_MODEL,
+            'temperature': payload.temperature,
+            'max_tokens': payload.max_tokens,
+        }
+        return hashlib.sha256(json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'memory_keys': len(self._memory),
+        }
+
+    async def _load(self, key: str) -> List[Dict]:
+        min_created_at = time.time() - self.ttl
+        entries = self._memory.get(key)
+        if entries is None:
+            entries = await get_llm_cache_entries(key, min_created_at)
+            self._remember(key, entries)
+        else:
+            self._memory.move_to_end(key)
+        return [e for e in entries if e['created_at'] >= min_created_at]
+
+    def _remember(self, key: str, entries: List[Dict]):
+        self._memory[key] = entries
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Случайный вариант ответа или None, если вариантов пока недостаточно"""
+        if not self.enabled:
+            return None
+        entries = await self._load(key)
+        if len(entries) < self.variants:
+            self.misses += 1
+            LLM_CACHE.inc(result='miss')
+            return None
+        self.hits += 1
+        LLM_CACHE.inc(result='hit')
+        return random.choice(entries)['response']
+
+    async def put(self, key: str, response: str):
+        """Сохранение нового варианта ответа (заменяет устаревший или старейший)"""
+        if not self.enabled:
+            return
+        entries = await self._load(key)
+        used = {e['variant'] for e in entries}
+        free = [v for v in range(self.variants) if v not in used]
+        variant = free[0] if free else min(entries, key=lambda e: e['created_at'])['variant']
+
+        entry = {'variant': variant, 'response': response, 'created_at': time.time()}
+        await save_llm_cache_entry(key, variant, response, entry['created_at'])
+        entries = [e for e in entries if e['variant'] != variant] + [entry]
+        self._remember(key, entries)
+
 
 class GigaChatService:
     def __init__(self):
         self.credentials = AU_TOKEN
         self.knowledge_base = None
+        self.knowledge_index = None
+        self.type_profiles = {}
+        # Локальный классификатор типа по ответам теста (строится по базе знаний)
+        self.classifier = None
+        self.classifier_stats = {'fast_path': 0, 'fallback': 0, 'agree': 0, 'disagree': 0}
+        self.response_cache = ResponseCache()
+        # Все запросы к LLM проходят через общий планировщик с приоритетами
+        self.scheduler = LLMScheduler()
+        # estimated_* - оценка по длине текста для потоковых ответов (в их чанках нет usage)
+        self.usage = {'requests': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0,
+                      'estimated_prompt_tokens': 0, 'estimated_completion_tokens': 0}
         self.enabled = bool(AU_TOKEN and AU_TOKEN != "your_gigachat_api_key_here")
+        self._client = None
+
+    def _get_client(self) -> GigaChat:
+        """Долгоживущий клиент: один HTTP-пул и один токен на процесс.
+
+        Истекший токен SDK обновляет сам: запрос с ответом 401 повторяется
+        с новым токеном (achat и astream).
+        """
+        if self._client is None:
+            kwargs = {}
+            if GIGACHAT_BASE_URL:
+                kwargs['base_url'] = GIGACHAT_BASE_URL
+            if GIGACHAT_AUTH_URL:
+                kwargs['auth_url'] = GIGACHAT_AUTH_URL
+            self._client = GigaChat(
+                credentials=self.credentials,
+                verify_ssl_certs=False,
+                timeout=GIGACHAT_TIMEOUT,
+                model=GIGACHAT_MODEL,
+                **kwargs
+            )
+        return self._client
+
+    async def _achat(self, payload: Chat, priority: int = PRIORITY_REPORT, chat_id: int = None,
+                     user_id: int = None, on_queued=None) -> ChatCompletion:
+        """Асинхронный запрос к GigaChat через планировщик, не блокирующий цикл событий"""
+        async with self.scheduler.slot(priority, chat_id=chat_id, user_id=user_id, on_queued=on_queued):
+            try:
+                with LLM_REQUEST_SECONDS.time(priority=PRIORITY_NAMES[priority], mode='chat'):
+                    response = await self._get_client().achat(payload)
+            except Exception:
+                LLM_ERRORS.inc(priority=PRIORITY_NAMES[priority])
+                raise
+        self._count_usage(response.usage)
+        return response
+
+    async def _astream(self, payload: Chat, priority: int = PRIORITY_REPORT, chat_id: int = None,
+                       user_id: int = None, on_queued=None) -> AsyncIterator[str]:
+        """Потоковый запрос к GigaChat: фрагменты текста по мере генерации"""
+        async with self.scheduler.slot(priority, chat_id=chat_id, user_id=user_id, on_queued=on_queued):
+            parts = []
+            try:
+                with LLM_REQUEST_SECONDS.time(priority=PRIORITY_NAMES[priority], mode='stream'):
+                    async for chunk in self._get_client().astream(payload):
+                        for choice in chunk.choices:
+                            if choice.delta.content:
+                                parts.append(choice.delta.content)
+                                yield choice.delta.content
+            except Exception:
+                LLM_ERRORS.inc(priority=PRIORITY_NAMES[priority])
+                raise
+            finally:
+                # Учитывается и оборванный поток: полученная часть уже оплачена
+                self._count_stream_usage(payload, "".join(parts))
+
+    def _count_usage(self, usage):
+        """Учет израсходованных токенов"""
+        self.usage['requests'] += 1
+        if usage is not None:
+            self.usage['prompt_tokens'] += usage.prompt_tokens
+            self.usage['completion_tokens'] += usage.completion_tokens
+            self.usage['total_tokens'] += usage.total_tokens
+            LLM_TOKENS.inc(usage.prompt_tokens, kind='prompt', source='reported')
+            LLM_TOKENS.inc(usage.completion_tokens, kind='completion', source='reported')
+
+    def _count_stream_usage(self, payload: Chat, output: str):
+        """Оценка токенов потокового запроса по длине промпта и полученного текста"""
+        prompt_tokens = sum(estimate_tokens(m.content) for m in payload.messages)
+        completion_tokens = estimate_tokens(output) if output else 0
+        self.usage['requests'] += 1
+        self.usage['estimated_prompt_tokens'] += prompt_tokens
+        self.usage['estimated_completion_tokens'] += completion_tokens
+        LLM_TOKENS.inc(prompt_tokens, kind='prompt', source='estimated')
+        LLM_TOKENS.inc(completion_tokens, kind='completion', source='estimated')
+
+    async def close(self):
+        """Закрытие HTTP-сессий клиента"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def classify(self, answers: list) -> Optional[Prediction]:
+        """Тип по ответам локальным классификатором, без LLM"""
+        if self.classifier is None:
+            return None
+        return self.classifier.predict(answers)
+
+    def is_confident(self, answers: list, threshold: float) -> bool:
+        """Классификатор уверен в типе не меньше чем на threshold"""
+        prediction = self.classify(answers)
+        return prediction is not None and prediction.confidence >= threshold
+
+    def _get_fallback_personality_type(self, answers: list) -> str:
+        """Тип без LLM: по классификатору, случайный - только если в ответах нет слов словаря"""
+        self.classifier_stats['fallback'] += 1
+        prediction = self.classify(answers)
+        if prediction is None:
+            return random.choice(PERSONALITY_TYPES)
+        return prediction.type
+
+    def _check_personality_type(self, personality_type: str, answers: list):
+        """Сверка типа от LLM с классификатором: уверенное расхождение попадает в лог"""
+        prediction = self.classify(answers)
+        if prediction is None:
+            return
+        if prediction.type == personality_type:
+            self.classifier_stats['agree'] += 1
+            return
+        self.classifier_stats['disagree'] += 1
+        if prediction.confidence >= CLASSIFIER_DISAGREEMENT_LOG_CONFIDENCE:
+            logging.warning(
+                f"⚠️ Тип от LLM {personality_type} расходится с классификатором: "
+                f"{prediction.type} (уверенность {prediction.confidence:.2f})"
+            )
+
+    def _get_stub_analysis(self, personality_type: str) -> str:
+        """Описание типа из базы знаний без обращения к LLM"""
+        profile = self.type_profiles.get(personality_type)
+        if not profile:
+            return (
+                f"<b>Тип личности: {personality_type}</b>\n\n"
+                "Развернутый анализ временно недоступен. Попробуйте позже."
+            )
+
+        title = f"{personality_type} ({profile['abbreviation']}, {profile['name']})" if profile['name'] else personality_type
+        text = f"<b>Тип личности: {html.escape(title, quote=False)}</b>\n"
+        if profile['quadra']:
+            text += f"Квадра: {html.escape(profile['quadra'], quote=False)}\n"
+        text += f"\n✨ <b>Описание:</b>\n{html.escape(truncate_sentences(profile['description'], 500), quote=False)}\n"
+        if profile['weaknesses']:
+            text += f"\n➡ <b>Области развития:</b>\n{html.escape(truncate_sentences(profile['weaknesses'], 350), quote=False)}"
+        return text
 
     async def load_knowledge_base(self):
         """Загрузка базы знаний соционики"""
@@ -19,14 +304,114 @@ class GigaChatService:
             print(f"Ошибка загрузки базы знаний: {e}")
             self.knowledge_base = "Базовые знания соционики"
 
-    async def determine_personality_type(self, answers: list) -> str:
+        # Индекс строится один раз и дальше используется для всех промптов
+        self.knowledge_index = KnowledgeIndex.from_text(self.knowledge_base)
+        self.type_profiles = parse_type_profiles(self.knowledge_base)
+        self.classifier = TypeClassifier.from_text(self.knowledge_base) if self.type_profiles else None
+
+    def _get_context(self, query: str, budget: int) -> str:
+        """Релевантные запросу фрагменты базы знаний в пределах бюджета символов"""
+        if self.knowledge_index is None or not len(self.knowledge_index):
+            return self.knowledge_base[:budget]
+        return self.knowledge_index.build_context(query, budget) or self.knowledge_base[:budget]
+
+    def _get_profile_context(self, personality_type: str, budget: int) -> str:
+        """Контекст ровно об одном типе из таблицы типов"""
+        profile = self.type_profiles.get(personality_type)
+        if not profile:
+            return self._get_type_context([personality_type], budget)
+        return build_profile_context(profile, budget)
+
+    def _get_type_context(self, types: list, budget: int) -> str:
+        """Фрагменты базы знаний о заданных типах личности"""
+        if self.knowledge_index is None or not len(self.knowledge_index):
+            return self.knowledge_base[:budget]
+        return self.knowledge_index.build_type_context(types, budget) or self.knowledge_base[:budget]
+
+    async def analyze_answers(self, answers: list, user_id: int = None, on_queued=None,
+                              structured: bool = None) -> Tuple[str, str]:
+        """Тип личности и развернутый анализ по ответам теста.
+
+        Если локальный классификатор уверен в типе (CLASSIFIER_FAST_PATH_CONFIDENCE),
+        LLM пишет только анализ. В структурированном режиме это один запрос
+        к LLM, при ошибке разбора ответа - обычные два запроса.
+        """
+        if not self.knowledge_base:
+            await self.load_knowledge_base()
+
+        prediction = self.classify(answers)
+        if prediction is not None and prediction.confidence >= CLASSIFIER_FAST_PATH_CONFIDENCE:
+            self.classifier_stats['fast_path'] += 1
+            analysis = await self.generate_personality_analysis(
+                prediction.type, answers, user_id=user_id, on_queued=on_queued
+            )
+            return prediction.type, analysis
+
+        structured = GIGACHAT_STRUCTURED_SCORING if structured is None else structured
+        if self.enabled and structured:
+            result = await self.score_structured(answers, user_id=user_id, on_queued=on_queued)
+            if result:
+                self._check_personality_type(result[0], answers)
+                return result
+
+        personality_type = await self.determine_personality_type(answers, user_id=user_id, on_queued=on_queued)
+        analysis = await self.generate_personality_analysis(
+            personality_type, answers, user_id=user_id, on_queued=on_queued
+        )
+        return personality_type, analysis
+
+    async def score_structured(self, answers: list, user_id: int = None, on_queued=None) -> Optional[Tuple[str, str]]:
+        """Определение типа и анализ одним запросом с ответом в JSON"""
+        if not self.knowledge_base:
+            await self.load_knowledge_base()
+
+        answers_text = "\n".join([f"{i+1}. {answer}" for i, answer in enumerate(answers)])
+
+        prompt = f"""
+        На основе базы знаний соционики и ответов пользователя определи соционический тип личности
+        и создай развернутый анализ личности этого типа: сильные стороны и зоны развития.
+
+        База знаний соционики:
+        {self._get_context(answers_text, 3500)}
+
+        Ответы пользователя:
+        {answers_text}
+
+        Определи тип по критериям E/I, S/N, T/F, J/P.
+
+        Верни ТОЛЬКО JSON-объект без пояснений и Markdown:
+        {{"type": "<одна из аббревиатур: {', '.join(PERSONALITY_TYPES)}>",
+          "analysis_html": "<анализ не длиннее 500 символов, форматирование только HTML-тегами <b> и <i>, пункты через •>"}}
+        """
+
+        payload = Chat(
+            messages=[
+                Messages(role=MessagesRole.SYSTEM, content="Ты эксперт по соционике. Отвечай строго валидным JSON."),
+                Messages(role=MessagesRole.USER, content=prompt)
+            ],
+            temperature=0.3,
+            max_tokens=400
+        )
+
+        try:
+            response = await self._achat(payload, PRIORITY_INTERACTIVE, user_id=user_id, on_queued=on_queued)
+        except Exception as e:
+            print(f"Ошибка GigaChat в структурированном режиме: {e}")
+            return None
+
+        result = parse_structured_scoring(response.choices[0].message.content)
+        if result is None:
+            logging.warning("⚠️ Ответ структурированного режима не прошел проверку, используем два запроса")
+        return result
+
+    async def determine_personality_type(self, answers: list, user_id: int = None, on_queued=None) -> str:
         """Определение типа личности на основе ответов"""
-        if not self.enabled:
-            return self._get_random_personality_type()
-            
         if not self.knowledge_base:
             await self.load_knowledge_base()
 
+        if not self.enabled:
+            return self._get_fallback_personality_type(answers)
+
         answers_text = "\n".join([f"{i+1}. {answer}" for i, answer in enumerate(answers)])
         
         prompt = f"""
@@ -34,7 +419,7 @@ class GigaChatService:
         Верни ТОЛЬКО аббревиатуру типа (например: INTJ, ENTP, ISFJ и т.д.) без каких-либо пояснений.
 
         База знаний соционики:
-        {self.knowledge_base[:4000]}
+        {self._get_context(answers_text, 4000)}
 
         Ответы пользователя:
         {answers_text}
@@ -58,26 +443,27 @@ class GigaChatService:
         )
 
         try:
-            with GigaChat(credentials=self.credentials, verify_ssl_certs=False) as giga:
-                response = giga.chat(payload)
-                result = response.choices[0].message.content.strip()
-                # Проверяем что результат - валидный тип личности
-                if len(result) == 4 and result.isalpha():
-                    return result
-                else:
-                    return self._get_random_personality_type()
+            response = await self._achat(payload, PRIORITY_INTERACTIVE, user_id=user_id, on_queued=on_queued)
+            result = response.choices[0].message.content.strip().upper()
+            # Проверяем что результат - валидный тип личности
+            if result in PERSONALITY_TYPES:
+                self._check_personality_type(result, answers)
+                return result
+            else:
+                return self._get_fallback_personality_type(answers)
         except Exception as e:
             print(f"Ошибка GigaChat: {e}")
-            return self._get_random_personality_type()
+            return self._get_fallback_personality_type(answers)
 
-    async def generate_personality_analysis(self, personality_type: str, answers: list) -> str:
+    async def generate_personality_analysis(self, personality_type: str, answers: list,
+                                            user_id: int = None, on_queued=None) -> str:
         """Генерация развернутого анализа личности"""
-        if not self.enabled:
-            return self._get_stub_analysis(personality_type)
-            
         if not self.knowledge_base:
             await self.load_knowledge_base()
 
+        if not self.enabled:
+            return self._get_stub_analysis(personality_type)
+
         prompt = f"""
         На основе типа личности {personality_type} и базы знаний соционики, создай развернутый анализ личности.
         Опиши сильные стороны, зоны развития и рекомендации. Объем: максимум 500 символов.
@@ -87,8 +473,8 @@ class GigaChatService:
             2. Запрещены: Markdown, **
             3. Все пункты списка делай через HTML-теги
         
-        База знаний:
-        {self.knowledge_base[:3000]}
+        База знаний о типе:
+        {self._get_profile_context(personality_type, 2000)}
 
         Анализ для типа {personality_type}
 
@@ -117,33 +503,75 @@ class GigaChatService:
             max_tokens=300
         )
 
+        # Промпт зависит только от типа, поэтому готовые анализы переиспользуются
+        cache_key = self.response_cache.make_key(payload)
+        try:
+            cached = await self.response_cache.get(cache_key)
+            if cached:
+                return cached
+        except Exception as e:
+            logging.error(f"❌ Ошибка чтения кэша ответов LLM: {e}")
+
         try:
-            with GigaChat(credentials=self.credentials, verify_ssl_certs=False) as giga:
-                response = giga.chat(payload)
-                return response.choices[0].message.content
+            response = await self._achat(payload, PRIORITY_ANALYSIS, user_id=user_id, on_queued=on_queued)
+            analysis = response.choices[0].message.content
         except Exception as e:
             print(f"Ошибка GigaChat при анализе: {e}")
             return self._get_stub_analysis(personality_type)
 
-    async def generate_group_analysis(self, prompt: str) -> str:
-        """Генерация анализа группы с использованием RAG"""
-        if not self.enabled:
-            return "Анализ группы временно недоступен. Убедитесь, что настроен API ключ GigaChat."
-        
-        if not self.knowledge_base:
-            await self.load_knowledge_base()
+        try:
+            await self.response_cache.put(cache_key, analysis)
+        except Exception as e:
+            logging.error(f"❌ Ошибка записи в кэш ответов LLM: {e}")
+        return analysis
+
+    async def summarize_messages(self, lines: List[str], subject: str, chat_id: int = None) -> Optional[str]:
+        """Краткая сводка сообщений за день (фоновый шаг подготовки отчета); None при ошибке"""
+        if not self.enabled or not lines:
+            return None
+
+        prompt = f"""
+        Кратко перескажи {subject} за день: основные темы, тон общения, роли и поведение участников.
+        Не более 400 символов, без Markdown и HTML, без догадок о типах личности.
+
+        Сообщения:
+        {chr(10).join(lines)}
+        """
+
+        payload = Chat(
+            messages=[
+                Messages(role=MessagesRole.SYSTEM, content="Ты аналитик переписки в рабочих чатах. Пиши сжато и только по фактам из сообщений."),
+                Messages(role=MessagesRole.USER, content=prompt)
+            ],
+            temperature=0.3,
+            max_tokens=200
+        )
+
+        try:
+            response = await self._achat(payload, PRIORITY_BACKGROUND, chat_id=chat_id)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Ошибка GigaChat при сводке сообщений: {e}")
+            return None
+
+    def _group_payload(self, prompt: str, member_types: list = None) -> Chat:
+        """Запрос группового анализа с фрагментами базы знаний о типах участников"""
+        if member_types:
+            knowledge = self._get_type_context(sorted(set(member_types)), 3000)
+        else:
+            knowledge = self._get_context(prompt, 3000)
 
         # Добавляем базу знаний соционики в промпт для RAG
         enhanced_prompt = f"""
         {prompt}
 
         БАЗА ЗНАНИЙ ПО СОЦИОНИКЕ ДЛЯ АНАЛИЗА:
-        {self.knowledge_base[:3000]}
+        {knowledge}
 
         Проанализируй на основе приведенной базы знаний и дай конкретные рекомендации.
         """
 
-        payload = Chat(
+        return Chat(
             messages=[
                 Messages(role=MessagesRole.SYSTEM, content="Ты эксперт по командной динамике и соционике. Анализируй группы на основе типов личности и истории сообщений. Давай конкретные практические рекомендации."),
                 Messages(role=MessagesRole.USER, content=enhanced_prompt)
@@ -152,10 +580,51 @@ class GigaChatService:
             max_tokens=800
         )
 
+    async def generate_group_analysis(self, prompt: str, member_types: list = None,
+                                      chat_id: int = None, on_queued=None,
+                                      priority: int = PRIORITY_REPORT, strict: bool = False) -> str:
+        """Генерация анализа группы с использованием RAG.
+
+        При strict=True ошибки API пробрасываются, а не заменяются текстом
+        об ошибке (фоновая подготовка не должна сохранять такой отчет).
+        """
+        if not self.enabled:
+            return "Анализ группы временно недоступен. Убедитесь, что настроен API ключ GigaChat."
+        
+        if not self.knowledge_base:
+            await self.load_knowledge_base()
+
+        payload = self._group_payload(prompt, member_types)
+
         try:
-            with GigaChat(credentials=self.credentials, verify_ssl_certs=False) as giga:
-                response = giga.chat(payload)
-                return response.choices[0].message.content
+            response = await self._achat(payload, priority, chat_id=chat_id, on_queued=on_queued)
+            return response.choices[0].message.content
         except Exception as e:
+            if strict:
+                raise
             print(f"Ошибка GigaChat при анализе группы: {e}")
-            return "Не удалось сгенерировать анализ группы. Проверьте настройки API."
\ No newline at end of file
+            return "Не удалось сгенерировать анализ группы. Проверьте настройки API."
+
+    async def stream_group_analysis(self, prompt: str, member_types: list = None,
+                                    chat_id: int = None, on_queued=None) -> AsyncIterator[str]:
+        """Потоковая генерация анализа группы: фрагменты текста по мере готовности.
+
+        Ошибки API пробрасываются вызывающему, чтобы он мог сохранить
+        уже полученную часть или перейти на обычный режим.
+        """
+        if not self.enabled:
+            yield "Анализ группы временно недоступен. Убедитесь, что настроен API ключ GigaChat."
+            return
+
+        if not self.knowledge_base:
+            await self.load_knowledge_base()
+
+        payload = self._group_payload(prompt, member_types)
+        async for text in self._astream(payload, PRIORITY_REPORT, chat_id=chat_id, on_queued=on_queued):
+            yield text
+
+
+# Общий экземпляр сервиса для всех обработчиков
+gigachat_service = GigaChatService()
+LLM_QUEUE_DEPTH.set_function(lambda: gigachat_service.scheduler.depth)
+LLM_ACTIVE.set_function(lambda: gigachat_service.scheduler.active)
\ No newline at end of file
@@ -1,20 +1,71 @@
 import gspread
 from google.oauth2.service_account import Credentials
 import logging
-from config import SPREADSHEET_ID, GOOGLE_SHEETS_CREDS
+from config import SPREADSHEET_ID, GOOGLE_SHEETS_CREDS, SHEETS_FLUSH_INTERVAL_SEC
 import asyncio
+import json
+import re
+import time
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 import os
+from services.sheets_io import SheetsIO
+from utils.helpers import delete_sheets_spool, get_sheets_spool, mark_sheets_spool_failed, spool_sheets_rows
+from utils.metrics import registry
 
 # Настройка логирования
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+HEADERS = ['User ID', 'Telegram username', 'Тип личности', 'Дата тестирования']
+# Первая строка диапазона из ответа append_rows: "'Лист1'!A5:D7" -> 5
+_RANGE_START_ROW = re.compile(r'!\$?[A-Z]+\$?(\d+)')
+
+SHEETS_FLUSH_SECONDS = registry.histogram(
+    'sociomind_sheets_flush_duration_seconds', 'Время записи накопленных строк в Google Sheets', ['status'])
+SHEETS_ROWS = registry.counter('sociomind_sheets_rows_total', 'Строки, записанные в Google Sheets', ['operation'])
+SHEETS_PENDING = registry.gauge('sociomind_sheets_pending_rows', 'Пользователи в очереди записи в Google Sheets')
+
 class GoogleSheetsService:
-    def __init__(self):
+    """Запись результатов тестов в Google Sheets.
+
+    Таблица читается один раз при запуске (индекс user_id -> строка),
+    а обновления копятся в очереди и раз в flush_interval секунд
+    записываются фоновой задачей: одним batch_update для известных
+    пользователей и одним append_rows для новых. Повторные результаты
+    одного пользователя до записи схлопываются в последний.
+
+    Каждая строка сначала попадает в таблицу sheets_spool в SQLite и
+    удаляется оттуда только после успешной записи, поэтому ни ошибки
+    API, ни перезапуск бота не теряют данные: очередь дочитывается при
+    старте. Вызовы gspread идут через SheetsIO (свой пул потоков,
+    ограничение частоты и повторы при 429/5xx).
+    """
+
+    def __init__(self, flush_interval: float = SHEETS_FLUSH_INTERVAL_SEC, io: Optional[SheetsIO] = None):
         self.enabled = False
         self.client = None
         self.sheet = None
+        self.flush_interval = flush_interval
+        self.io = io or SheetsIO()
+        self._index: Optional[Dict[str, int]] = None
+        # user_id -> (строка, время постановки в очередь)
+        self._pending: Dict[str, Tuple[List, float]] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'queued': 0,
+            'coalesced': 0,
+            'flushes': 0,
+            'updated': 0,
+            'appended': 0,
+            'failed': 0,
+            'spool_errors': 0,
+            'restored': 0,
+            'last_flush_ms': 0.0,
+        }
         
         logger.info("=== НАЧАЛО ИНИЦИАЛИЗАЦИИ GOOGLE SHEETS ===")
         logger.info(f"GOOGLE_SHEETS_CREDS: {GOOGLE_SHEETS_CREDS}")
@@ -64,9 +115,6 @@ class GoogleSheetsService:
                 self.enabled = True
                 logger.info("🎉 GoogleSheetsService успешно инициализирован")
                 
-                # Инициализация заголовков
-                asyncio.create_task(self.initialize_headers())
-                
             except gspread.exceptions.SpreadsheetNotFound:
                 logger.error("❌ Таблица не найдена. Проверьте SPREADSHEET_ID.")
             except gspread.exceptions.APIError as e:
@@ -75,64 +123,190 @@ class GoogleSheetsService:
         except Exception as e:
             logger.error(f"❌ Неожиданная ошибка при инициализации: {e}", exc_info=True)
 
-    async def initialize_headers(self):
-        """Инициализация заголовков таблицы"""
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        """Количество пользователей, ожидающих записи"""
+        return len(self._pending)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['pending'] = self.depth
+        stats['indexed_rows'] = len(self._index or {})
+        stats['io'] = self.io.get_stats()
+        return stats
+
+    async def _load_index(self):
+        """Индекс user_id -> номер строки по одному чтению листа; заголовки для пустой таблицы"""
+        existing_data = await self.io.call(self.sheet.get_all_values)
+        if not existing_data:
+            await self.io.call(self.sheet.append_row, HEADERS)
+            logger.info("✅ Заголовки таблицы инициализированы")
+            existing_data = [HEADERS]
+
+        index = {}
+        for number, row in enumerate(existing_data, start=1):
+            if number > 1 and row and row[0]:
+                index.setdefault(row[0], number)
+        self._index = index
+        logger.info(f"ℹ️ Индекс Google Sheets загружен: {len(index)} пользователей")
+
+    async def _restore_spool(self):
+        """Строки, не записанные до перезапуска, возвращаются в очередь"""
         try:
-            if self.enabled:
-                logger.info("📝 Проверяю заголовки таблицы...")
-                existing_data = self.sheet.get_all_values()
-                
-                if not existing_data:
-                    headers = ['User ID', 'Telegram username', 'Тип личности', 'Дата тестирования']
-                    self.sheet.append_row(headers)
-                    logger.info("✅ Заголовки таблицы инициализированы")
-                else:
-                    logger.info("ℹ️ Таблица уже содержит данные")
-                    
+            entries = await get_sheets_spool()
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения очереди Google Sheets: {e}")
+            return
+        for entry in entries:
+            if entry['user_id'] not in self._pending:
+                self._pending[entry['user_id']] = (json.loads(entry['row_data']), entry['queued_at'])
+                self.stats['restored'] += 1
+        if entries:
+            logger.info(f"ℹ️ В очереди Google Sheets {len(entries)} строк с прошлого запуска")
+
+    async def start(self):
+        """Восстановление очереди, загрузка индекса строк и запуск фоновой записи"""
+        if not self.enabled or self.running:
+            return
+        await self._restore_spool()
+        try:
+            await self._load_index()
         except Exception as e:
-            logger.error(f"❌ Ошибка инициализации заголовков: {e}")
+            # Индекс загрузится перед первой записью
+            logger.error(f"❌ Ошибка загрузки индекса Google Sheets: {e}")
+        self._wakeup = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        if self._pending:
+            self._wakeup.set()
+
+    async def stop(self):
+        """Остановка фоновой записи с записью накопленного; незаписанное остается в sheets_spool"""
+        if self.running:
+            self._stop.set()
+            self._wakeup.set()
+            await self._task
+        self._task = None
+        await self.flush()
+        self.io.shutdown()
+
+    async def _run(self):
+        while not self._stop.is_set():
+            await self._wakeup.wait()
+            # Копим изменения в течение интервала, чтобы записать их одним запросом
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+            if self._pending:
+                # Запись не удалась - повторим через интервал
+                self._wakeup.set()
 
     async def save_to_sheets(self, user_data: dict):
-        """Сохранение данных пользователя в Google Sheets"""
+        """Постановка данных пользователя в очередь записи в Google Sheets"""
         if not self.enabled:
             logger.warning(f"⚠️ Google Sheets отключен. Данные не сохранены: {user_data}")
             return
-        
+
+        key = str(user_data['user_id'])
+        row = [
+            user_data['user_id'],
+            user_data['username'],
+            user_data['personality_type'],
+            user_data.get('timestamp', datetime.now().isoformat())
+        ]
+        queued_at = time.time()
         try:
-            logger.info(f"💾 Сохранение данных пользователя {user_data['user_id']}...")
-            
-            # Ищем существующего пользователя
-            try:
-                existing_user = self.sheet.find(str(user_data['user_id']))
-                if existing_user:
-                    row = existing_user.row
-                    self.sheet.update(f'A{row}:D{row}', [[
-                        user_data['user_id'],
-                        user_data['username'],
-                        user_data['personality_type'],
-                        user_data.get('timestamp', datetime.now().isoformat())
-                    ]])
-                    logger.info(f"✅ Данные пользователя {user_data['user_id']} обновлены")
-                else:
-                    self.sheet.append_row([
-                        user_data['user_id'],
-                        user_data['username'],
-                        user_data['personality_type'],
-                        user_data.get('timestamp', datetime.now().isoformat())
-                    ])
-                    logger.info(f"✅ Данные пользователя {user_data['user_id']} добавлены")
-                    
-            except gspread.exceptions.CellNotFound:
-                self.sheet.append_row([
-                    user_data['user_id'],
-                    user_data['username'],
-                    user_data['personality_type'],
-                    user_data.get('timestamp', datetime.now().isoformat())
-                ])
-                logger.info(f"✅ Данные пользователя {user_data['user_id']} добавлены (новый пользователь)")
-                
+            await spool_sheets_rows([(key, json.dumps(row, ensure_ascii=False), queued_at)])
         except Exception as e:
-            logger.error(f"❌ Ошибка сохранения в Google Sheets: {e}")
+            # Строка все равно уйдет из памяти, но не переживет перезапуск
+            self.stats['spool_errors'] += 1
+            logger.error(f"❌ Ошибка записи в очередь Google Sheets: {e}")
+
+        if key in self._pending:
+            self.stats['coalesced'] += 1
+        self._pending[key] = (row, queued_at)
+        self.stats['queued'] += 1
+
+        if self.running:
+            self._wakeup.set()
+        else:
+            # Фоновая запись не запущена - пишем сразу
+            await self.flush()
+
+    async def flush(self):
+        """Запись накопленных изменений в таблицу"""
+        async with self._lock:
+            if not self._pending or not self.enabled:
+                return
+            pending, self._pending = self._pending, {}
+            started = time.perf_counter()
+            try:
+                updated, appended = await self._write({key: row for key, (row, _) in pending.items()})
+            except Exception as e:
+                self.stats['failed'] += 1
+                SHEETS_FLUSH_SECONDS.observe(time.perf_counter() - started, status='error')
+                logger.error(f"❌ Ошибка сохранения в Google Sheets: {e}")
+                # Возвращаем в очередь то, что не успели перезаписать новыми данными
+                for key, item in pending.items():
+                    self._pending.setdefault(key, item)
+                try:
+                    await mark_sheets_spool_failed(list(pending), str(e)[:500])
+                except Exception as spool_error:
+                    logger.error(f"❌ Ошибка обновления очереди Google Sheets: {spool_error}")
+                return
+
+            try:
+                await delete_sheets_spool([(key, queued_at) for key, (_, queued_at) in pending.items()])
+            except Exception as e:
+                # Строки останутся в очереди и будут записаны повторно после перезапуска
+                self.stats['spool_errors'] += 1
+                logger.error(f"❌ Ошибка очистки очереди Google Sheets: {e}")
+
+            self.stats['flushes'] += 1
+            self.stats['updated'] += updated
+            self.stats['appended'] += appended
+            self.stats['last_flush_ms'] = (time.perf_counter() - started) * 1000
+            SHEETS_FLUSH_SECONDS.observe(self.stats['last_flush_ms'] / 1000, status='ok')
+            SHEETS_ROWS.inc(updated, operation='update')
+            SHEETS_ROWS.inc(appended, operation='append')
+            logger.info(f"✅ Google Sheets: обновлено {updated}, добавлено {appended}")
+
+    async def _write(self, pending: Dict[str, List]) -> tuple:
+        """Один batch_update для известных строк и один append_rows для новых"""
+        if self._index is None:
+            await self._load_index()
+
+        updates = []
+        appends = []
+        append_keys = []
+        for key, row in pending.items():
+            number = self._index.get(key)
+            if number:
+                updates.append({'range': f'A{number}:D{number}', 'values': [row]})
+            else:
+                appends.append(row)
+                append_keys.append(key)
+
+        if updates:
+            await self.io.call(self.sheet.batch_update, updates)
+        if appends:
+            response = await self.io.call(self.sheet.append_rows, appends)
+            match = _RANGE_START_ROW.search(response.get('updates', {}).get('updatedRange', ''))
+            if match:
+                first_row = int(match.group(1))
+                for offset, key in enumerate(append_keys):
+                    self._index[key] = first_row + offset
+            else:
+                # Номера строк неизвестны - перечитаем индекс целиком
+                await self._load_index()
+        return len(updates), len(appends)
 
     async def test_connection(self):
         """Тест подключения к Google Sheets"""
@@ -140,9 +314,14 @@ class GoogleSheetsService:
             return False
         
         try:
-            self.sheet.row_values(1)
+            await self.io.call(self.sheet.row_values, 1)
             logger.info("✅ Тест подключения к Google Sheets пройден")
             return True
         except Exception as e:
             logger.error(f"❌ Тест подключения к Google Sheets не пройден: {e}")
             return False
+
+
+# Общий экземпляр сервиса для всех обработчиков
+sheets_service = GoogleSheetsService()
+SHEETS_PENDING.set_function(lambda: sheets_service.depth)
\ No newline at end of file
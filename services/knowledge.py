@@ -0,0 +1,292 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Соответствие 4-буквенных кодов соционическим аббревиатурам
+TYPE_ABBREVIATIONS = {
+    "ENTP": "ИЛЭ", "ISFP": "СЭИ", "ESFJ": "ЭСЭ", "INTJ": "ЛИИ",
+    "ENFJ": "ЭИЭ", "ISTJ": "ЛСИ", "INFP": "ИЭИ", "ESTP": "СЛЭ",
+    "ESFP": "СЭЭ", "INTP": "ИЛИ", "ENTJ": "ЛИЭ", "ISFJ": "ЭСИ",
+    "ESTJ": "ЛСЭ", "INFJ": "ЭИИ", "ISTP": "СЛИ", "ENFP": "ИЭЭ",
+}
+ABBREVIATION_TYPES = {abbr: code for code, abbr in TYPE_ABBREVIATIONS.items()}
+
+_TYPE_LINE = re.compile(r'^([EI][NS][TF][JP])\s')
+_ABBR = re.compile(r'\b(' + '|'.join(ABBREVIATION_TYPES) + r')\b')
+_QUADRA_LINE = re.compile(r'^\d\s+квадра\s+\w+', re.IGNORECASE)
+_WORD = re.compile(r'\w+')
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+# Имя типа: "(ЭСИ, Драйзер)" в кратком описании или "ЭСИ-«Драйзер»" в разделах квадр
+_TYPE_NAME = re.compile(r'\(\w{3},\s*([^)]+)\)|«([^»]+)»')
+
+SUMMARY_SECTION = "Краткое описание социотипов"
+
+# Служебные слова, которые не несут смысла для поиска
+STOP_WORDS = {
+    "и", "в", "во", "не", "что", "он", "на", "я", "с", "со", "как", "а", "то",
+    "все", "она", "так", "его", "но", "да", "ты", "к", "у", "же", "вы", "за",
+    "бы", "по", "только", "ее", "мне", "было", "вот", "от", "меня", "еще",
+    "нет", "о", "из", "ему", "когда", "даже", "ну", "ли", "если", "уже", "или",
+    "ни", "быть", "был", "него", "до", "вас", "нибудь", "опять", "уж", "вам",
+    "ведь", "там", "потом", "себя", "ничего", "ей", "может", "они", "тут",
+    "где", "есть", "надо", "ней", "для", "мы", "тебя", "их", "чем", "была",
+    "сам", "чтоб", "без", "будто", "чего", "раз", "тоже", "себе", "под",
+    "будет", "ж", "тогда", "кто", "этот", "того", "потому", "этого", "какой",
+    "совсем", "ним", "здесь", "этом", "один", "почти", "мой", "тем", "чтобы",
+    "нее", "были", "куда", "зачем", "всех", "можно", "об", "это",
+    "также", "очень", "свои", "своих", "своей", "свой",
+}
+
+# Длина псевдоосновы: грубый стемминг для русского языка
+STEM_LENGTH = 6
+# Максимальная длина одного фрагмента базы знаний
+MAX_CHUNK_CHARS = 900
+
+
+def tokenize(text: str) -> List[str]:
+    """Нижний регистр, без служебных слов, с обрезкой до псевдоосновы"""
+    tokens = []
+    for word in _WORD.findall(text.lower().replace('ё', 'е')):
+        if word in STOP_WORDS or len(word) < 2:
+            continue
+        tokens.append(word[:STEM_LENGTH])
+    return tokens
+
+
+def expand_type_query(types: Iterable[str]) -> str:
+    """Запрос по типам: код и соционическая аббревиатура каждого типа"""
+    parts = []
+    for code in types:
+        code = code.strip().upper()
+        parts.append(code)
+        if code in TYPE_ABBREVIATIONS:
+            parts.append(TYPE_ABBREVIATIONS[code])
+    return " ".join(parts)
+
+
+def _split_long(text: str, limit: int) -> List[str]:
+    """Разбиение длинного абзаца по границам предложений"""
+    if len(text) <= limit:
+        return [text]
+
+    parts, current = [], ""
+    for sentence in _SENTENCE_END.split(text):
+        if current and len(current) + len(sentence) + 1 > limit:
+            parts.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _parse_blocks(text: str) -> List[Dict]:
+    """Разбиение socio.txt на блоки: абзацы одного типа или раздела до пустой строки"""
+    section = SUMMARY_SECTION
+    blocks = []
+    current = None
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            current = None
+            continue
+
+        if _QUADRA_LINE.match(line):
+            section = line
+            current = None
+            continue
+
+        type_match = _TYPE_LINE.match(line)
+        if type_match or current is None:
+            # Тип определяем по аббревиатуре: 4-буквенные коды в файле местами неточны
+            abbr = _ABBR.search(line[:80]) if type_match else None
+            type_code = ABBREVIATION_TYPES[abbr.group(1)] if abbr else None
+            current = {
+                'section': section,
+                'type': type_code,
+                'title': line[:80] if type_match else section,
+                'lines': [line],
+            }
+            blocks.append(current)
+        else:
+            current['lines'].append(line)
+
+    return blocks
+
+
+def chunk_knowledge_base(text: str, max_chars: int = MAX_CHUNK_CHARS) -> List[Dict]:
+    """Разбиение socio.txt на фрагменты по типам и разделам.
+
+    Каждый фрагмент: {'section', 'type', 'title', 'text'}. Абзацы одного
+    типа идут подряд до пустой строки и режутся по границам предложений.
+    """
+    chunks = []
+    for block in _parse_blocks(text):
+        label = f"{block['type']} ({TYPE_ABBREVIATIONS[block['type']]})" if block['type'] else None
+        parts = _split_long(" ".join(block['lines']), max_chars)
+        for number, part in enumerate(parts):
+            # Продолжение описания помечаем типом, чтобы фрагмент был понятен отдельно
+            if number and label:
+                part = f"{label}: {part}"
+            chunks.append({
+                'section': block['section'],
+                'type': block['type'],
+                'title': block['title'],
+                'text': part,
+            })
+    return chunks
+
+
+def parse_type_profiles(text: str) -> Dict[str, Dict]:
+    """Таблица тип -> описание, недостатки, квадра и базовый блок.
+
+    Из краткого описания берется первый абзац типа (описание) и остальные
+    абзацы (недостатки), из разделов квадр - название квадры и описание
+    базового блока.
+    """
+    profiles = {}
+    for block in _parse_blocks(text):
+        code = block['type']
+        if not code:
+            continue
+
+        profile = profiles.setdefault(code, {
+            'code': code,
+            'abbreviation': TYPE_ABBREVIATIONS[code],
+            'name': '',
+            'quadra': '',
+            'description': '',
+            'weaknesses': '',
+            'base_block': '',
+        })
+        # 4-буквенный код в начале строки убираем: в файле он местами неточен
+        first_line = _TYPE_LINE.sub('', block['lines'][0])
+        name = _TYPE_NAME.search(first_line[:80])
+        if name and not profile['name']:
+            profile['name'] = (name.group(1) or name.group(2)).strip()
+
+        if block['section'] == SUMMARY_SECTION:
+            profile['description'] = first_line
+            profile['weaknesses'] = " ".join(block['lines'][1:])
+        else:
+            profile['quadra'] = block['section'].split()[-1]
+            profile['base_block'] = " ".join([first_line] + block['lines'][1:])
+
+    return profiles
+
+
+def truncate_sentences(text: str, limit: int) -> str:
+    """Обрезка текста до limit символов по границе предложения"""
+    if len(text) <= limit:
+        return text
+    parts = _split_long(text, limit)
+    return parts[0] if len(parts[0]) <= limit else text[:limit]
+
+
+def build_profile_context(profile: Dict, budget: int) -> str:
+    """Компактный контекст о типе для промпта: ровно то, что относится к типу"""
+    header = f"{profile['code']} ({profile['abbreviation']}"
+    if profile['name']:
+        header += f", {profile['name']}"
+    header += ")"
+    if profile['quadra']:
+        header += f", квадра {profile['quadra']}"
+
+    # Бюджет делится между описанием, недостатками и базовым блоком
+    remaining = max(0, budget - len(header))
+    sections = [
+        ("", profile['description'], 0.45),
+        ("Недостатки: ", profile['weaknesses'], 0.3),
+        ("Базовый блок: ", profile['base_block'], 0.25),
+    ]
+    lines = [header]
+    for prefix, value, share in sections:
+        if value:
+            lines.append(prefix + truncate_sentences(value, int(remaining * share) - len(prefix)))
+    return "\n".join(lines)
+
+
+class KnowledgeIndex:
+    """Лексический индекс BM25 по фрагментам базы знаний.
+
+    Строится один раз при запуске: веса BM25 для всех фрагментов
+    хранятся в матрице, и оценка запроса - одно матричное умножение.
+    """
+
+    def __init__(self, chunks: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.vocabulary: Dict[str, int] = {}
+
+        docs = []
+        for chunk in chunks:
+            # Заголовок (код типа, аббревиатура, раздел) тоже участвует в поиске
+            type_terms = expand_type_query([chunk['type']]) if chunk['type'] else ""
+            tokens = tokenize(f"{type_terms} {chunk['section']} {chunk['text']}")
+            docs.append(tokens)
+            for token in tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        tf = np.zeros((len(docs), max(1, len(self.vocabulary))), dtype=np.float32)
+        for row, tokens in enumerate(docs):
+            if not tokens:
+                continue
+            ids, counts = np.unique([self.vocabulary[t] for t in tokens], return_counts=True)
+            tf[row, ids] = counts
+
+        doc_len = tf.sum(axis=1, keepdims=True)
+        avg_len = float(doc_len.mean()) if len(docs) else 1.0
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * doc_len / max(avg_len, 1e-9))
+        self.weights = (tf * (k1 + 1) / (tf + norm)) * idf
+
+    @classmethod
+    def from_text(cls, text: str) -> "KnowledgeIndex":
+        return cls(chunk_knowledge_base(text))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def _query_vector(self, query: str) -> np.ndarray:
+        vector = np.zeros(self.weights.shape[1], dtype=np.float32)
+        for token in tokenize(query):
+            idx = self.vocabulary.get(token)
+            if idx is not None:
+                vector[idx] += 1
+        return vector
+
+    def search(self, query: str, k: int = 5) -> List[tuple]:
+        """Top-k фрагментов: список (оценка, индекс фрагмента)"""
+        if not self.chunks:
+            return []
+        scores = self.weights @ self._query_vector(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(i)) for i in top if scores[i] > 0]
+
+    def build_context(self, query: str, budget: int, k: int = 8) -> str:
+        """Наиболее релевантные фрагменты, уложенные в бюджет символов"""
+        selected, used = [], 0
+        for _, idx in self.search(query, k):
+            text = self.chunks[idx]['text']
+            if used + len(text) > budget:
+                if not selected:
+                    selected.append((idx, text[:budget]))
+                continue
+            selected.append((idx, text))
+            used += len(text) + 2
+
+        # Порядок документа сохраняет связность соседних фрагментов
+        return "\n\n".join(text for _, text in sorted(selected))
+
+    def build_type_context(self, types: Iterable[str], budget: int,
+                           extra_query: Optional[str] = None, k: int = 8) -> str:
+        """Контекст по набору типов личности (и дополнительному запросу)"""
+        query = expand_type_query(types)
+        if extra_query:
+            query = f"{query} {extra_query}"
+        return self.build_context(query, budget, k)
@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE
+
+# Классы приоритета: чем меньше число, тем раньше обслуживается запрос
+PRIORITY_INTERACTIVE = 0   # определение типа в конце /test
+PRIORITY_ANALYSIS = 1      # развернутый анализ личности
+PRIORITY_REPORT = 2        # групповой отчет /report
+PRIORITY_BACKGROUND = 3    # фоновая подготовка отчетов
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_ANALYSIS: "analysis",
+    PRIORITY_REPORT: "report",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+class SchedulerSaturated(Exception):
+    """Очередь запросов к LLM переполнена"""
+
+
+class LLMScheduler:
+    """Планировщик запросов к LLM с ограничением параллелизма.
+
+    Одновременно выполняется не более workers запросов, остальные ждут
+    в очереди по приоритету. Внутри одного приоритета запросы чата или
+    пользователя, у которых уже есть ожидающие, встают позади первых
+    запросов остальных, чтобы один активный чат не занял всю очередь.
+    """
+
+    def __init__(self, workers: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._pending_chats = Counter()
+        self._pending_users = Counter()
+        self.stats = {
+            name: {'requests': 0, 'queued': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+        self.stats['rejected'] = 0
+
+    @property
+    def depth(self) -> int:
+        """Количество запросов в очереди"""
+        return len(self._waiters)
+
+    @property
+    def active(self) -> int:
+        """Количество выполняющихся запросов"""
+        return self._active
+
+    def get_stats(self) -> Dict:
+        stats = {'active': self._active, 'queue_depth': self.depth, 'rejected': self.stats['rejected']}
+        for name in PRIORITY_NAMES.values():
+            item = dict(self.stats[name])
+            item['avg_wait'] = item['total_wait'] / item['requests'] if item['requests'] else 0.0
+            stats[name] = item
+        return stats
+
+    def _position(self, entry: list) -> int:
+        return sum(1 for waiter in self._waiters if waiter[:3] <= entry[:3])
+
+    def _release(self):
+        """Передача освободившегося слота следующему в очереди"""
+        while self._waiters:
+            entry = heapq.heappop(self._waiters)
+            future = entry[3]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_REPORT, chat_id: Optional[int] = None,
+                   user_id: Optional[int] = None,
+                   on_queued: Optional[Callable[[int], Awaitable]] = None):
+        """Ожидание свободного слота на время блока async with.
+
+        on_queued(position) вызывается, если запросу пришлось встать в очередь.
+        """
+        stats = self.stats[PRIORITY_NAMES[priority]]
+        started = time.monotonic()
+
+        if self._active < self.workers and not self._waiters:
+            self._active += 1
+        else:
+            await self._wait(priority, chat_id, user_id, on_queued)
+            stats['queued'] += 1
+
+        # requests - только получившие слот: отклоненные считаются в rejected
+        wait = time.monotonic() - started
+        stats['requests'] += 1
+        stats['total_wait'] += wait
+        stats['max_wait'] = max(stats['max_wait'], wait)
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _wait(self, priority: int, chat_id: Optional[int], user_id: Optional[int],
+                    on_queued: Optional[Callable[[int], Awaitable]]):
+        if len(self._waiters) >= self.max_queue:
+            self.stats['rejected'] += 1
+            raise SchedulerSaturated(f"Очередь запросов к LLM переполнена ({self.max_queue})")
+
+        fairness = max(self._pending_chats[chat_id] if chat_id is not None else 0,
+                       self._pending_users[user_id] if user_id is not None else 0)
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, fairness, next(self._sequence), future]
+        heapq.heappush(self._waiters, entry)
+        if chat_id is not None:
+            self._pending_chats[chat_id] += 1
+        if user_id is not None:
+            self._pending_users[user_id] += 1
+
+        try:
+            if on_queued is not None:
+                try:
+                    await on_queued(self._position(entry))
+                except Exception as e:
+                    logging.warning(f"⚠️ Не удалось уведомить об очереди LLM: {e}")
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже был передан этому запросу - возвращаем его
+                self._release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+        finally:
+            if chat_id is not None:
+                self._pending_chats[chat_id] -= 1
+                if self._pending_chats[chat_id] <= 0:
+                    del self._pending_chats[chat_id]
+            if user_id is not None:
+                self._pending_users[user_id] -= 1
+                if self._pending_users[user_id] <= 0:
+                    del self._pending_users[user_id]
@@ -0,0 +1,165 @@
+import json
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from aiogram.fsm.context import FSMContext
+
+from config import QUESTIONNAIRES_PATH
+from utils.states import TestStates
+
+# Результат обработки ответа
+NEXT = "next"
+DONE = "done"
+EXPIRED = "expired"
+TOO_LONG = "too_long"
+
+
+class Question:
+    def __init__(self, id: str, text: str, function: Optional[str] = None):
+        self.id = id
+        self.text = text
+        self.function = function
+
+
+class Questionnaire:
+    """Набор вопросов теста с ограничениями на ответы"""
+
+    def __init__(self, name: str, title: str, questions: List[Question], timeout_sec: float = 300,
+                 max_answer_length: int = 500, min_questions: Optional[int] = None):
+        if not questions:
+            raise ValueError(f"В наборе вопросов {name} нет вопросов")
+        self.name = name
+        self.title = title
+        self.questions = questions
+        self.timeout_sec = timeout_sec
+        self.max_answer_length = max_answer_length
+        # Раньше этого числа ответов тест не завершается досрочно
+        self.min_questions = min(min_questions or len(questions), len(questions))
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    @classmethod
+    def from_dict(cls, name: str, data: Dict) -> "Questionnaire":
+        return cls(
+            name,
+            data.get('title', name),
+            [Question(q.get('id', str(i)), q['text'], q.get('function')) for i, q in enumerate(data['questions'])],
+            timeout_sec=data.get('timeout_sec', 300),
+            max_answer_length=data.get('max_answer_length', 500),
+            min_questions=data.get('min_questions'),
+        )
+
+
+class Step:
+    """Результат шага теста: следующий вопрос, завершение или отказ"""
+
+    def __init__(self, status: str, questionnaire: Questionnaire, index: int, answers: Optional[List[str]] = None):
+        self.status = status
+        self.questionnaire = questionnaire
+        self.index = index
+        self.answers = answers or []
+
+    @property
+    def question(self) -> Question:
+        return self.questionnaire.questions[self.index]
+
+    @property
+    def early(self) -> bool:
+        """Тест завершен раньше последнего вопроса"""
+        return self.status == DONE and len(self.answers) < len(self.questionnaire)
+
+
+# Хук досрочного завершения: по набору и ответам решает, достаточно ли ответов
+EarlyStopHook = Callable[[Questionnaire, List[str]], bool]
+
+
+class QuestionnaireEngine:
+    """Прохождение теста: одно состояние FSM и номер вопроса в его данных.
+
+    Наборы вопросов загружаются из JSON (QUESTIONNAIRES_PATH). В данных
+    FSM хранятся имя набора, номер текущего вопроса, ответы и срок
+    ответа на текущий вопрос, поэтому любой ответ обрабатывается одним
+    обработчиком независимо от номера вопроса.
+    """
+
+    def __init__(self, path: str = QUESTIONNAIRES_PATH):
+        self.path = path
+        self.sets: Dict[str, Questionnaire] = {}
+        self.default: Optional[str] = None
+        self._early_stop: List[EarlyStopHook] = []
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.sets = {name: Questionnaire.from_dict(name, item) for name, item in data['sets'].items()}
+        self.default = data.get('default') or next(iter(self.sets))
+        logging.info(f"✅ Загружены наборы вопросов: {', '.join(self.sets)}")
+
+    @property
+    def max_timeout_sec(self) -> float:
+        """Наибольшее время на ответ среди наборов вопросов"""
+        if not self.sets:
+            self.load()
+        return max(questionnaire.timeout_sec for questionnaire in self.sets.values())
+
+    def get(self, name: Optional[str] = None) -> Questionnaire:
+        """Набор вопросов по имени; неизвестное имя - набор по умолчанию"""
+        if not self.sets:
+            self.load()
+        return self.sets.get(name) or self.sets[self.default]
+
+    def add_early_stop(self, hook: EarlyStopHook):
+        self._early_stop.append(hook)
+
+    def _should_stop(self, questionnaire: Questionnaire, answers: List[str]) -> bool:
+        if len(answers) < questionnaire.min_questions:
+            return False
+        for hook in self._early_stop:
+            try:
+                if hook(questionnaire, answers):
+                    return True
+            except Exception as e:
+                logging.error(f"❌ Ошибка проверки досрочного завершения теста: {e}")
+        return False
+
+    async def start(self, state: FSMContext, name: Optional[str] = None) -> Questionnaire:
+        """Начало теста с первого вопроса"""
+        questionnaire = self.get(name)
+        await state.set_data({
+            'questionnaire': questionnaire.name,
+            'index': 0,
+            'answers': [],
+            'deadline': time.time() + questionnaire.timeout_sec,
+        })
+        await state.set_state(TestStates.answering)
+        return questionnaire
+
+    async def answer(self, state: FSMContext, text: str) -> Step:
+        """Обработка ответа на текущий вопрос.
+
+        Просроченный ответ отменяет тест, слишком длинный не принимается.
+        При завершении теста состояние очищается, ответы возвращаются в Step.
+        """
+        data = await state.get_data()
+        questionnaire = self.get(data.get('questionnaire'))
+        index = data.get('index', 0)
+
+        if time.time() > data.get('deadline', float('inf')):
+            await state.clear()
+            return Step(EXPIRED, questionnaire, index)
+        if len(text) > questionnaire.max_answer_length:
+            return Step(TOO_LONG, questionnaire, index)
+
+        answers = data.get('answers', []) + [text]
+        index += 1
+        if index >= len(questionnaire) or self._should_stop(questionnaire, answers):
+            await state.clear()
+            return Step(DONE, questionnaire, index, answers)
+
+        await state.update_data(index=index, answers=answers, deadline=time.time() + questionnaire.timeout_sec)
+        return Step(NEXT, questionnaire, index, answers)
+
+
+questionnaire_engine = QuestionnaireEngine()
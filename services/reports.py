@@ -0,0 +1,314 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+from aiogram import Bot
+from aiogram.types import Message
+
+from config import REPORT_SAMPLE_TOKENS, REPORT_STREAMING
+from services.digests import CHAT_DIGEST, HISTORY_DAYS, build_digest_context, summarize_chat
+from services.gigachat import gigachat_service
+from services.llm_scheduler import PRIORITY_BACKGROUND
+from services.sampler import sample_messages
+from utils.helpers import (get_active_chat_ids, get_chat_activity, get_chat_digests, get_chat_report_members,
+                           get_day_messages, get_today_report, save_report)
+from utils.streaming import ProgressiveEditor
+
+# Доля протестированных участников, начиная с которой строится отчет
+REPORT_THRESHOLD = 70
+
+
+def display_name(member: Dict) -> str:
+    if member['username']:
+        return f"@{member['username']}"
+    return member['first_name'] or f"User_{member['user_id']}"
+
+
+async def collect_group(chat_id: int) -> Dict:
+    """Участники чата, разделенные на протестированных и нет.
+
+    names - отображаемые имена всех участников по user_id.
+    """
+    members = await get_chat_report_members(chat_id, HISTORY_DAYS)
+
+    typed_members = []
+    untyped_members = []
+    names = {}
+    # Самые активные участники первыми
+    for member in sorted(members.values(), key=lambda m: m['message_count'], reverse=True):
+        names[member['user_id']] = display_name(member)
+        if member['personality_type']:
+            typed_members.append({
+                'user_id': member['user_id'],
+                'username': names[member['user_id']],
+                'type': member['personality_type'],
+                'message_count': member['message_count'],
+            })
+        else:
+            untyped_members.append(member['username'] or member['first_name'])
+
+    total_members = len(members)
+    typed_count = len(typed_members)
+    return {
+        'typed_members': typed_members,
+        'untyped_members': untyped_members,
+        'names': names,
+        'total_members': total_members,
+        'typed_count': typed_count,
+        'percentage': (typed_count / total_members) * 100 if total_members else 0.0,
+    }
+
+
+async def build_history_text(chat_id: int, names: Dict[int, str]) -> str:
+    """Сводка истории сообщений по пользователям.
+
+    Доли и динамика по дням берутся из дневной сводки активности,
+    содержание прошедших дней - из подготовленных заранее сводок
+    переписки, а дни без сводок (как минимум сегодняшний) - из
+    представительной выборки сообщений в пределах бюджета токенов.
+    """
+    activity = await get_chat_activity(chat_id, HISTORY_DAYS)
+    if not activity:
+        return ""
+
+    total = sum(item['message_count'] for item in activity)
+    top = activity[:10]  # Самые активные участники
+    today = datetime.now(timezone.utc).date()
+    days = [(today - timedelta(days=offset)).isoformat() for offset in range(HISTORY_DAYS - 1, -1, -1)]
+
+    history_text = f"История сообщений за {HISTORY_DAYS} дней (всего {total}):\n"
+    for item in top:
+        username = names.get(item['user_id'], f"User_{item['user_id']}")
+        share = item['message_count'] / total * 100
+        trend = " ".join(str(item['daily'].get(day, 0)) for day in days)
+        history_text += f"{username}: {item['message_count']} сообщений, {share:.0f}%, по дням: {trend}\n"
+
+    digests = await get_chat_digests(chat_id, HISTORY_DAYS)
+    digest_text = build_digest_context(digests, names)
+    if digest_text:
+        history_text += f"\n{digest_text}\n"
+
+    digested_days = {d['day'] for d in digests if d['user_id'] == CHAT_DIGEST}
+    messages = []
+    for day in days:
+        if day not in digested_days and any(day in item['daily'] for item in activity):
+            messages.extend(await get_day_messages(chat_id, day))
+    sample = await asyncio.to_thread(sample_messages, messages, REPORT_SAMPLE_TOKENS)
+    if sample:
+        history_text += "\nХарактерные сообщения:\n"
+        for msg in sample:
+            text = msg['message_text']
+            username = names.get(msg['user_id'], f"User_{msg['user_id']}")
+            history_text += f"- {username}: {text[:200]}{'...' if len(text) > 200 else ''}\n"
+    return history_text
+
+
+def build_group_prompt(chat_title: str, group: Dict, history_text: str) -> str:
+    """Запрос к GigaChat для анализа группы"""
+    typed_members = group['typed_members']
+    total_members = group['total_members']
+    typed_count = group['typed_count']
+    members_info = [f"• {m['username']}: {m['type']}" for m in typed_members]
+
+    prompt = f"""
+    Проанализируй динамику команды на основе типов личности участников и истории сообщений в чате за последние 7 дней.
+    Дайте конкретные практические рекомендации по улучшению взаимодействия.
+    ВАЖНЫЕ ИНСТРУКЦИИ:
+            1. Используй ТОЛЬКО HTML-теги для форматирования
+            2. Запрещены: Markdown, **
+            3. Все пункты списка делай через HTML-теги
+    
+    ИНФОРМАЦИЯ О ГРУППЕ:
+    - Название: "{chat_title}"
+    - Всего участников: {total_members}
+    - Протестированных: {typed_count}
+
+    ТИПЫ ЛИЧНОСТИ УЧАСТНИКОВ:
+    {chr(10).join(members_info)}
+
+    ИСТОРИЯ СООБЩЕНИЙ ИЗ ЧАТА (последние 7 дней):
+    {history_text}
+
+    Будь максимально конкретен и дай практические, выполнимые рекомендации.
+    Ответ должен быть структурированным и полезным для улучшения работы команды.
+    ВАЖНО: Делай упор анализа на историю сообщений.
+
+    ШАБЛОН ОТВЕТА (заполни вместо многоточий):
+    <b>Участники: </b>
+    {chr(10).join(members_info)}
+    🔍 <b>Наблюдения: </b>
+    • ...
+    • ...
+    • ...
+    • ...
+
+    💡 <b>Рекомендации: </b>
+    • ...
+    • ...
+    • ...
+
+    ПРИМЕР ОТВЕТА:
+    <b>Участники:</b>
+    • @toxnela (ISFJ) - 45% сообщений
+    • @riama_01 (INFJ) - 30% сообщений
+    • @riama_01 (INTP) - 25% сообщений
+
+    🔍 <b>Наблюдения: </b>
+    • ISFJ: Стремится поддерживать дружественную атмосферу, чутко относится к потребностям окружающих.
+    • INFJ: Глубоко задумчивый участник, ориентирован на выявление скрытого смысла и мотиваций собеседников.
+    • INTP: Предпочитает логический анализ и теоретизацию, меньше заинтересован в социальных аспектах беседы.
+
+    💡 <b>Рекомендации: </b>
+    • ISFJ: Важно проявлять терпимость к различным стилям общения и позволять другим участникам выражать себя свободно, даже если это отличается от привычного подхода.
+    • INFJ: Старайтесь уравновешивать глубину восприятия с ясностью изложения фактов, чтобы создать комфортную среду для обсуждения сложных вопросов.
+    • INTP: Признавайте значимость личного опыта и чувств других членов команды, участвуйте в диалогах более открыто, демонстрируя уважение к ценностям коллег.
+    """
+
+    return prompt
+
+
+def report_header(chat_title: str) -> str:
+    return f"📊 <b>Отчет анализа группы \"{chat_title}\"</b>\n\n"
+
+
+def stub_group_report(chat_title: str, group: Dict, history_text: str) -> str:
+    """Отчет без AI, если GigaChat не настроен"""
+    members_info = [f"• {m['username']}: {m['type']}" for m in group['typed_members']]
+    return f"""📊 <b>Отчет для группы "{chat_title}"</b>
+
+👥 <b>Участники ({group['typed_count']}/{group['total_members']} протестированы):</b>
+{chr(10).join(members_info)}
+
+📝 <b>Анализ истории сообщений за 7 дней:</b>
+{history_text[:500]}...
+
+💡 <b>Рекомендации (общие):</b>
+• Создавайте сбалансированные рабочие пары, учитывая типы личности
+• Организуйте регулярные ретроспективы для обсуждения коммуникации
+• Используйте сильные стороны каждого типа при распределении задач
+• Разработайте четкие процессы для минимизации конфликтов
+
+🔮 <b>Для более детального анализа с AI:</b>
+Настройте API ключ GigaChat в конфигурации бота"""
+
+
+def fallback_group_report(chat_title: str, group: Dict) -> str:
+    """Общие рекомендации при ошибке генерации"""
+    members_info = [f"• {m['username']}: {m['type']}" for m in group['typed_members']]
+    return f"""📊 <b>Отчет для группы "{chat_title}"</b>
+
+👥 <b>Состав группы:</b>
+{chr(10).join(members_info)}
+
+💡 <b>Общие рекомендации:</b>
+• Учитывайте различия в коммуникационных стилях
+• Создавайте разнообразные рабочие группы
+• Поощряйте открытое обсуждение рабочих процессов
+• Используйте сильные стороны каждого типа личности"""
+
+
+async def stream_group_analysis(report_message: Message, header: str, prompt: str,
+                                member_types: list, on_queued=None, strict: bool = False) -> str:
+    """Потоковая генерация отчета с постепенной правкой сообщения"""
+    editor = ProgressiveEditor(report_message)
+    response = ""
+    try:
+        async for chunk in gigachat_service.stream_group_analysis(
+            prompt,
+            member_types=member_types,
+            chat_id=report_message.chat.id,
+            on_queued=on_queued
+        ):
+            response += chunk
+            await editor.update(header + response)
+        return response
+    except Exception as e:
+        print(f"Ошибка потоковой генерации отчета: {e}")
+        # Переходим на обычный запрос, чтобы не сохранить оборванный отчет
+        return await gigachat_service.generate_group_analysis(
+            prompt,
+            member_types=member_types,
+            chat_id=report_message.chat.id,
+            on_queued=on_queued,
+            strict=strict
+        )
+
+
+async def generate_group_report(chat_id: int, chat_title: str, group: Dict, on_queued=None,
+                                report_message: Message = None, background: bool = False,
+                                strict: bool = False) -> str:
+    """Отчет по группе с учетом истории сообщений за 7 дней.
+
+    background=True - фоновая подготовка: низкий приоритет в очереди LLM.
+    strict=True (и всегда в фоне) - проброс ошибок вместо текста-заглушки,
+    чтобы в БД не попал отчет с ошибкой.
+    """
+    history_text = await build_history_text(chat_id, group['names'])
+
+    if not gigachat_service.enabled:
+        return stub_group_report(chat_title, group, history_text)
+
+    prompt = build_group_prompt(chat_title, group, history_text)
+    header = report_header(chat_title)
+    member_types = [m['type'] for m in group['typed_members']]
+    if background:
+        response = await gigachat_service.generate_group_analysis(
+            prompt,
+            member_types=member_types,
+            chat_id=chat_id,
+            priority=PRIORITY_BACKGROUND,
+            strict=True
+        )
+    elif REPORT_STREAMING and report_message is not None:
+        response = await stream_group_analysis(report_message, header, prompt, member_types, on_queued,
+                                               strict=strict)
+    else:
+        response = await gigachat_service.generate_group_analysis(
+            prompt,
+            member_types=member_types,
+            chat_id=chat_id,
+            on_queued=on_queued,
+            strict=strict
+        )
+    return f"{header}{response}"
+
+
+async def precompute_group_reports(bot: Bot) -> int:
+    """Фоновая подготовка сегодняшних отчетов для активных чатов.
+
+    Отчет строится только для чатов, прошедших порог протестированных,
+    и только если GigaChat доступен; перед ним досчитываются сводки
+    переписки за прошедшие дни. Возвращает число новых отчетов.
+    """
+    if not gigachat_service.enabled:
+        return 0
+
+    prepared = 0
+    for chat_id in await get_active_chat_ids():
+        group = await collect_group(chat_id)
+        if not group['total_members'] or group['percentage'] < REPORT_THRESHOLD:
+            continue
+
+        # Map-шаг: каждый день суммируется один раз
+        await summarize_chat(chat_id)
+        if await get_today_report(chat_id):
+            continue
+
+        try:
+            chat = await bot.get_chat(chat_id)
+        except Exception as e:
+            # Бота могли удалить из чата
+            logging.warning(f"⚠️ Чат {chat_id} недоступен для фонового отчета: {e}")
+            continue
+
+        try:
+            analysis = await generate_group_report(chat_id, chat.title, group, background=True)
+        except Exception as e:
+            logging.error(f"❌ Не удалось подготовить отчет для чата {chat_id}: {e}")
+            continue
+        await save_report(chat_id, analysis)
+        prepared += 1
+
+    logging.info(f"✅ Подготовлено отчетов заранее: {prepared}")
+    return prepared
@@ -0,0 +1,223 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from services.knowledge import STEM_LENGTH, STOP_WORDS
+
+# Буквы, из которых состоят слова; номер буквы занимает _LETTER_BITS бит ключа псевдоосновы
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789абвгдежзийклмнопрстуфхцчшщъыьэюя"
+_LETTER_BITS = 7
+_KEY_BITS = _LETTER_BITS * STEM_LENGTH
+# Грубая оценка числа токенов: ~4 символа на токен
+CHARS_PER_TOKEN = 4
+# Длиннее этого сообщение попадает в запрос обрезанным
+MAX_MESSAGE_CHARS = 300
+# Сообщения меньше чем с двумя значимыми словами ("ок", "+", "спасибо") не берем
+MIN_INFORMATIVE_TOKENS = 2
+# MinHash: полосы x строки; сообщения с совпавшей полосой считаются почти дубликатами
+MINHASH_BANDS = 4
+MINHASH_ROWS = 4
+_PRIME = (1 << 31) - 1
+# Кандидатов на одно место в выборке (по информативности, внутри участника)
+CANDIDATES_PER_PICK = 5
+# Вес штрафа за похожесть на уже выбранные сообщения
+DIVERSITY_WEIGHT = 0.7
+# Размерность хешированных TF-IDF векторов кандидатов
+HASH_DIM = 512
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _letter_codes() -> np.ndarray:
+    """Таблица codepoint -> номер буквы в компактном алфавите (0 - разделитель)"""
+    table = np.zeros(0x500, dtype=np.int64)
+    for code, char in enumerate(_ALPHABET, start=1):
+        table[ord(char)] = code
+        table[ord(char.upper())] = code
+    table[ord('ё')] = table[ord('Ё')] = table[ord('е')]
+    return table
+
+
+_LETTER_CODES = _letter_codes()
+
+
+def _stem_keys(codes: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Псевдоосновы слов (первые STEM_LENGTH букв) как целые числа"""
+    keys = np.zeros(len(starts), dtype=np.int64)
+    last = len(codes) - 1
+    for offset in range(STEM_LENGTH):
+        position = starts + offset
+        letter = np.where(position < ends, codes[np.minimum(position, last)], 0)
+        keys = (keys << _LETTER_BITS) | letter
+    return keys
+
+
+def _tokenize_batch(texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Разбиение всех текстов на слова за один проход по массиву символов.
+
+    Словом считается последовательность букв и цифр компактного алфавита
+    (кириллица, латиница, цифры) без учета регистра. Возвращает номер
+    текста, ключ псевдоосновы и длину каждого слова.
+    """
+    joined = "\x00".join(texts)
+    codepoints = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+    codes = _LETTER_CODES[np.minimum(codepoints, len(_LETTER_CODES) - 1)]
+
+    edges = np.diff(np.concatenate(([0], (codes > 0).astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    # Конец каждого текста в общей строке (с учетом разделителя)
+    text_ends = np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)) + 1)
+    text_of = np.searchsorted(text_ends, starts, side='right')
+    return text_of, _stem_keys(codes, starts, ends), ends - starts
+
+
+def _stop_keys() -> np.ndarray:
+    words = sorted(STOP_WORDS)
+    codes = _LETTER_CODES[[ord(char) for char in "\x00".join(words)]]
+    lengths = np.array([len(word) for word in words])
+    starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+    return _stem_keys(codes, starts, starts + lengths) * 64 + lengths
+
+
+_STOP_KEYS = _stop_keys()
+
+
+def _vectorize(messages: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Разреженное представление (CSR) множеств слов информативных сообщений.
+
+    Возвращает позиции оставленных сообщений, границы строк и id слов.
+    """
+    texts = [m['message_text'][:MAX_MESSAGE_CHARS] for m in messages]
+    text_of, keys, lengths = _tokenize_batch(texts)
+
+    # Служебные слова (все не длиннее псевдоосновы) и однобуквенные слова не учитываются
+    informative = (lengths >= 2) & ~np.isin(keys * 64 + np.minimum(lengths, 63), _STOP_KEYS)
+    # Уникальные пары (сообщение, псевдооснова), упорядоченные по сообщению
+    pairs = np.sort((text_of[informative] << _KEY_BITS) | keys[informative])
+    pairs = pairs[np.concatenate(([True], pairs[1:] != pairs[:-1]))]
+    rows = pairs >> _KEY_BITS
+    _, indices = np.unique(pairs & ((1 << _KEY_BITS) - 1), return_inverse=True)
+
+    counts = np.bincount(rows, minlength=len(messages))
+    kept = np.flatnonzero(counts >= MIN_INFORMATIVE_TOKENS)
+    indices = indices.ravel()[counts[rows] >= MIN_INFORMATIVE_TOKENS]
+    indptr = np.concatenate(([0], np.cumsum(counts[kept])))
+    return kept, indptr.astype(np.int64), indices.astype(np.int64)
+
+
+def minhash_signatures(indptr: np.ndarray, indices: np.ndarray, num_hashes: int,
+                       rng: np.random.Generator) -> np.ndarray:
+    """MinHash-подписи всех сообщений сразу: минимум хеша по словам каждой строки"""
+    a = rng.integers(1, _PRIME, num_hashes)
+    b = rng.integers(0, _PRIME, num_hashes)
+    signatures = np.empty((len(indptr) - 1, num_hashes), dtype=np.int64)
+    for i in range(num_hashes):
+        signatures[:, i] = np.minimum.reduceat((a[i] * indices + b[i]) % _PRIME, indptr[:-1])
+    return signatures
+
+
+def near_duplicates(signatures: np.ndarray, bands: int = MINHASH_BANDS, rows: int = MINHASH_ROWS) -> np.ndarray:
+    """Маска почти дубликатов (LSH по полосам подписи); первое сообщение группы остается"""
+    count = len(signatures)
+    duplicate = np.zeros(count, dtype=bool)
+    for band in range(bands):
+        # Строки полосы сворачиваются в одно 64-битное число
+        key = np.zeros(count, dtype=np.uint64)
+        for column in signatures[:, band * rows:(band + 1) * rows].T:
+            key = key * np.uint64(_PRIME) + column.astype(np.uint64)
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        duplicate |= first[inverse] != np.arange(count)
+    return duplicate
+
+
+def sample_messages(messages: List[Dict], budget: int, seed: int = 0) -> List[Dict]:
+    """Представительная выборка сообщений в пределах бюджета токенов.
+
+    Пустые по смыслу сообщения и почти дубликаты отбрасываются, бюджет
+    делится между участниками пропорционально их активности, а внутри
+    него жадно выбираются информативные (TF-IDF) и непохожие на уже
+    выбранные сообщения. При одном seed результат воспроизводим.
+    Сообщения - словари с user_id и message_text; порядок сохраняется.
+    """
+    if not messages or budget <= 0:
+        return []
+    rng = np.random.default_rng(seed)
+
+    kept, indptr, indices = _vectorize(messages)
+    if not len(kept):
+        return []
+
+    signatures = minhash_signatures(indptr, indices, MINHASH_BANDS * MINHASH_ROWS, rng)
+    unique = ~near_duplicates(signatures)
+    kept = kept[unique]
+    lengths = np.diff(indptr)
+    starts = indptr[:-1][unique]
+    lengths = lengths[unique]
+    count = len(kept)
+
+    # Информативность: средний IDF слов сообщения (по оставленным сообщениям)
+    row_of = np.repeat(np.arange(len(unique)), np.diff(indptr))
+    mask = unique[row_of]
+    df = np.bincount(indices[mask], minlength=int(indices.max()) + 1)
+    idf = np.log((1 + count) / (1 + df)) + 1
+    word_idf = idf[indices]
+    score = np.add.reduceat(word_idf, indptr[:-1])[unique] / np.sqrt(lengths)
+    score = score / score.max() + rng.random(count) * 1e-6
+
+    texts = [messages[i]['message_text'][:MAX_MESSAGE_CHARS] for i in kept]
+    cost = np.array([estimate_tokens(text) for text in texts])
+    users = np.array([messages[i]['user_id'] for i in kept])
+    _, member, member_counts = np.unique(users, return_inverse=True, return_counts=True)
+    member = member.ravel()
+
+    # Бюджет участника пропорционален числу его сообщений
+    quota = budget * member_counts / member_counts.sum()
+    member_cost = np.bincount(member, weights=cost) / member_counts
+    picks = np.ceil(quota / member_cost).astype(np.int64)
+
+    # Кандидаты: лучшие по информативности сообщения каждого участника
+    order = np.lexsort((-score, member))
+    group_start = np.concatenate(([0], np.cumsum(member_counts)[:-1]))
+    rank = np.arange(count) - group_start[member[order]]
+    candidates = order[rank < picks[member[order]] * CANDIDATES_PER_PICK]
+
+    vectors = np.zeros((len(candidates), HASH_DIM), dtype=np.float32)
+    for row, position in enumerate(candidates):
+        start = starts[position]
+        words = indices[start:start + lengths[position]]
+        np.add.at(vectors[row], words % HASH_DIM, idf[words])
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    remaining_quota = quota.copy()
+    remaining = float(budget)
+    candidate_score = score[candidates]
+    candidate_cost = cost[candidates]
+    candidate_member = member[candidates]
+    similarity = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    selected = []
+    use_quota = True
+    while True:
+        eligible = available & (candidate_cost <= remaining)
+        if use_quota:
+            eligible &= candidate_cost <= remaining_quota[candidate_member]
+        if not eligible.any():
+            if not use_quota:
+                break
+            # Остаток бюджета, который участники не смогли использовать, делится без квот
+            use_quota = False
+            continue
+
+        gain = np.where(eligible, candidate_score - DIVERSITY_WEIGHT * similarity, -np.inf)
+        best = int(np.argmax(gain))
+        selected.append(best)
+        available[best] = False
+        remaining -= candidate_cost[best]
+        remaining_quota[candidate_member[best]] -= candidate_cost[best]
+        similarity = np.maximum(similarity, vectors @ vectors[best])
+
+    positions = sorted(int(kept[candidates[i]]) for i in selected)
+    return [messages[i] for i in positions]
@@ -0,0 +1,143 @@
+import asyncio
+import functools
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import requests
+from gspread.exceptions import APIError
+
+from config import SHEETS_BURST, SHEETS_MAX_RETRIES, SHEETS_RATE_PER_MINUTE
+from utils.metrics import registry
+
+# Экспоненциальная пауза между повторами: 1, 2, 4 ... но не больше 32 секунд
+BACKOFF_BASE_SEC = 1.0
+BACKOFF_MAX_SEC = 32.0
+# Временные ошибки API: превышение квоты и ошибки сервера
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+SHEETS_CALL_SECONDS = registry.histogram(
+    'sociomind_sheets_call_duration_seconds', 'Время вызова Google Sheets API (одна попытка)', ['method'])
+SHEETS_CALL_ERRORS = registry.counter(
+    'sociomind_sheets_call_errors_total', 'Неудачные попытки вызова Google Sheets API', ['method', 'retried'])
+SHEETS_LIMITER_WAIT = registry.counter(
+    'sociomind_sheets_limiter_wait_seconds_total', 'Ожидание ограничителя частоты Google Sheets')
+
+
+def api_status(error: APIError) -> Optional[int]:
+    """HTTP-статус ошибки gspread"""
+    return getattr(getattr(error, 'response', None), 'status_code', None)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, APIError):
+        return api_status(error) in RETRYABLE_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов: rate токенов в секунду, запас не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        # Ожидающие получают токены по очереди
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Ожидание токена, возвращает время ожидания в секундах"""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+class SheetsIO:
+    """Выполнение блокирующих вызовов gspread вне event loop.
+
+    Все вызовы идут через собственный пул потоков (не общий пул
+    asyncio.to_thread) и ограничитель частоты под квоту Sheets API.
+    Ошибки 429/5xx и сетевые сбои повторяются с экспоненциальной
+    паузой со случайным сдвигом, остальные пробрасываются сразу.
+    """
+
+    def __init__(self, rate_per_minute: float = SHEETS_RATE_PER_MINUTE, burst: int = SHEETS_BURST,
+                 max_retries: int = SHEETS_MAX_RETRIES, workers: int = 2):
+        burst = max(1, min(burst, int(rate_per_minute) - 1))
+        # Пополнение с учетом запаса: за любые 60 секунд не больше rate_per_minute запросов
+        self.limiter = TokenBucket((rate_per_minute - burst) / 60, burst)
+        self.max_retries = max_retries
+        self._workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats = {
+            'calls': 0,
+            'retries': 0,
+            'throttled': 0,
+            'errors': 0,
+            'limiter_wait_sec': 0.0,
+            'call_sec': 0.0,
+        }
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="sheets")
+        return self._executor
+
+    async def call(self, func: Callable, *args, **kwargs):
+        """Вызов func(*args, **kwargs) в пуле потоков с ограничением частоты и повторами"""
+        loop = asyncio.get_running_loop()
+        method = getattr(func, '__name__', 'call')
+        attempt = 0
+        while True:
+            waited = await self.limiter.acquire()
+            self.stats['limiter_wait_sec'] += waited
+            SHEETS_LIMITER_WAIT.inc(waited)
+            self.stats['calls'] += 1
+            started = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+            except Exception as e:
+                elapsed = time.perf_counter() - started
+                self.stats['call_sec'] += elapsed
+                SHEETS_CALL_SECONDS.observe(elapsed, method=method)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self.stats['errors'] += 1
+                    SHEETS_CALL_ERRORS.inc(method=method, retried='no')
+                    raise
+                SHEETS_CALL_ERRORS.inc(method=method, retried='yes')
+                if isinstance(e, APIError) and api_status(e) == 429:
+                    self.stats['throttled'] += 1
+                delay = random.uniform(0, min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * 2 ** attempt))
+                attempt += 1
+                self.stats['retries'] += 1
+                logging.warning(f"⚠️ Google Sheets: {e}; повтор {attempt} через {delay:.1f} с")
+                await asyncio.sleep(delay)
+                continue
+            elapsed = time.perf_counter() - started
+            self.stats['call_sec'] += elapsed
+            SHEETS_CALL_SECONDS.observe(elapsed, method=method)
+            return result
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
+
+    def shutdown(self):
+        """Остановка пула потоков (новые вызовы создадут его заново)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
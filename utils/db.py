@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+import aiosqlite
+
+from config import DB_PATH, DB_POOL_SIZE
+
+# Настройки, применяемые к каждому соединению пула
+PRAGMAS = (
+    # Для новой БД; существующая переводится в этот режим в init_db()
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+class Database:
+    """Пул долгоживущих соединений aiosqlite.
+
+    Каждое соединение держит собственный рабочий поток, поэтому пул
+    создается один раз при запуске бота и переиспользуется всеми
+    функциями из utils.helpers.
+    """
+
+    def __init__(self, path: str = DB_PATH, pool_size: int = DB_POOL_SIZE):
+        self.path = path
+        self.pool_size = max(1, pool_size)
+        self._connections: List[aiosqlite.Connection] = []
+        self._pool: Optional[asyncio.Queue] = None
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._pool is not None
+
+    async def open(self):
+        """Открытие соединений пула"""
+        async with self._open_lock:
+            if self._pool is not None:
+                return
+
+            pool = asyncio.Queue()
+            for _ in range(self.pool_size):
+                conn = await aiosqlite.connect(self.path)
+                # Сразу в список: close() закроет и соединения неудачно открытого пула
+                self._connections.append(conn)
+                for pragma in PRAGMAS:
+                    await conn.execute(pragma)
+                pool.put_nowait(conn)
+
+            self._pool = pool
+            logging.info(f"✅ Пул соединений с БД открыт ({self.pool_size} шт., {self.path})")
+
+    async def close(self):
+        """Закрытие всех соединений пула"""
+        async with self._open_lock:
+            if self._pool is None and not self._connections:
+                return
+
+            for conn in self._connections:
+                try:
+                    await conn.execute("PRAGMA optimize")
+                    await conn.close()
+                except Exception as e:
+                    logging.error(f"❌ Ошибка закрытия соединения с БД: {e}")
+
+            self._connections = []
+            self._pool = None
+            logging.info("✅ Пул соединений с БД закрыт")
+
+    @asynccontextmanager
+    async def connection(self):
+        """Получение соединения из пула на время блока async with"""
+        if self._pool is None:
+            await self.open()
+
+        pool = self._pool
+        conn = await pool.get()
+        try:
+            yield conn
+        except BaseException:
+            # Не возвращаем в пул соединение с незавершенной транзакцией
+            if conn.in_transaction:
+                await conn.rollback()
+            raise
+        finally:
+            pool.put_nowait(conn)
+
+
+database = Database()
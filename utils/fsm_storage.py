@@ -0,0 +1,117 @@
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config import FSM_CACHE_SIZE, FSM_SESSION_TTL_SEC
+from utils.helpers import delete_expired_fsm_sessions, delete_fsm_session, get_fsm_session, save_fsm_session
+
+# Запись кэша для ключа без сессии: (состояние, данные, время изменения)
+_EMPTY: Tuple[Optional[str], Dict[str, Any], Optional[float]] = (None, {}, None)
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_sessions основной БД.
+
+    Одна строка на сессию: состояние и данные (JSON). Запись идет сразу
+    в БД и в кэш (write-through), чтение - из LRU-кэша, поэтому после
+    перезапуска бота незаконченный тест продолжается с того же вопроса.
+    Ключи без сессии тоже кэшируются: проверка состояния на каждое
+    сообщение группового чата не ходит в БД.
+
+    Сессия, которая не менялась дольше ttl секунд, считается брошенной
+    и удаляется при следующем обращении или в purge_expired().
+    """
+
+    def __init__(self, ttl: float = FSM_SESSION_TTL_SEC, cache_size: int = FSM_CACHE_SIZE):
+        self.ttl = ttl
+        self.cache_size = max(1, cache_size)
+        self._cache: OrderedDict = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'expired': 0}
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _remember(self, key: str, entry: tuple):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def ensure_ttl(self, min_ttl: float):
+        """TTL не меньше min_ttl: брошенная сессия не должна исчезать раньше срока ответа"""
+        if self.ttl < min_ttl:
+            logging.warning(f"⚠️ TTL сессий FSM {self.ttl:.0f} с меньше времени на ответ, используем {min_ttl:.0f} с")
+            self.ttl = min_ttl
+
+    def _is_expired(self, entry: tuple, now: float) -> bool:
+        return entry[2] is not None and entry[2] < now - self.ttl
+
+    async def _load(self, key: str) -> tuple:
+        entry = self._cache.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            row = await get_fsm_session(key)
+            entry = (row[0], json.loads(row[1]) if row[1] else {}, row[2]) if row else _EMPTY
+            self._remember(key, entry)
+        else:
+            self.stats['hits'] += 1
+            self._cache.move_to_end(key)
+
+        if self._is_expired(entry, time.time()):
+            self.stats['expired'] += 1
+            await delete_fsm_session(key)
+            entry = _EMPTY
+            self._remember(key, entry)
+        return entry
+
+    async def _save(self, key: str, state: Optional[str], data: Dict[str, Any]):
+        if state is None and not data:
+            # Пустая сессия не хранится
+            await delete_fsm_session(key)
+            entry = _EMPTY
+        else:
+            now = time.time()
+            await save_fsm_session(key, state, json.dumps(data, ensure_ascii=False), now)
+            entry = (state, data, now)
+        self.stats['writes'] += 1
+        self._remember(key, entry)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key(key)
+        _, data, _ = await self._load(storage_key)
+        await self._save(storage_key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self._key(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._key(key)
+        state, _, _ = await self._load(storage_key)
+        await self._save(storage_key, state, copy.deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._load(self._key(key)))[1])
+
+    async def purge_expired(self) -> int:
+        """Удаление брошенных сессий из БД и кэша, возвращает число удаленных"""
+        now = time.time()
+        removed = await delete_expired_fsm_sessions(now - self.ttl)
+        for key in [key for key, entry in self._cache.items() if self._is_expired(entry, now)]:
+            del self._cache[key]
+        self.stats['expired'] += removed
+        if removed:
+            logging.info(f"🧹 Удалено брошенных сессий FSM: {removed}")
+        return removed
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, cached=len(self._cache))
+
+    async def close(self) -> None:
+        self._cache.clear()
@@ -1,78 +1,247 @@
-import aiosqlite
 from typing import List, Dict
+from datetime import datetime, timezone
 import logging
+from config import MESSAGE_RETENTION_DAYS
+from utils.db import database
+from utils.migrations import run_migrations
+from utils.metrics import registry, timed
+
+# Сколько последних сообщений участника за день хранит сводка активности
+RECENT_MESSAGES_PER_DAY = 3
+# Сколько ключей сводки читается одним запросом (3 параметра на ключ, лимит SQLite - 999)
+ACTIVITY_LOOKUP_CHUNK = 300
+# Сколько свободных страниц файла БД возвращается за один шаг incremental_vacuum
+VACUUM_STEP_PAGES = 1000
+
+DB_QUERY_SECONDS = registry.histogram(
+    'sociomind_db_query_duration_seconds', 'Время функций доступа к БД', ['operation'])
+DB_QUERY_ERRORS = registry.counter(
+    'sociomind_db_query_errors_total', 'Ошибки функций доступа к БД', ['operation'])
+
+def _observed(func):
+    """Время и ошибки функции в метриках БД (метка operation - имя функции)"""
+    return timed(DB_QUERY_SECONDS, DB_QUERY_ERRORS, operation=func.__name__)(func)
 
 async def init_db():
-    """Инициализация базы данных"""
-    async with aiosqlite.connect('sociomind.db') as db:
-        # Существующая таблица пользователей
-        await db.execute('''CREATE TABLE IF NOT EXISTS users
-                          (user_id INTEGER PRIMARY KEY,
-                           username TEXT,
-                           personality_type TEXT,
-                           test_date TEXT)''')
-        
-        # Новая таблица для хранения сообщений чата
-        await db.execute('''CREATE TABLE IF NOT EXISTS chat_messages
-                          (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                           chat_id INTEGER,
-                           user_id INTEGER,
-                           message_text TEXT,
-                           timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-        
-        # Новая таблица для отслеживания участников чата
-        await db.execute('''CREATE TABLE IF NOT EXISTS chat_members
-                          (chat_id INTEGER,
-                           user_id INTEGER,
-                           username TEXT,
-                           first_name TEXT,
-                           last_name TEXT,
-                           first_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
-                           last_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
-                           PRIMARY KEY (chat_id, user_id))''')
-        
-        # Таблица для отчетов
-        await db.execute('''CREATE TABLE IF NOT EXISTS reports
-                          (chat_id INTEGER,
-                           report_date DATE,
-                           report_data TEXT,
-                           PRIMARY KEY (chat_id, report_date))''')
-        
-        await db.commit()
+    """Инициализация базы данных: применение недостающих миграций схемы"""
+    async with database.connection() as db:
+        version = await run_migrations(db)
+        logging.info(f"✅ Схема БД актуальна (версия {version})")
+
+        # auto_vacuum существующей БД меняется только полным VACUUM (один раз)
+        cursor = await db.execute('PRAGMA auto_vacuum')
+        if (await cursor.fetchone())[0] != 2:
+            logging.info("🧹 Перевод БД в режим auto_vacuum=INCREMENTAL (VACUUM)...")
+            await db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            await db.execute('VACUUM')
 
+@_observed
 async def save_chat_message(chat_id: int, user_id: int, message_text: str):
     """Сохранение сообщения чата"""
-    async with aiosqlite.connect('sociomind.db') as db:
-        await db.execute('''INSERT INTO chat_messages 
-                          (chat_id, user_id, message_text) 
-                          VALUES (?, ?, ?)''',
-                       (chat_id, user_id, message_text))
-        await db.commit()
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    await save_chat_batch([(chat_id, user_id, message_text, timestamp)], [])
+
+def _parse_ids(value: str) -> List[int]:
+    return sorted(int(item) for item in value.split(',') if item) if value else []
+
+async def _update_activity(db, messages: List[tuple], last_id: int):
+    """Инкрементальное обновление дневной сводки активности по пакету сообщений
+
+    Пакет вставляется одной транзакцией, поэтому id его сообщений идут
+    подряд и заканчиваются last_id.
+    """
+    first_id = last_id - len(messages) + 1
+    rollup = {}
+    for offset, (chat_id, user_id, message_text, timestamp) in enumerate(messages):
+        key = (chat_id, timestamp[:10], user_id)
+        item = rollup.setdefault(key, {'count': 0, 'chars': 0, 'first': timestamp, 'last': timestamp, 'ids': []})
+        item['count'] += 1
+        item['chars'] += len(message_text or '')
+        item['first'] = min(item['first'], timestamp)
+        item['last'] = max(item['last'], timestamp)
+        item['ids'].append(first_id + offset)
 
-async def update_chat_member(chat_id: int, user_id: int, username: str, first_name: str, last_name: str = None):
-    """Обновление информации об участнике чата"""
-    async with aiosqlite.connect('sociomind.db') as db:
-        await db.execute('''INSERT OR REPLACE INTO chat_members 
-                          (chat_id, user_id, username, first_name, last_name, last_seen) 
-                          VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)''',
-                       (chat_id, user_id, username, first_name, last_name))
+    # Прежние id нужны, только если в пакете у участника меньше RECENT_MESSAGES_PER_DAY
+    # сообщений; они читаются одним запросом на ACTIVITY_LOOKUP_CHUNK ключей
+    lookup = [key for key, item in rollup.items() if len(item['ids']) < RECENT_MESSAGES_PER_DAY]
+    existing = {}
+    for start in range(0, len(lookup), ACTIVITY_LOOKUP_CHUNK):
+        chunk = lookup[start:start + ACTIVITY_LOOKUP_CHUNK]
+        placeholders = ', '.join(['(?, ?, ?)'] * len(chunk))
+        # JOIN, а не IN (VALUES ...): так SQLite ищет каждый ключ по первичному ключу
+        cursor = await db.execute(f'''SELECT a.chat_id, a.day, a.user_id, a.recent_ids 
+                                   FROM (VALUES {placeholders}) AS k 
+                                   JOIN chat_activity_daily AS a ON a.chat_id = k.column1 
+                                   AND a.day = k.column2 AND a.user_id = k.column3''',
+                                  [value for key in chunk for value in key])
+        for chat_id, day, user_id, recent_ids in await cursor.fetchall():
+            existing[(chat_id, day, user_id)] = _parse_ids(recent_ids)
+
+    rows = []
+    for key, item in rollup.items():
+        ids = existing.get(key, []) + item['ids']
+        recent = ','.join(str(i) for i in ids[-RECENT_MESSAGES_PER_DAY:])
+        rows.append((*key, item['count'], item['chars'], item['first'], item['last'], recent))
+
+    await db.executemany('''INSERT INTO chat_activity_daily 
+                          (chat_id, day, user_id, message_count, char_count, first_ts, last_ts, recent_ids) 
+                          VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8)
+                          ON CONFLICT (chat_id, day, user_id) DO UPDATE SET 
+                          message_count = message_count + ?4, 
+                          char_count = char_count + ?5, 
+                          first_ts = MIN(first_ts, ?6), 
+                          last_ts = MAX(last_ts, ?7), 
+                          recent_ids = ?8''',
+                       rows)
+
+@_observed
+async def save_chat_batch(messages: List[tuple], members: List[tuple]):
+    """Пакетное сохранение сообщений и участников в одной транзакции
+
+    messages: (chat_id, user_id, message_text, timestamp)
+    members: (chat_id, user_id, username, first_name, last_name, last_seen)
+
+    Вместе с сообщениями обновляется дневная сводка активности.
+    """
+    async with database.connection() as db:
+        if messages:
+            await db.executemany('''INSERT INTO chat_messages 
+                                  (chat_id, user_id, message_text, timestamp, day) 
+                                  VALUES (?1, ?2, ?3, ?4, date(?4))''',
+                               messages)
+            cursor = await db.execute('SELECT last_insert_rowid()')
+            last_id = (await cursor.fetchone())[0]
+            await _update_activity(db, messages, last_id)
+        await db.executemany('''INSERT INTO chat_members 
+                              (chat_id, user_id, username, first_name, last_name, first_seen, last_seen) 
+                              VALUES (?, ?, ?, ?, ?, ?6, ?6)
+                              ON CONFLICT (chat_id, user_id) DO UPDATE SET 
+                              username = excluded.username, 
+                              first_name = excluded.first_name, 
+                              last_name = excluded.last_name, 
+                              last_seen = excluded.last_seen''',
+                           members)
         await db.commit()
 
+@_observed
 async def get_chat_messages_last_7_days(chat_id: int) -> List[Dict]:
-    """Получение сообщений чата за последние 7 дней"""
-    async with aiosqlite.connect('sociomind.db') as db:
+    """Получение сообщений чата за последние 7 дней
+
+    Условие по day ограничивает чтение днями-партициями за этот срок.
+    """
+    async with database.connection() as db:
         cursor = await db.execute('''SELECT user_id, message_text, timestamp 
                                    FROM chat_messages 
                                    WHERE chat_id = ? 
+                                   AND day >= date('now', '-7 days') 
                                    AND timestamp >= datetime('now', '-7 days')
-                                   ORDER BY timestamp''', 
+                                   ORDER BY day, id''', 
                                 (chat_id,))
         results = await cursor.fetchall()
         return [{'user_id': row[0], 'message_text': row[1], 'timestamp': row[2]} for row in results]
 
+@_observed
+async def get_chat_activity(chat_id: int, days: int = 7) -> List[Dict]:
+    """Активность участников чата за последние days календарных дней из сводки
+
+    Участники отсортированы по числу сообщений; daily - сообщения по дням,
+    recent_ids - id последних сообщений участника.
+    """
+    async with database.connection() as db:
+        cursor = await db.execute('''SELECT user_id, day, message_count, char_count, first_ts, last_ts, recent_ids 
+                                   FROM chat_activity_daily 
+                                   WHERE chat_id = ? AND day >= date('now', ?) 
+                                   ORDER BY day''',
+                                (chat_id, f'-{days - 1} days'))
+        results = await cursor.fetchall()
+
+    activity = {}
+    for user_id, day, message_count, char_count, first_ts, last_ts, recent_ids in results:
+        item = activity.setdefault(user_id, {'user_id': user_id, 'message_count': 0, 'char_count': 0,
+                                             'first_ts': first_ts, 'last_ts': last_ts,
+                                             'daily': {}, 'recent_ids': []})
+        item['message_count'] += message_count
+        item['char_count'] += char_count
+        item['last_ts'] = last_ts
+        item['daily'][day] = message_count
+        item['recent_ids'] = (item['recent_ids'] + _parse_ids(recent_ids))[-RECENT_MESSAGES_PER_DAY:]
+    return sorted(activity.values(), key=lambda item: item['message_count'], reverse=True)
+
+@_observed
+async def get_messages_by_ids(message_ids: List[int]) -> Dict[int, str]:
+    """Тексты сообщений по id"""
+    if not message_ids:
+        return {}
+    async with database.connection() as db:
+        placeholders = ','.join('?' * len(message_ids))
+        cursor = await db.execute(f'SELECT id, message_text FROM chat_messages WHERE id IN ({placeholders})',
+                                  list(message_ids))
+        results = await cursor.fetchall()
+        return {row[0]: row[1] for row in results}
+
+@_observed
+async def get_chat_days(chat_id: int, days: int = 7) -> Dict[str, List[tuple]]:
+    """Завершенные дни с сообщениями за последние days дней: день -> [(user_id, message_count)]"""
+    async with database.connection() as db:
+        cursor = await db.execute('''SELECT day, user_id, message_count 
+                                   FROM chat_activity_daily 
+                                   WHERE chat_id = ? AND day >= date('now', ?) AND day < date('now') 
+                                   ORDER BY day, message_count DESC''',
+                                (chat_id, f'-{days - 1} days'))
+        results = await cursor.fetchall()
+        chat_days = {}
+        for day, user_id, message_count in results:
+            chat_days.setdefault(day, []).append((user_id, message_count))
+        return chat_days
+
+@_observed
+async def get_day_messages(chat_id: int, day: str) -> List[Dict]:
+    """Сообщения чата за один день (UTC)"""
+    async with database.connection() as db:
+        cursor = await db.execute('''SELECT id, user_id, message_text 
+                                   FROM chat_messages 
+                                   WHERE chat_id = ? AND day = ? 
+                                   ORDER BY id''',
+                                (chat_id, day))
+        results = await cursor.fetchall()
+        return [{'id': row[0], 'user_id': row[1], 'message_text': row[2]} for row in results]
+
+@_observed
+async def get_chat_digests(chat_id: int, days: int = 7) -> List[Dict]:
+    """Дневные сводки переписки чата за последние days дней"""
+    async with database.connection() as db:
+        cursor = await db.execute('''SELECT day, user_id, message_count, digest 
+                                   FROM chat_digests 
+                                   WHERE chat_id = ? AND day >= date('now', ?) 
+                                   ORDER BY day''',
+                                (chat_id, f'-{days - 1} days'))
+        results = await cursor.fetchall()
+        return [{'day': row[0], 'user_id': row[1], 'message_count': row[2], 'digest': row[3]} for row in results]
+
+@_observed
+async def save_chat_digests(digests: List[tuple]):
+    """Сохранение дневных сводок: (chat_id, day, user_id, message_count, digest, created_at)"""
+    async with database.connection() as db:
+        await db.executemany('''INSERT OR REPLACE INTO chat_digests 
+                              (chat_id, day, user_id, message_count, digest, created_at) 
+                              VALUES (?, ?, ?, ?, ?, ?)''',
+                           digests)
+        await db.commit()
+
+@_observed
+async def get_active_chat_ids() -> List[int]:
+    """Чаты, в которых были сообщения за последние 7 дней"""
+    async with database.connection() as db:
+        cursor = await db.execute('''SELECT DISTINCT chat_id 
+                                   FROM chat_activity_daily 
+                                   WHERE day >= date('now', '-7 days')''')
+        results = await cursor.fetchall()
+        return [row[0] for row in results]
+
+@_observed
 async def get_chat_members(chat_id: int) -> List[Dict]:
     """Получение всех участников чата"""
-    async with aiosqlite.connect('sociomind.db') as db:
+    async with database.connection() as db:
         cursor = await db.execute('''SELECT user_id, username, first_name, last_name 
                                    FROM chat_members 
                                    WHERE chat_id = ?''', 
@@ -80,18 +249,42 @@ async def get_chat_members(chat_id: int) -> List[Dict]:
         results = await cursor.fetchall()
         return [{'user_id': row[0], 'username': row[1], 'first_name': row[2], 'last_name': row[3]} for row in results]
 
+@_observed
+async def get_chat_report_members(chat_id: int, days: int = 7) -> Dict[int, Dict]:
+    """Участники чата с типами личности и числом сообщений за days дней, по user_id
+
+    Один запрос только по строкам этого чата: chat_members LEFT JOIN users
+    и дневная сводка активности.
+    """
+    async with database.connection() as db:
+        cursor = await db.execute('''SELECT cm.user_id, cm.username, cm.first_name, cm.last_name, 
+                                          u.personality_type, COALESCE(a.message_count, 0) 
+                                   FROM chat_members cm 
+                                   LEFT JOIN users u ON u.user_id = cm.user_id 
+                                   LEFT JOIN (SELECT user_id, SUM(message_count) AS message_count 
+                                              FROM chat_activity_daily 
+                                              WHERE chat_id = ?1 AND day >= date('now', ?2) 
+                                              GROUP BY user_id) a ON a.user_id = cm.user_id 
+                                   WHERE cm.chat_id = ?1''',
+                                (chat_id, f'-{days - 1} days'))
+        results = await cursor.fetchall()
+        return {row[0]: {'user_id': row[0], 'username': row[1], 'first_name': row[2], 'last_name': row[3],
+                         'personality_type': row[4], 'message_count': row[5]} for row in results}
+
+@_observed
 async def save_report(chat_id: int, report_data: str):
     """Сохранение отчета"""
-    async with aiosqlite.connect('sociomind.db') as db:
+    async with database.connection() as db:
         await db.execute('''INSERT OR REPLACE INTO reports 
                           (chat_id, report_date, report_data) 
                           VALUES (?, date('now'), ?)''',
                        (chat_id, report_data))
         await db.commit()
 
+@_observed
 async def get_today_report(chat_id: int) -> str:
     """Получение сегодняшнего отчета"""
-    async with aiosqlite.connect('sociomind.db') as db:
+    async with database.connection() as db:
         cursor = await db.execute('''SELECT report_data FROM reports 
                                    WHERE chat_id = ? AND report_date = date('now')''',
                                 (chat_id,))
@@ -99,32 +292,217 @@ async def get_today_report(chat_id: int) -> str:
         return result[0] if result else None
 
 # Существующие функции оставляем без изменений
+@_observed
 async def save_user_type(user_id: int, username: str, personality_type: str):
     """Сохранение типа пользователя в БД"""
-    async with aiosqlite.connect('sociomind.db') as db:
+    async with database.connection() as db:
         await db.execute('''INSERT OR REPLACE INTO users 
                           (user_id, username, personality_type, test_date)
                           VALUES (?, ?, ?, datetime('now'))''',
                        (user_id, username, personality_type))
         await db.commit()
 
+@_observed
 async def get_user_type(user_id: int) -> str:
     """Получение типа пользователя"""
-    async with aiosqlite.connect('sociomind.db') as db:
+    async with database.connection() as db:
         cursor = await db.execute('SELECT personality_type FROM users WHERE user_id = ?', (user_id,))
         result = await cursor.fetchone()
         return result[0] if result else None
 
+@_observed
 async def get_all_users_with_types() -> List[Dict]:
     """Получение всех пользователей с типами личности"""
-    async with aiosqlite.connect('sociomind.db') as db:
+    async with database.connection() as db:
         cursor = await db.execute('SELECT user_id, username, personality_type FROM users WHERE personality_type IS NOT NULL')
         results = await cursor.fetchall()
         return [{'user_id': row[0], 'username': row[1], 'personality_type': row[2]} for row in results]
 
-async def cleanup_old_messages():
-    """Очистка сообщений старше 7 дней"""
-    async with aiosqlite.connect('sociomind.db') as db:
-        await db.execute("DELETE FROM chat_messages WHERE timestamp < datetime('now', '-7 days')")
+@_observed
+async def get_llm_cache_entries(cache_key: str, min_created_at: float) -> List[Dict]:
+    """Получение актуальных вариантов ответа LLM по ключу кэша"""
+    async with database.connection() as db:
+        cursor = await db.execute('''SELECT variant, response, created_at FROM llm_cache 
+                                   WHERE cache_key = ? AND created_at >= ?
+                                   ORDER BY variant''',
+                                (cache_key, min_created_at))
+        results = await cursor.fetchall()
+        return [{'variant': row[0], 'response': row[1], 'created_at': row[2]} for row in results]
+
+@_observed
+async def save_llm_cache_entry(cache_key: str, variant: int, response: str, created_at: float):
+    """Сохранение варианта ответа LLM в кэш"""
+    async with database.connection() as db:
+        await db.execute('''INSERT OR REPLACE INTO llm_cache 
+                          (cache_key, variant, response, created_at) 
+                          VALUES (?, ?, ?, ?)''',
+                       (cache_key, variant, response, created_at))
+        await db.commit()
+
+@_observed
+async def cleanup_llm_cache(min_created_at: float):
+    """Удаление устаревших ответов LLM из кэша"""
+    async with database.connection() as db:
+        await db.execute('DELETE FROM llm_cache WHERE created_at < ?', (min_created_at,))
+        await db.commit()
+
+@_observed
+async def get_job_runs() -> Dict[str, float]:
+    """Время последнего запуска каждой фоновой задачи"""
+    async with database.connection() as db:
+        cursor = await db.execute('SELECT job_name, last_run FROM job_runs')
+        results = await cursor.fetchall()
+        return {row[0]: row[1] for row in results}
+
+@_observed
+async def save_job_run(job_name: str, last_run: float, duration: float, status: str):
+    """Запись результата запуска фоновой задачи"""
+    async with database.connection() as db:
+        await db.execute('''INSERT INTO job_runs (job_name, last_run, last_duration, last_status, runs)
+                          VALUES (?1, ?2, ?3, ?4, 1)
+                          ON CONFLICT (job_name) DO UPDATE SET
+                              last_run = ?2, last_duration = ?3, last_status = ?4, runs = runs + 1''',
+                       (job_name, last_run, duration, status))
+        await db.commit()
+
+@_observed
+async def spool_sheets_rows(rows: List[tuple]):
+    """Сохранение строк для Google Sheets в локальную очередь: (user_id, row_data, queued_at)"""
+    async with database.connection() as db:
+        await db.executemany('''INSERT INTO sheets_spool (user_id, row_data, queued_at, attempts, last_error)
+                              VALUES (?, ?, ?, 0, NULL)
+                              ON CONFLICT (user_id) DO UPDATE SET
+                                  row_data = excluded.row_data, queued_at = excluded.queued_at''',
+                           rows)
+        await db.commit()
+
+@_observed
+async def get_sheets_spool() -> List[Dict]:
+    """Строки, еще не записанные в Google Sheets, в порядке постановки"""
+    async with database.connection() as db:
+        cursor = await db.execute('''SELECT user_id, row_data, queued_at, attempts
+                                     FROM sheets_spool ORDER BY queued_at''')
+        results = await cursor.fetchall()
+        return [{'user_id': row[0], 'row_data': row[1], 'queued_at': row[2], 'attempts': row[3]}
+                for row in results]
+
+@_observed
+async def delete_sheets_spool(entries: List[tuple]):
+    """Удаление записанных строк: (user_id, queued_at); более новые версии строк остаются"""
+    async with database.connection() as db:
+        await db.executemany('DELETE FROM sheets_spool WHERE user_id = ? AND queued_at <= ?', entries)
         await db.commit()
-        logging.info("✅ Сообщения старше 7 дней очищены")
\ No newline at end of file
+
+@_observed
+async def mark_sheets_spool_failed(user_ids: List[str], error: str):
+    """Учет неудачной попытки записи строк в Google Sheets"""
+    async with database.connection() as db:
+        await db.executemany('''UPDATE sheets_spool SET attempts = attempts + 1, last_error = ?
+                              WHERE user_id = ?''',
+                           [(error, user_id) for user_id in user_ids])
+        await db.commit()
+
+@_observed
+async def get_fsm_session(key: str):
+    """Состояние, данные (JSON) и время изменения сессии FSM или None"""
+    async with database.connection() as db:
+        cursor = await db.execute('SELECT state, data, updated_at FROM fsm_sessions WHERE key = ?', (key,))
+        return await cursor.fetchone()
+
+@_observed
+async def save_fsm_session(key: str, state: str, data: str, updated_at: float):
+    async with database.connection() as db:
+        await db.execute('''INSERT OR REPLACE INTO fsm_sessions (key, state, data, updated_at)
+                          VALUES (?, ?, ?, ?)''',
+                       (key, state, data, updated_at))
+        await db.commit()
+
+@_observed
+async def delete_fsm_session(key: str):
+    async with database.connection() as db:
+        await db.execute('DELETE FROM fsm_sessions WHERE key = ?', (key,))
+        await db.commit()
+
+@_observed
+async def delete_expired_fsm_sessions(min_updated_at: float) -> int:
+    """Удаление сессий FSM без изменений с min_updated_at, возвращает их число"""
+    async with database.connection() as db:
+        cursor = await db.execute('DELETE FROM fsm_sessions WHERE updated_at < ?', (min_updated_at,))
+        await db.commit()
+        return cursor.rowcount
+
+@_observed
+async def get_chat_retention(chat_id: int) -> int:
+    """Срок хранения сообщений чата в днях"""
+    async with database.connection() as db:
+        cursor = await db.execute('SELECT retention_days FROM chat_settings WHERE chat_id = ?', (chat_id,))
+        result = await cursor.fetchone()
+        return result[0] if result and result[0] else MESSAGE_RETENTION_DAYS
+
+@_observed
+async def set_chat_retention(chat_id: int, retention_days: int):
+    """Изменение срока хранения сообщений чата"""
+    async with database.connection() as db:
+        await db.execute('''INSERT INTO chat_settings (chat_id, retention_days) VALUES (?, ?) 
+                          ON CONFLICT (chat_id) DO UPDATE SET retention_days = excluded.retention_days''',
+                       (chat_id, retention_days))
+        await db.commit()
+
+@_observed
+async def get_expired_chat_days() -> List[tuple]:
+    """Дни-партиции (chat_id, day) старше срока хранения своего чата
+
+    Список дней берется из дневной сводки активности, а не из chat_messages.
+    """
+    async with database.connection() as db:
+        cursor = await db.execute('''SELECT DISTINCT a.chat_id, a.day 
+                                   FROM chat_activity_daily a 
+                                   LEFT JOIN chat_settings s ON s.chat_id = a.chat_id 
+                                   WHERE a.day < date('now', '-' || COALESCE(s.retention_days, ?) || ' days') 
+                                   ORDER BY a.day''',
+                                (MESSAGE_RETENTION_DAYS,))
+        return await cursor.fetchall()
+
+@_observed
+async def drop_chat_day(chat_id: int, day: str) -> int:
+    """Удаление одного дня-партиции чата: сообщения, сводка активности и дайджесты"""
+    async with database.connection() as db:
+        cursor = await db.execute('DELETE FROM chat_messages WHERE chat_id = ? AND day = ?', (chat_id, day))
+        await db.execute('DELETE FROM chat_activity_daily WHERE chat_id = ? AND day = ?', (chat_id, day))
+        await db.execute('DELETE FROM chat_digests WHERE chat_id = ? AND day = ?', (chat_id, day))
+        await db.commit()
+        return cursor.rowcount
+
+@_observed
+async def incremental_vacuum() -> int:
+    """Возврат свободных страниц файла БД шагами по VACUUM_STEP_PAGES, возвращает число страниц"""
+    freed = 0
+    async with database.connection() as db:
+        cursor = await db.execute('PRAGMA freelist_count')
+        free_pages = (await cursor.fetchone())[0]
+        while free_pages:
+            # executescript выполняет PRAGMA до конца (execute освобождает одну страницу за шаг)
+            await db.executescript(f'PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})')
+            cursor = await db.execute('PRAGMA freelist_count')
+            remaining = (await cursor.fetchone())[0]
+            if remaining >= free_pages:
+                # БД не в режиме auto_vacuum=INCREMENTAL
+                break
+            freed += free_pages - remaining
+            free_pages = remaining
+    return freed
+
+@_observed
+async def cleanup_old_messages():
+    """Очистка сообщений старше срока хранения чата
+
+    Каждый истекший день чата удаляется отдельной короткой транзакцией
+    по индексу (chat_id, day), поэтому очистка не блокирует запись
+    сообщений надолго; освобожденное место возвращается incremental_vacuum.
+    """
+    expired = await get_expired_chat_days()
+    deleted = 0
+    for chat_id, day in expired:
+        deleted += await drop_chat_day(chat_id, day)
+    freed = await incremental_vacuum()
+    logging.info(f"✅ Удалено дней чатов: {len(expired)}, сообщений: {deleted}, освобождено страниц БД: {freed}")
\ No newline at end of file
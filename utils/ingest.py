@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from config import INGEST_BATCH_SIZE, INGEST_FLUSH_INTERVAL_MS, INGEST_QUEUE_SIZE, INGEST_MAX_RETRIES, INGEST_RETRY_BASE_MS
+from utils.helpers import save_chat_batch
+from utils.member_cache import member_cache
+from utils.metrics import registry
+
+# Маркер остановки фонового обработчика
+_STOP = object()
+
+INGEST_QUEUE_DEPTH = registry.gauge('sociomind_ingest_queue_depth', 'Сообщения чатов в очереди на запись в БД')
+INGEST_RETRIES = registry.counter('sociomind_ingest_retries_total', 'Повторы записи пакета сообщений после временной ошибки')
+INGEST_DROPPED = registry.counter('sociomind_ingest_dropped_total', 'Сообщения чатов, потерянные из-за ошибок записи')
+
+
+class MessageIngestor:
+    """Очередь сообщений групповых чатов с пакетной фоновой записью в БД.
+
+    Обработчик только кладет сообщение в очередь, а фоновая задача
+    сбрасывает накопленное одной транзакцией: каждые batch_size
+    сообщений или каждые flush_interval_ms миллисекунд. Временная ошибка
+    SQLite (OperationalError: database is locked и т.п.) повторяется до
+    max_retries раз с растущей паузой, пока очередь ждет; только потом
+    пакет отбрасывается и учитывается в dropped.
+    """
+
+    def __init__(self, batch_size: int = INGEST_BATCH_SIZE,
+                 flush_interval_ms: int = INGEST_FLUSH_INTERVAL_MS,
+                 max_queue: int = INGEST_QUEUE_SIZE, max_retries: int = INGEST_MAX_RETRIES,
+                 retry_base_ms: int = INGEST_RETRY_BASE_MS):
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max(0, max_retries)
+        self.retry_base = max(0, retry_base_ms) / 1000
+        self.flush_interval = max(1, flush_interval_ms) / 1000
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'enqueued': 0,
+            'flushed': 0,
+            'batches': 0,
+            'retries': 0,
+            'dropped': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        """Текущая глубина очереди"""
+        return self._queue.qsize() if self._queue else 0
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['queue_depth'] = self.depth
+        stats['avg_flush_ms'] = stats['total_flush_ms'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    async def start(self):
+        """Запуск фоновой записи"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        logging.info("✅ Пакетная запись сообщений запущена")
+
+    async def stop(self):
+        """Остановка с финальным сбросом всего, что осталось в очереди"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logging.info(f"✅ Пакетная запись сообщений остановлена, записано: {self.stats['flushed']}")
+
+    async def submit(self, chat_id: int, user_id: int, message_text: str,
+                     username: str, first_name: str, last_name: str = None):
+        """Постановка сообщения в очередь на запись"""
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        item = (chat_id, user_id, message_text, timestamp, username, first_name, last_name)
+
+        if not self.running:
+            # Без фоновой задачи (скрипты, бенчмарки) пишем сразу
+            await self._flush([item])
+            return
+
+        # При заполненной очереди обработчик ждет, а не теряет сообщения
+        await self._queue.put(item)
+        self.stats['enqueued'] += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[tuple]):
+        """Запись пакета одной транзакцией"""
+        messages = [item[:4] for item in batch]
+        # Для участника достаточно последней записи из пакета
+        members = {}
+        for chat_id, user_id, _, timestamp, username, first_name, last_name in batch:
+            members[(chat_id, user_id)] = (chat_id, user_id, username, first_name, last_name, timestamp)
+
+        # Пропускаем участников, записанных недавно с тем же профилем
+        now = time.monotonic()
+        changed = {key: row for key, row in members.items()
+                   if member_cache.should_write(key, row[2:5], now)}
+
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                await save_chat_batch(messages, list(changed.values()))
+                break
+            except sqlite3.OperationalError as e:
+                if attempt >= self.max_retries:
+                    self._drop(batch, e)
+                    return
+                delay = self.retry_base * 2 ** attempt
+                attempt += 1
+                self.stats['retries'] += 1
+                INGEST_RETRIES.inc()
+                logging.warning(f"⚠️ Ошибка пакетной записи сообщений: {e}; повтор {attempt} через {delay:.2f} с")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                self._drop(batch, e)
+                return
+
+        for key, row in changed.items():
+            member_cache.remember(key, row[2:5], now)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats['flushed'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['last_flush_ms'] = elapsed_ms
+        self.stats['total_flush_ms'] += elapsed_ms
+        self.stats['max_flush_ms'] = max(self.stats['max_flush_ms'], elapsed_ms)
+
+    def _drop(self, batch: List[tuple], error: Exception):
+        self.stats['dropped'] += len(batch)
+        INGEST_DROPPED.inc(len(batch))
+        logging.error(f"❌ Пакет сообщений не записан и отброшен ({len(batch)} шт.): {error}")
+
+
+ingestor = MessageIngestor()
+INGEST_QUEUE_DEPTH.set_function(lambda: ingestor.depth)
@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from config import MEMBER_CACHE_SIZE, MEMBER_SEEN_GRANULARITY_SEC
+
+
+class MemberCache:
+    """LRU-кэш недавно записанных участников чатов.
+
+    Хранит по ключу (chat_id, user_id) последний записанный профиль
+    (username, first_name, last_name) и время записи. Повторная запись
+    в chat_members нужна, только если профиль изменился или last_seen
+    устарел больше чем на granularity секунд.
+    """
+
+    def __init__(self, max_size: int = MEMBER_CACHE_SIZE,
+                 granularity: float = MEMBER_SEEN_GRANULARITY_SEC):
+        self.max_size = max(1, max_size)
+        self.granularity = granularity
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def should_write(self, key: Hashable, profile: tuple, now: Optional[float] = None) -> bool:
+        """Нужно ли записывать участника в БД"""
+        now = time.monotonic() if now is None else now
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == profile and now - entry[1] < self.granularity:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return False
+
+        self.misses += 1
+        return True
+
+    def remember(self, key: Hashable, profile: tuple, now: Optional[float] = None):
+        """Отметка об успешной записи участника"""
+        self._entries[key] = (profile, time.monotonic() if now is None else now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+        }
+
+
+member_cache = MemberCache()
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from config import UPDATE_CONCURRENCY
+from utils.metrics import registry
+
+UPDATES_IN_FLIGHT = registry.gauge(
+    'sociomind_updates_in_flight', 'Апдейты в обработке и в ожидании семафора')
+HANDLER_SECONDS = registry.histogram(
+    'sociomind_handler_duration_seconds', 'Время работы обработчика апдейта', ['router', 'handler'])
+HANDLER_ERRORS = registry.counter(
+    'sociomind_handler_errors_total', 'Исключения в обработчиках апдейтов', ['router', 'handler'])
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Ограничение числа одновременно обрабатываемых апдейтов.
+
+    Регистрируется как outer-middleware dp.update: апдейты сверх limit
+    ждут на семафоре. in_flight - апдейты в обработке и в ожидании,
+    drain() при остановке бота ждет, пока их не останется.
+    """
+
+    def __init__(self, limit: int = UPDATE_CONCURRENCY):
+        self.limit = max(1, limit)
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.in_flight = 0
+        self.stats = {'processed': 0, 'waited': 0, 'max_in_flight': 0}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        self.in_flight += 1
+        self._idle.clear()
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+        try:
+            if self._semaphore.locked():
+                self.stats['waited'] += 1
+            async with self._semaphore:
+                return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            self.stats['processed'] += 1
+            if not self.in_flight:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Ожидание завершения всех апдейтов; False, если не успели за timeout секунд"""
+        if self.in_flight:
+            logging.info(f"⏳ Ожидание завершения обработки апдейтов: {self.in_flight}")
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logging.warning(f"⚠️ Не дождались завершения апдейтов за {timeout:.0f} с: {self.in_flight}")
+            return False
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, in_flight=self.in_flight, limit=self.limit)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время работы и ошибки каждого обработчика.
+
+    Регистрируется как inner-middleware наблюдателя диспетчера (dp.message):
+    aiogram применяет его к обработчикам всех вложенных роутеров и передает
+    выбранный обработчик в data['handler']. Метка router - модуль
+    обработчика (handlers.test -> test), handler - имя функции.
+    """
+
+    def __init__(self):
+        self._labels: Dict[Callable, Dict[str, str]] = {}
+
+    def _get_labels(self, callback: Callable) -> Dict[str, str]:
+        labels = self._labels.get(callback)
+        if labels is None:
+            module = getattr(callback, '__module__', None) or 'unknown'
+            labels = self._labels[callback] = {
+                'router': module.rsplit('.', 1)[-1],
+                'handler': getattr(callback, '__name__', None) or type(callback).__name__,
+            }
+        return labels
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get('handler')
+        if handler_object is None:
+            return await handler(event, data)
+
+        labels = self._get_labels(handler_object.callback)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(**labels)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, **labels)
@@ -0,0 +1,172 @@
+import logging
+from typing import Optional
+
+# Упорядоченные шаги миграции схемы sociomind.db: (версия, описание, SQL)
+MIGRATIONS = [
+    (1, "Базовые таблицы", [
+        '''CREATE TABLE IF NOT EXISTS users
+           (user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            personality_type TEXT,
+            test_date TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS chat_messages
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            user_id INTEGER,
+            message_text TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS chat_members
+           (chat_id INTEGER,
+            user_id INTEGER,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            first_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_seen DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (chat_id, user_id))''',
+        '''CREATE TABLE IF NOT EXISTS reports
+           (chat_id INTEGER,
+            report_date DATE,
+            report_data TEXT,
+            PRIMARY KEY (chat_id, report_date))''',
+    ]),
+    (2, "Индексы для выборки истории чата и очистки старых сообщений", [
+        # Выборка за 7 дней: WHERE chat_id = ? AND timestamp >= ? ORDER BY timestamp
+        '''CREATE INDEX IF NOT EXISTS idx_chat_messages_chat_ts
+           ON chat_messages (chat_id, timestamp)''',
+        # Очистка: WHERE timestamp < ? (покрывающий индекс, без обращения к таблице)
+        '''CREATE INDEX IF NOT EXISTS idx_chat_messages_ts
+           ON chat_messages (timestamp)''',
+        # Выборка протестированных пользователей
+        '''CREATE INDEX IF NOT EXISTS idx_users_personality_type
+           ON users (personality_type) WHERE personality_type IS NOT NULL''',
+        'ANALYZE',
+    ]),
+    (3, "Кэш ответов LLM", [
+        '''CREATE TABLE IF NOT EXISTS llm_cache
+           (cache_key TEXT,
+            variant INTEGER,
+            response TEXT,
+            created_at REAL,
+            PRIMARY KEY (cache_key, variant))''',
+        '''CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at
+           ON llm_cache (created_at)''',
+    ]),
+    (4, "Журнал запусков фоновых задач", [
+        '''CREATE TABLE IF NOT EXISTS job_runs
+           (job_name TEXT PRIMARY KEY,
+            last_run REAL,
+            last_duration REAL,
+            last_status TEXT,
+            runs INTEGER DEFAULT 0)''',
+    ]),
+    (5, "Дневная сводка активности участников чата", [
+        # recent_ids - id последних сообщений участника за день через запятую
+        '''CREATE TABLE IF NOT EXISTS chat_activity_daily
+           (chat_id INTEGER,
+            day TEXT,
+            user_id INTEGER,
+            message_count INTEGER DEFAULT 0,
+            char_count INTEGER DEFAULT 0,
+            first_ts DATETIME,
+            last_ts DATETIME,
+            recent_ids TEXT,
+            PRIMARY KEY (chat_id, day, user_id))''',
+        # Заполнение по уже накопленным сообщениям
+        '''INSERT OR REPLACE INTO chat_activity_daily
+           (chat_id, day, user_id, message_count, char_count, first_ts, last_ts, recent_ids)
+           SELECT m.chat_id, date(m.timestamp), m.user_id, COUNT(*), SUM(LENGTH(m.message_text)),
+                  MIN(m.timestamp), MAX(m.timestamp),
+                  (SELECT group_concat(id) FROM
+                      (SELECT r.id FROM chat_messages r
+                       WHERE r.chat_id = m.chat_id AND r.user_id = m.user_id
+                       AND date(r.timestamp) = date(m.timestamp)
+                       ORDER BY r.id DESC LIMIT 3))
+           FROM chat_messages m
+           GROUP BY m.chat_id, date(m.timestamp), m.user_id''',
+    ]),
+    (6, "Дневные сводки переписки чата", [
+        # user_id = 0 - сводка по чату в целом
+        '''CREATE TABLE IF NOT EXISTS chat_digests
+           (chat_id INTEGER,
+            day TEXT,
+            user_id INTEGER,
+            message_count INTEGER,
+            digest TEXT,
+            created_at REAL,
+            PRIMARY KEY (chat_id, day, user_id))''',
+    ]),
+    (7, "Очередь записи в Google Sheets", [
+        # row_data - строка таблицы в JSON; запись удаляется после успешной отправки
+        '''CREATE TABLE IF NOT EXISTS sheets_spool
+           (user_id TEXT PRIMARY KEY,
+            row_data TEXT,
+            queued_at REAL,
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT)''',
+    ]),
+    (8, "Состояния FSM в БД", [
+        # key - bot_id:chat_id:user_id:thread_id:destiny, data - данные FSM в JSON
+        '''CREATE TABLE IF NOT EXISTS fsm_sessions
+           (key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at REAL)''',
+        '''CREATE INDEX IF NOT EXISTS idx_fsm_sessions_updated_at
+           ON fsm_sessions(updated_at)''',
+    ]),
+    (9, "Партиционирование сообщений чата по дням и настройки хранения", [
+        # day - день (UTC) сообщения: ключ партиции для чтения истории и удаления по дням
+        'ALTER TABLE chat_messages ADD COLUMN day TEXT',
+        'UPDATE chat_messages SET day = date(timestamp)',
+        '''CREATE INDEX IF NOT EXISTS idx_chat_messages_chat_day
+           ON chat_messages (chat_id, day)''',
+        # Выборки и очистка по timestamp заменены выборками по дням
+        'DROP INDEX IF EXISTS idx_chat_messages_chat_ts',
+        'DROP INDEX IF EXISTS idx_chat_messages_ts',
+        # retention_days - срок хранения сообщений чата в днях (NULL - MESSAGE_RETENTION_DAYS)
+        '''CREATE TABLE IF NOT EXISTS chat_settings
+           (chat_id INTEGER PRIMARY KEY,
+            retention_days INTEGER)''',
+        'ANALYZE',
+    ]),
+]
+
+
+async def get_schema_version(db) -> int:
+    """Текущая версия схемы (0 для новой или старой БД без учета версий)"""
+    await db.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                        (version INTEGER PRIMARY KEY,
+                         description TEXT,
+                         applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    cursor = await db.execute('SELECT MAX(version) FROM schema_version')
+    result = await cursor.fetchone()
+    return result[0] or 0
+
+
+async def run_migrations(db, target: Optional[int] = None) -> int:
+    """Применение недостающих миграций по порядку, возвращает итоговую версию"""
+    current = await get_schema_version(db)
+    await db.commit()
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+
+        # Каждая миграция применяется атомарно вместе с записью о версии
+        await db.execute('BEGIN')
+        try:
+            for statement in statements:
+                await db.execute(statement)
+            await db.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                             (version, description))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logging.error(f"❌ Ошибка миграции БД до версии {version}: {description}")
+            raise
+
+        current = version
+        logging.info(f"✅ Миграция БД до версии {version}: {description}")
+
+    return current
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import SCHEDULER_JITTER_SEC
+from utils.helpers import get_job_runs, save_job_run
+
+DAY_SEC = 24 * 60 * 60
+# Пропущенный запуск после перезапуска выполняется почти сразу
+CATCH_UP_JITTER_SEC = 60
+
+
+class Job:
+    """Периодическая задача: раз в interval секунд или ежедневно в at=(час, минута) UTC"""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval: Optional[float] = None,
+                 at: Optional[Tuple[int, int]] = None, jitter: float = SCHEDULER_JITTER_SEC):
+        if (interval is None) == (at is None):
+            raise ValueError(f"Для задачи {name} нужно указать либо interval, либо at")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.at = at
+        self.jitter = max(0.0, jitter)
+        self.last_run: Optional[float] = None
+        self.next_run: Optional[float] = None
+        self.stats = {'runs': 0, 'failures': 0, 'last_duration': 0.0, 'total_duration': 0.0}
+
+    def previous_slot(self, now: float) -> float:
+        """Последнее время запуска по расписанию, не позже now"""
+        if self.interval is not None:
+            return now - self.interval
+        hour, minute = self.at
+        current = datetime.fromtimestamp(now, timezone.utc)
+        slot = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if slot.timestamp() > now:
+            slot -= timedelta(days=1)
+        return slot.timestamp()
+
+    def is_missed(self, now: float) -> bool:
+        """Был ли пропущен запуск, пока бот не работал"""
+        if self.last_run is None:
+            return False
+        return self.last_run < self.previous_slot(now)
+
+    def schedule(self, now: float):
+        """Расчет следующего запуска со случайным сдвигом"""
+        if self.interval is not None:
+            base = self.last_run + self.interval if self.last_run is not None else now + self.interval
+            base = max(base, now)
+        else:
+            base = self.previous_slot(now) + DAY_SEC
+        self.next_run = base + random.uniform(0, self.jitter)
+
+
+class JobScheduler:
+    """Планировщик фоновых задач внутри процесса бота.
+
+    Время последнего запуска хранится в таблице job_runs, поэтому
+    после перезапуска задача, чей запуск выпал на простой, выполняется
+    сразу, а не ждет следующего дня.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def add_job(self, name: str, func: Callable[[], Awaitable], interval: Optional[float] = None,
+                at: Optional[Tuple[int, int]] = None, jitter: float = SCHEDULER_JITTER_SEC) -> Job:
+        job = Job(name, func, interval=interval, at=at, jitter=jitter)
+        self.jobs[name] = job
+        return job
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self):
+        """Загрузка журнала запусков и старт задач"""
+        if self.running:
+            return
+        try:
+            last_runs = await get_job_runs()
+        except Exception as e:
+            logging.error(f"❌ Не удалось прочитать журнал фоновых задач: {e}")
+            last_runs = {}
+
+        now = time.time()
+        for job in self.jobs.values():
+            job.last_run = last_runs.get(job.name)
+            if job.is_missed(now):
+                job.next_run = now + random.uniform(0, min(job.jitter, CATCH_UP_JITTER_SEC))
+                logging.info(f"⏰ Задача {job.name} пропустила запуск, выполняем после старта")
+            else:
+                job.schedule(now)
+            self._tasks.append(asyncio.create_task(self._loop(job)))
+
+    async def stop(self):
+        """Остановка задач; прерванный запуск не записывается и будет повторен"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _loop(self, job: Job):
+        while True:
+            await asyncio.sleep(max(0.0, job.next_run - time.time()))
+            await self.run_job(job)
+            job.schedule(time.time())
+
+    async def run_job(self, job: Job) -> bool:
+        """Однократный запуск задачи с замером времени"""
+        started_at = time.time()
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            await job.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = "error"
+            job.stats['failures'] += 1
+            logging.error(f"❌ Ошибка фоновой задачи {job.name}: {e}")
+
+        duration = time.perf_counter() - started
+        job.last_run = started_at
+        job.stats['runs'] += 1
+        job.stats['last_duration'] = duration
+        job.stats['total_duration'] += duration
+        logging.info(f"⏱ Задача {job.name} выполнена за {duration:.2f} с ({status})")
+
+        try:
+            await save_job_run(job.name, started_at, duration, status)
+        except Exception as e:
+            logging.error(f"❌ Не удалось записать запуск задачи {job.name}: {e}")
+        return status == "ok"
+
+    def get_stats(self) -> Dict:
+        return {
+            name: dict(job.stats, next_run=job.next_run, last_run=job.last_run)
+            for name, job in self.jobs.items()
+        }
+
+
+# Общий планировщик фоновых задач
+job_scheduler = JobScheduler()
@@ -1,11 +1,5 @@
 from aiogram.fsm.state import State, StatesGroup
 
 class TestStates(StatesGroup):
-    waiting_for_answer_1 = State()
-    waiting_for_answer_2 = State()
-    waiting_for_answer_3 = State()
-    waiting_for_answer_4 = State()
-    waiting_for_answer_5 = State()
-    waiting_for_answer_6 = State()
-    waiting_for_answer_7 = State()
-    waiting_for_answer_8 = State()
\ No newline at end of file
+    # Номер вопроса и ответы хранятся в данных FSM (services/questionnaire.py)
+    answering = State()
\ No newline at end of file
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import re
+import time
+from typing import List, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from config import STREAM_EDIT_INTERVAL_SEC
+
+# Лимит длины текста сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+_TAG = re.compile(r'<(/?)([a-zA-Z][\w-]*)[^<>]*>')
+# Теги без закрывающей пары, которые не нужно балансировать
+_VOID_TAGS = {'br', 'hr', 'img'}
+# Запас под закрывающие (и повторно открываемые) теги в части длинного текста
+_TAGS_RESERVE = 100
+
+
+def html_safe_prefix(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> str:
+    """Часть потокового HTML-текста, которую можно безопасно отправить.
+
+    Отрезает недописанный тег или HTML-сущность в конце, обрезает текст
+    по лимиту Telegram и закрывает открытые теги.
+    """
+    # Недописанный тег: "<" без ">" после него
+    last_open = text.rfind('<')
+    if last_open > text.rfind('>'):
+        text = text[:last_open]
+    # Недописанная сущность: "&" без ";" после него
+    last_amp = text.rfind('&')
+    if last_amp != -1 and ';' not in text[last_amp:] and len(text) - last_amp < 10:
+        text = text[:last_amp]
+
+    # Запас под закрывающие теги и многоточие
+    if len(text) > limit - 100:
+        text = text[:limit - 100]
+        last_open = text.rfind('<')
+        if last_open > text.rfind('>'):
+            text = text[:last_open]
+        text += "…"
+
+    stack = []
+    for match in _TAG.finditer(text):
+        closing, name = match.group(1), match.group(2).lower()
+        if name in _VOID_TAGS:
+            continue
+        if not closing:
+            stack.append(name)
+        elif name in stack:
+            # Закрываем все вложенные теги вплоть до найденного
+            while stack and stack.pop() != name:
+                pass
+
+    return text + "".join(f"</{name}>" for name in reversed(stack))
+
+
+def _inside_markup(text: str, position: int) -> bool:
+    """Позиция внутри тега или HTML-сущности"""
+    if text.rfind('<', 0, position) > text.rfind('>', 0, position):
+        return True
+    last_amp = text.rfind('&', 0, position)
+    return last_amp > text.rfind(';', 0, position) and position - last_amp < 10
+
+
+def _split_point(window: str) -> int:
+    """Граница части: конец абзаца, строки или слова во второй половине окна вне разметки"""
+    for separator in ("\n\n", "\n", " "):
+        position = window.rfind(separator)
+        while position > 0 and _inside_markup(window, position):
+            position = window.rfind(separator, 0, position)
+        if position >= len(window) // 2:
+            return position
+    # Сплошной текст: режем по лимиту, но не посреди тега или сущности
+    position = len(window)
+    while position > 1 and _inside_markup(window, position):
+        position -= 1
+    return position
+
+
+def split_html(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Разбиение готового HTML-текста на сообщения Telegram без потери текста.
+
+    Теги, открытые на границе части, закрываются в ее конце и снова
+    открываются в начале следующей, поэтому каждая часть - валидный HTML.
+    Части короче limit с запасом и проходят html_safe_prefix без обрезки.
+    """
+    # Часть вместе с закрывающими тегами не длиннее limit - _TAGS_RESERVE (как в html_safe_prefix)
+    budget = limit - 2 * _TAGS_RESERVE
+    parts = []
+    reopen = ""
+    rest = text
+    while rest:
+        if len(reopen) + len(rest) <= budget:
+            chunk, rest = rest, ""
+        else:
+            window = rest[:budget - len(reopen)]
+            cut = _split_point(window)
+            chunk, rest = window[:cut], rest[cut:].lstrip()
+
+        chunk = reopen + chunk
+        stack = []
+        for match in _TAG.finditer(chunk):
+            closing, name = match.group(1), match.group(2).lower()
+            if name in _VOID_TAGS:
+                continue
+            if not closing:
+                stack.append((name, match.group(0)))
+            elif any(item[0] == name for item in stack):
+                while stack and stack.pop()[0] != name:
+                    pass
+        parts.append(chunk + "".join(f"</{name}>" for name, _ in reversed(stack)))
+        reopen = "".join(tag for _, tag in stack)
+    return parts or [text]
+
+
+class ProgressiveEditor:
+    """Постепенное обновление одного сообщения по мере генерации текста.
+
+    Правки отправляются не чаще раза в interval секунд (ограничения
+    Telegram на редактирование), первая - сразу, как появился текст.
+    """
+
+    def __init__(self, message: Message, interval: float = STREAM_EDIT_INTERVAL_SEC):
+        self.message = message
+        self.interval = interval
+        self._last_text: Optional[str] = None
+        self._next_edit_at = 0.0
+        self.edits = 0
+
+    async def update(self, text: str, force: bool = False) -> bool:
+        """Правка сообщения, если пришло время; возвращает True при успехе"""
+        now = time.monotonic()
+        if not force and now < self._next_edit_at:
+            return False
+
+        safe_text = html_safe_prefix(text)
+        if not safe_text.strip() or safe_text == self._last_text:
+            return False
+
+        self._next_edit_at = now + self.interval
+        try:
+            await self.message.edit_text(safe_text, parse_mode="HTML")
+        except TelegramRetryAfter as e:
+            self._next_edit_at = now + e.retry_after
+            if force:
+                await asyncio.sleep(e.retry_after)
+                return await self.update(text, force=True)
+            return False
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                self._last_text = safe_text
+                return True
+            # Промежуточный текст мог оказаться невалидным HTML - ждем следующий фрагмент
+            if force:
+                raise
+            logging.debug(f"Промежуточная правка отчета пропущена: {e}")
+            return False
+
+        self._last_text = safe_text
+        self.edits += 1
+        return True
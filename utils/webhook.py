@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import secrets
+import signal
+from typing import Any, Dict, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiohttp import web
+
+from config import (WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL,
+                    METRICS_PATH, SHUTDOWN_DRAIN_TIMEOUT_SEC)
+from utils.metrics import metrics_handler
+from utils.middlewares import ConcurrencyLimitMiddleware
+
+# Путь проверки живости для балансировщика и оркестратора
+HEALTH_PATH = "/healthz"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """aiohttp-сервер, принимающий апдейты Telegram через webhook.
+
+    Апдейт передается диспетчеру в фоновой задаче (как SimpleRequestHandler
+    с handle_in_background), Telegram сразу получает ответ 200.
+    При остановке сервер перестает принимать апдейты (503 - Telegram
+    повторит их позже), дожидается фоновых задач всех принятых апдейтов,
+    в том числе еще не дошедших до диспетчера, и только потом закрывается,
+    чтобы можно было сбросить очереди записи в БД и Sheets.
+
+    На METRICS_PATH отдаются метрики в формате Prometheus.
+
+    Без WEBHOOK_URL setWebhook не вызывается: апдейты можно отправлять
+    на WEBHOOK_PATH вручную (см. benchmarks/post_updates.py).
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, limiter: ConcurrencyLimitMiddleware,
+                 host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH,
+                 secret: Optional[str] = WEBHOOK_SECRET):
+        self.dp = dp
+        self.bot = bot
+        self.limiter = limiter
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.draining = False
+        self._tasks: Set[asyncio.Task] = set()
+        self._runner: Optional[web.AppRunner] = None
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle_update)
+        self.app.router.add_get(HEALTH_PATH, self.health)
+        self.app.router.add_get(METRICS_PATH, metrics_handler)
+
+    def _workflow_data(self) -> dict:
+        # Те же данные, что передает обработчикам startup/shutdown start_polling
+        return {'dispatcher': self.dp, 'bots': [self.bot], 'bot': self.bot, **self.dp.workflow_data}
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.Response(status=503, text="Shutting down")
+        if self.secret and not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401, text="Unauthorized")
+        update = await request.json(loads=self.bot.session.json_loads)
+        # Задача учитывается сразу при приеме: drain не пропустит апдейт,
+        # который еще не дошел до ConcurrencyLimitMiddleware
+        task = asyncio.create_task(self._feed_update(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.json_response({}, dumps=self.bot.session.json_dumps)
+
+    async def _feed_update(self, update: Dict[str, Any]):
+        result = await self.dp.feed_raw_update(self.bot, update)
+        if isinstance(result, TelegramMethod):
+            await self.dp.silent_call_request(bot=self.bot, result=result)
+
+    async def _drain(self, timeout: float) -> bool:
+        """Ожидание фоновых задач принятых апдейтов; False, если не успели за timeout секунд"""
+        if not self._tasks:
+            return True
+        logging.info(f"⏳ Ожидание завершения обработки апдейтов: {len(self._tasks)}")
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if pending:
+            logging.warning(f"⚠️ Не дождались завершения апдейтов за {timeout:.0f} с: {len(pending)}")
+            return False
+        return True
+
+    async def health(self, request: web.Request) -> web.Response:
+        data = {'status': 'draining' if self.draining else 'ok', **self.limiter.get_stats()}
+        return web.json_response(data, status=503 if self.draining else 200)
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        await self.dp.emit_startup(**self._workflow_data())
+
+        if WEBHOOK_URL:
+            await self.bot.set_webhook(
+                WEBHOOK_URL.rstrip('/') + self.path,
+                secret_token=self.secret,
+                allowed_updates=self.dp.resolve_used_update_types(),
+            )
+            logging.info(f"✅ Webhook установлен: {WEBHOOK_URL.rstrip('/')}{self.path}")
+        else:
+            logging.warning("⚠️ WEBHOOK_URL не задан: setWebhook не вызывается, апдейты только локально")
+        logging.info(f"✅ Webhook-сервер слушает {self.host}:{self.port}{self.path}")
+
+    async def stop(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT_SEC):
+        """Остановка приема апдейтов и ожидание уже принятых"""
+        if self._runner is None:
+            return
+        self.draining = True
+        await self._drain(timeout)
+        await self.dp.emit_shutdown(**self._workflow_data())
+        await self._runner.cleanup()
+        self._runner = None
+        logging.info("✅ Webhook-сервер остановлен")
+
+    async def run(self):
+        """Работа до SIGINT/SIGTERM; webhook не удаляется, апдейты копятся в Telegram до перезапуска"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows: остановка по KeyboardInterrupt
+                pass
+
+        await self.start()
+        try:
+            await stop.wait()
+        finally:
+            await self.stop()